@@ -0,0 +1 @@
+""" Benchmarks for the data build (see bench_build.py)."""
@@ -0,0 +1,269 @@
+""" Benchmark the stages of the data build on synthetic datasets at several
+scales relative to the shipped data.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.bench_build --scales 1 10 100 --output results.json
+    python -m benchmarks.bench_build --compare results.json --threshold 0.2
+
+Each stage is timed (best of --repeat runs) and its peak memory usage (as
+reported by tracemalloc) is measured in a separate run, as tracing slows the
+stage down. The results are written as JSON so that they can be compared
+between commits; --compare exits with a non-zero status if any stage is
+slower than in the given results by more than the threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import logging as logger
+
+import build_data as bd
+from siralim_data.assets import AssetIndex
+from benchmarks.synthetic import generate_dataset
+
+RESULTS_VERSION = 1
+DEFAULT_SCALES = [1, 10, 100]
+DEFAULT_THRESHOLD = 0.2
+
+
+def _validate_traits(dataset):
+    records = bd.iter_csv_file(dataset["traits"])
+    sprites = AssetIndex.scan(dataset["sprites_folder"])
+    for _ in bd.add_sprites_and_stats(records, dataset["creatures"], sprites):
+        pass
+
+
+def _build_perk_icon_image(dataset, specializations_data):
+    bd.build_perk_icon_image(
+        specializations_data,
+        dataset["perk_icons_folder"],
+        dataset["perk_icons_output_folder"],
+    )
+
+
+def get_benchmarks(dataset: dict):
+    """Return the benchmarked stages for the given dataset.
+
+    Args:
+        dataset (dict): The dataset (see generate_dataset).
+
+    Returns:
+        list: (name, setup, func) tuples. setup() returns the arguments that
+        are passed to func, and is not timed.
+    """
+
+    def load_specializations():
+        return bd.load_specializations_data(
+            dataset["specializations"],
+            dataset["perks"],
+            dataset["suapi_perks"],
+        )
+
+    return [
+        (
+            "load_csv_file",
+            lambda: (),
+            lambda: bd.load_csv_file(dataset["traits"]),
+        ),
+        (
+            "load_suapi_data",
+            lambda: (),
+            lambda: bd.load_suapi_data(dataset["creatures"]),
+        ),
+        ("validate_traits", lambda: (), lambda: _validate_traits(dataset)),
+        ("load_specializations_data", lambda: (), load_specializations),
+        (
+            "load_relics_data",
+            lambda: (),
+            lambda: bd.load_relics_data(dataset["relics"]),
+        ),
+        (
+            "load_spells_data",
+            lambda: (),
+            lambda: bd.load_spells_data(dataset["spells"]),
+        ),
+        (
+            "build_perk_icon_image",
+            lambda: (load_specializations(),),
+            lambda s: _build_perk_icon_image(dataset, s),
+        ),
+    ]
+
+
+def measure(setup, func, repeat: int):
+    """Measure the best wall time and the peak traced memory of a function.
+
+    Args:
+        setup (callable): Returns the arguments of func.
+        func (callable): The function to measure.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        dict: The time (seconds) and peak memory (bytes).
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    args = setup()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": min(times), "peak_bytes": peak}
+
+
+def run_benchmarks(scales: list, repeat: int = 3, data_folder: str = None):
+    """Generate a dataset at each scale and benchmark every stage on it.
+
+    Args:
+        scales (list): The scales to benchmark.
+        repeat (int): The number of timed runs of each stage.
+        data_folder (str): The folder to generate the datasets in. Defaults
+          to a temporary folder that is removed afterwards.
+
+    Returns:
+        dict: The results.
+    """
+    results = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "scales": {},
+    }
+    tmp_folder = None
+    if data_folder is None:
+        data_folder = tmp_folder = tempfile.mkdtemp(prefix="siralim-bench-")
+
+    # The stages log a lot at this scale.
+    level = logger.getLogger().level
+    logger.getLogger().setLevel(logger.ERROR)
+    # Measure the parsing and decoding themselves rather than loading the
+    # cached results, and keep the remaining caches (e.g. the asset indexes)
+    # out of the working directory.
+    cache_enabled = (bd.CSV_CACHE.enabled, bd.TILE_CACHE.enabled)
+    bd.CSV_CACHE.enabled = bd.TILE_CACHE.enabled = False
+    cache_folder = bd.BUILD_CACHE_FOLDER
+    bd.BUILD_CACHE_FOLDER = os.path.join(data_folder, ".build_cache")
+    try:
+        for scale in scales:
+            dataset = generate_dataset(
+                os.path.join(data_folder, f"{scale}x"), scale
+            )
+            stages = {}
+            for (name, setup, func) in get_benchmarks(dataset):
+                stages[name] = measure(setup, func, repeat)
+                print(
+                    f"{scale}x {name}: {stages[name]['seconds']:.3f}s, "
+                    f"{stages[name]['peak_bytes'] / 2**20:.1f} MiB",
+                    file=sys.stderr,
+                )
+            results["scales"][f"{scale}x"] = {
+                "rows": dataset["rows"],
+                "stages": stages,
+            }
+    finally:
+        logger.getLogger().setLevel(level)
+        (bd.CSV_CACHE.enabled, bd.TILE_CACHE.enabled) = cache_enabled
+        bd.BUILD_CACHE_FOLDER = cache_folder
+        if tmp_folder is not None:
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+
+    return results
+
+
+def compare_results(
+    baseline: dict, results: dict, threshold: float = DEFAULT_THRESHOLD
+):
+    """Compare benchmark results against a baseline.
+
+    Args:
+        baseline (dict): The baseline results.
+        results (dict): The new results.
+        threshold (float): The relative slowdown (e.g. 0.2 for 20%) above
+          which a stage counts as a regression.
+
+    Returns:
+        list: (scale, stage, baseline seconds, new seconds) for each
+        regression.
+    """
+    regressions = []
+    for (scale, r) in results["scales"].items():
+        if scale not in baseline["scales"]:
+            continue
+        old_stages = baseline["scales"][scale]["stages"]
+        for (name, stage) in r["stages"].items():
+            if name not in old_stages:
+                continue
+            old, new = old_stages[name]["seconds"], stage["seconds"]
+            if new > old * (1 + threshold):
+                regressions.append((scale, name, old, new))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        type=float,
+        default=DEFAULT_SCALES,
+        help="The scales of the synthetic datasets.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="The number of timed runs."
+    )
+    parser.add_argument(
+        "--data-folder",
+        help="Generate the datasets here (and keep them) instead of in a "
+        "temporary folder.",
+    )
+    parser.add_argument("--output", help="Save the results to this file.")
+    parser.add_argument(
+        "--compare", help="Compare the results against this results file."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="The relative slowdown that counts as a regression.",
+    )
+    args = parser.parse_args(args)
+
+    scales = [int(s) if s == int(s) else s for s in args.scales]
+    results = run_benchmarks(scales, args.repeat, args.data_folder)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        for (scale, name, old, new) in regressions:
+            print(
+                f"REGRESSION {scale} {name}: {old:.3f}s -> {new:.3f}s",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,243 @@
+""" Generate synthetic datasets for benchmarking the data build, by scaling
+the shipped datasets up (or down).
+
+Each copy of a row gets a letter-only tag (e.g. " ba") appended to its names,
+so that trait/spell uids stay unique; rows whose uid would collide with an
+existing one are skipped. Relic uids only have 26 * 26 possible values, so the
+number of relics is capped at that, with names constructed so that each gets
+a distinct uid.
+"""
+
+import os
+import csv
+import shutil
+
+import build_data as bd
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+MAX_RELICS = len(LETTERS) ** 2
+
+
+def tag(k: int):
+    """Return the letter-only tag of the k-th copy of a row ("" for the
+    original).
+
+    Args:
+        k (int): The index of the copy.
+
+    Returns:
+        str: The tag.
+    """
+    if k == 0:
+        return ""
+    letters = ""
+    while k > 0:
+        k, r = divmod(k, len(LETTERS))
+        letters = LETTERS[r] + letters
+    return " b" + letters
+
+
+def _copies(rows: list, scale: float):
+    """Yield (k, row) for each copy of each row, such that there are
+    round(len(rows) * scale) rows in total.
+    """
+    n = max(1, round(len(rows) * scale))
+    for i in range(n):
+        yield i // len(rows), rows[i % len(rows)]
+
+
+def _read_csv(filename: str):
+    with open(filename, "r") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def _write_csv(filename: str, fieldnames: list, rows: list, first_line=None):
+    with open(filename, "w", newline="") as f:
+        if first_line is not None:
+            f.write(first_line)
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _generate_traits(folder: str, scale: float):
+    with open(bd.SUC_DATA_FILENAME, "r") as f:
+        first_line = f.readline()
+        reader = csv.DictReader(f)
+        fieldnames, rows = reader.fieldnames, list(reader)
+
+    uids = set()
+    traits = []
+    for (k, row) in _copies(rows, scale):
+        row = dict(row)
+        row["Creature"] += tag(k)
+        row["Trait Name"] += tag(k)
+        uid = bd.generate_uid(
+            {
+                "family": row["Family"].strip(),
+                "creature": row["Creature"].strip(),
+                "trait_name": row["Trait Name"].strip(),
+            }
+        )
+        if uid in uids:
+            continue
+        uids.add(uid)
+        traits.append(row)
+
+    filename = os.path.join(folder, "traits.csv")
+    _write_csv(filename, fieldnames, traits, first_line)
+    return filename, len(traits)
+
+
+def _generate_creatures(folder: str, scale: float):
+    fieldnames, rows = _read_csv(bd.SUAPI_DATA_FILENAME)
+    sprites_folder = os.path.join(folder, "sprites")
+    os.makedirs(sprites_folder, exist_ok=True)
+
+    creatures = []
+    for (k, row) in _copies(rows, scale):
+        row = dict(row)
+        row["trait"] += tag(k)
+        row["battle_sprite"] = tag(k).strip() + row["battle_sprite"]
+        creatures.append(row)
+        # Only the existence of the sprites is checked.
+        open(os.path.join(sprites_folder, row["battle_sprite"]), "w").close()
+
+    filename = os.path.join(folder, "creatures.csv")
+    _write_csv(filename, fieldnames, creatures)
+    return filename, sprites_folder, len(creatures)
+
+
+def _generate_specializations(folder: str, scale: float):
+    spec_fields, specs = _read_csv(bd.SPECIALIZATIONS_FILENAME)
+    perk_fields, perks = _read_csv(bd.PERKS_FILENAME)
+    suapi_fields, suapi_perks = _read_csv(bd.SUAPI_PERK_DATA_FILENAME)
+    icons_folder = os.path.join(folder, "perk_icons")
+    os.makedirs(icons_folder, exist_ok=True)
+
+    new_specs, new_perks, new_suapi_perks = [], [], []
+    for (k, spec) in _copies(specs, scale):
+        name = spec["name"]
+        new_specs.append(dict(spec, name=name + tag(k)))
+        new_perks += [
+            dict(p, specialization=name + tag(k))
+            for p in perks
+            if p["specialization"] == name
+        ]
+        for p in suapi_perks:
+            if p["specialization"] != name:
+                continue
+            icon = tag(k).strip() + p["icon"]
+            new_suapi_perks.append(
+                dict(p, specialization=name + tag(k), icon=icon)
+            )
+            src = os.path.join(bd.PERK_ICONS_FOLDER, p["icon"])
+            if os.path.isfile(src):
+                shutil.copyfile(src, os.path.join(icons_folder, icon))
+
+    specs_filename = os.path.join(folder, "specializations.csv")
+    perks_filename = os.path.join(folder, "perks.csv")
+    suapi_perks_filename = os.path.join(folder, "suapi_perks.csv")
+    _write_csv(specs_filename, spec_fields, new_specs)
+    _write_csv(perks_filename, perk_fields, new_perks)
+    _write_csv(suapi_perks_filename, suapi_fields, new_suapi_perks)
+
+    output_folder = os.path.join(folder, "perk_icons_output")
+    os.makedirs(output_folder, exist_ok=True)
+    shutil.copyfile(
+        os.path.join(bd.PERK_ICON_OUTPUT_FOLDER, bd.MISSING_ICON_FILENAME),
+        os.path.join(output_folder, bd.MISSING_ICON_FILENAME),
+    )
+    return (
+        specs_filename,
+        perks_filename,
+        suapi_perks_filename,
+        icons_folder,
+        output_folder,
+        len(new_perks),
+    )
+
+
+def _generate_relics(folder: str, scale: float):
+    fieldnames, rows = _read_csv(bd.RELICS_FILENAME)
+    names = list(dict.fromkeys(row["Relic"] for row in rows))
+    ranks = {n: [row for row in rows if row["Relic"] == n] for n in names}
+    n_relics = min(MAX_RELICS, max(1, round(len(names) * scale)))
+
+    relics = []
+    for i in range(n_relics):
+        name = names[i % len(names)]
+        # The uid is the 6th and 13th letters of the name.
+        a, b = LETTERS[i // len(LETTERS)], LETTERS[i % len(LETTERS)]
+        new_name = f"Relic {a.upper()} Bygone {b}, {name}"
+        relics += [dict(row, Relic=new_name) for row in ranks[name]]
+
+    filename = os.path.join(folder, "relics.csv")
+    _write_csv(filename, fieldnames, relics)
+    return filename, len(relics)
+
+
+def _generate_spells(folder: str, scale: float):
+    fieldnames, rows = _read_csv(bd.SPELLS_FILENAME)
+    uids = set()
+    spells = []
+    for (k, row) in _copies(rows, scale):
+        row = dict(row)
+        row["Spell Name"] += tag(k)
+        uid = bd.generate_spell_uid(row["Spell Name"], row["Class"])
+        if uid in uids:
+            continue
+        uids.add(uid)
+        spells.append(row)
+
+    filename = os.path.join(folder, "spells.csv")
+    _write_csv(filename, fieldnames, spells)
+    return filename, len(spells)
+
+
+def generate_dataset(folder: str, scale: float):
+    """Generate a synthetic dataset at the given scale relative to the
+    shipped data. Must be run from the root of the repository.
+
+    Args:
+        folder (str): The folder to generate the dataset in.
+        scale (float): The scale, e.g. 10 for ten times the shipped data.
+
+    Returns:
+        dict: The filenames/folders of the dataset, and the number of rows
+        in each.
+    """
+    os.makedirs(folder, exist_ok=True)
+    traits, n_traits = _generate_traits(folder, scale)
+    creatures, sprites, n_creatures = _generate_creatures(folder, scale)
+    (
+        specs,
+        perks,
+        suapi_perks,
+        icons,
+        icons_output,
+        n_perks,
+    ) = _generate_specializations(folder, scale)
+    relics, n_relics = _generate_relics(folder, scale)
+    spells, n_spells = _generate_spells(folder, scale)
+    return {
+        "traits": traits,
+        "creatures": creatures,
+        "sprites_folder": sprites,
+        "godshop_locations": bd.GODSHOP_LOCATIONS_FILENAME,
+        "specializations": specs,
+        "perks": perks,
+        "suapi_perks": suapi_perks,
+        "perk_icons_folder": icons,
+        "perk_icons_output_folder": icons_output,
+        "relics": relics,
+        "spells": spells,
+        "rows": {
+            "traits": n_traits,
+            "creatures": n_creatures,
+            "perks": n_perks,
+            "relics": n_relics,
+            "spells": n_spells,
+        },
+    }
@@ -2,13 +2,37 @@
 Loads data from the Siralim Ultimate Compendium and Siralim Ultimate API.
 """
 
-import sys
 import csv
+import argparse
 import os
 import json
+import time
 import hashlib
 import logging as logger
-from PIL import Image
+
+from siralim_data import (
+    atlas,
+    columnar,
+    compress,
+    database,
+    instrument,
+    releases,
+    search_index,
+    serialize,
+    shards,
+    steam_guide,
+    trait_store,
+    uids,
+    watch,
+)
+from siralim_data.atlas import composite_sheet
+from siralim_data.assets import AssetIndex, get_asset_index
+from siralim_data.csv_cache import CsvCache
+from siralim_data.join import JoinIndex
+from siralim_data.manifest import BuildManifest
+from siralim_data.pipeline import Stage, run_stages
+from siralim_data.records import TRAIT_COLUMNS, TraitRecord
+from siralim_data.stats import StatTable
 
 logger.basicConfig(format="%(levelname)s: %(message)s", level=logger.INFO)
 
@@ -28,6 +52,8 @@ SUC_DATA_FILENAME = (
 
 SPECIALIZATIONS_FILENAME = "data/steam-guide/specializations.csv"
 PERKS_FILENAME = "data/steam-guide/perks.csv"
+STEAM_GUIDE_FILENAME = "data/steam-guide/steam_guide.txt"
+STEAM_GUIDE_SPECS_FILENAME = "data/steam-guide/specializations.txt"
 RELICS_FILENAME = (
     "data/siralim-ultimate-compendium/Siralim Ultimate Compendium - Relics.csv"
 )
@@ -39,6 +65,22 @@ PERK_ICONS_FOLDER = os.path.join("data", "siralim-ultimate-api", "perk_icons")
 
 MISSING_ICON_FILENAME = "MISSING_ICON.png"
 PERK_ICON_OUTPUT_FOLDER = os.path.join("public", "perk_icons")
+SPRITES_FOLDER = os.path.join("public", "suapi-battle-sprites")
+SPRITE_ATLAS_FOLDER = os.path.join("public", "sprite_atlas")
+SPRITE_ATLAS_INDEX_FILENAME = "sprite_atlas.json"
+SPRITE_ATLAS_MAX_SIZE = 2048
+
+# Local cache of indexes etc that are reused between builds.
+BUILD_CACHE_FOLDER = ".build_cache"
+
+# Cache of the parsed csv files, keyed on the contents of each file.
+CSV_CACHE = CsvCache(os.path.join(BUILD_CACHE_FOLDER, "csv"))
+TILE_CACHE = atlas.TileCache(os.path.join(BUILD_CACHE_FOLDER, "tiles"))
+JOIN_REPORT_FOLDER = "join_reports"
+
+# The build script itself is an input of every stage, so that changing
+# the way the data is built invalidates the previous outputs.
+BUILD_SCRIPT_FILENAME = os.path.relpath(__file__)
 
 
 def generate_unique_name(row):
@@ -56,11 +98,11 @@ def generate_unique_name(row):
     Returns:
         str: The unique name of the row.
     """
-    return "%s_%s_%s" % (
-        row["family"].lower(),
-        row["creature"].lower(),
-        row["trait_name"].lower(),
-    )
+    return _unique_name(row["family"], row["creature"], row["trait_name"])
+
+
+def _unique_name(family: str, creature: str, trait_name: str):
+    return "%s_%s_%s" % (family.lower(), creature.lower(), trait_name.lower())
 
 
 def generate_uid(row: dict):
@@ -73,9 +115,22 @@ def generate_uid(row: dict):
     Returns:
         str: The uid.
     """
-    return hashlib.md5(generate_unique_name(row).encode("utf-8")).hexdigest()[
-        :HASH_LENGTH
-    ]
+    return _hash_unique_name(generate_unique_name(row))
+
+
+def _hash_unique_name(unique_name: str):
+    return hashlib.md5(unique_name.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+
+# The columns of the compendium that are joined to make the search text.
+SEARCH_TEXT_COLUMNS = [
+    "Class",
+    "Creature",
+    "Family",
+    "Trait Name",
+    "Trait Description",
+    "Material Name",
+]
 
 
 def generate_search_text(row: dict):
@@ -89,25 +144,36 @@ def generate_search_text(row: dict):
     Returns:
         str: The search text.
     """
-    ri = dict(row)
-    return " ".join(
-        [
-            ri["Class"],
-            ri["Creature"],
-            ri["Family"],
-            ri["Trait Name"],
-            ri["Trait Description"],
-            ri["Material Name"],
-        ]
-    )
+    return " ".join([row[k] for k in SEARCH_TEXT_COLUMNS])
 
 
-def load_csv_file(filename: str):
-    """Load the Siralim Ultimate Compendium dataset and extract a JSON
-    object for each row. We use the Siralim Ultimate Compendium (rather than
+def read_compendium_version(filename: str):
+    """Read the version number from the first line of the Siralim Ultimate
+    Compendium - Traits csv.
+
+    Args:
+        filename (str): The filename of the csv.
+
+    Returns:
+        str: The version number.
+    """
+    with open(filename, "r") as f:
+        line = f.readline()
+    version = line.split("Version ")[1].split(",")[0]
+    logger.info("Using compendium version %s." % version)
+    return version
+
+
+@CSV_CACHE.cached(version=2, depends=[TraitRecord])
+def iter_csv_file(filename: str):
+    """Stream the Siralim Ultimate Compendium dataset, yielding a TraitRecord
+    for each row. We use the Siralim Ultimate Compendium (rather than
     the Siralim Ultimate API dataset) because it has not only creatures,
     but also Backer Traits, Nether Boss Traits, etc.
 
+    The header is normalised once, and the uid and search text of each row
+    are derived in the same pass as the row is read.
+
     For each monster/trait we generate a 'uid', a <HASH_LENGTH>-character
     representation of that monster/trait, so that it can be uniquely
     identified even when the order of the data changes.
@@ -116,40 +182,70 @@ def load_csv_file(filename: str):
         filename (str): The filename of the Siralim Ultimate Compendium -
         Traits csv to load.
 
-    Returns:
-        list, str: The JSON data from the csv and the version number.
+    Uniqueness of the uids is checked by the uids stage (see
+    siralim_data/uids.py).
+
+    Yields:
+        TraitRecord: The record of each monster/trait.
     """
-    json_data = []
-    hash_set = set()
     with open(filename, "r") as f:
-        line = f.readline()
-        version = line.split("Version ")[1].split(",")[0]
-        logger.info("Using compendium version %s." % version)
-        csv_reader = csv.DictReader(f)
+        f.readline()  # Version line
+        csv_reader = csv.reader(f)
+        header = next(csv_reader)
+        columns = [k.lower().replace(" ", "_") for k in header]
+        missing = set(TRAIT_COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(
+                f"{filename} is missing columns: {', '.join(sorted(missing))}"
+            )
+        # TRAIT_COLUMNS is in the same order as the fields of TraitRecord.
+        field_indexes = [columns.index(k) for k in TRAIT_COLUMNS]
+        search_indexes = [header.index(k) for k in SEARCH_TEXT_COLUMNS]
+
         for row in csv_reader:
-            json_obj = {
-                k.lower().replace(" ", "_"): v.strip() for k, v in row.items()
-            }
-            json_obj["search_text"] = generate_search_text(row)
-            uid = generate_uid(json_obj)
-            json_obj["uid"] = uid
-            json_data.append(json_obj)
-            assert uid not in hash_set
-            hash_set.add(uid)
+            values = [row[i].strip() for i in field_indexes]
+            (_, family, creature, trait_name, _, _) = values
+            uid = _hash_unique_name(_unique_name(family, creature, trait_name))
+            yield TraitRecord(
+                *values,
+                search_text=" ".join([row[i] for i in search_indexes]),
+                uid=uid,
+            )
+
+
+def load_csv_file(filename: str):
+    """Load the Siralim Ultimate Compendium dataset and extract a JSON
+    object for each row. See iter_csv_file.
+
+    Args:
+        filename (str): The filename of the Siralim Ultimate Compendium -
+        Traits csv to load.
+
+    Returns:
+        list, str: The JSON data from the csv and the version number.
+    """
+    version = read_compendium_version(filename)
+    json_data = [record.to_dict() for record in iter_csv_file(filename)]
     return json_data, version
 
 
-def save_json_data(json_data: list, filename: str):
-    """Save the JSON data to the given filename.
+def save_json_data(json_data, filename: str, emitters: list = None):
+    """Save the JSON data to the given filename (see
+    siralim_data.serialize).
 
     Args:
-        json_data (list): The list of JSON rows.
+        json_data (list or dict): The JSON data.
         filename (str): The filename to save to.
+        emitters (list): The names of the extra emitters to save the data
+          with, e.g. ["pretty"].
+
+    Returns:
+        list: The filenames that were saved.
     """
-    with open(filename, "w") as f:
-        json.dump(json_data, f, indent=1)
+    return serialize.Serializer(emitters).save(json_data, filename)
 
 
+@CSV_CACHE.cached()
 def load_suapi_data(filename: str):
     """Open the Siralim Ultimate API dataset and extract a map of
     { trait_name : { sprite_filename: <filename>,
@@ -189,57 +285,100 @@ def load_suapi_data(filename: str):
     return suapi_data
 
 
-def add_sprites_and_stats(json_data: list):
-    """Add the sprite_filenames and stats to each object in the JSON data.
+def add_sprites_and_stats(
+    records,
+    suapi_filename: str = SUAPI_DATA_FILENAME,
+    sprites: AssetIndex = None,
+    report_filename: str = None,
+):
+    """Add the sprite_filenames and stats to each record of the compendium.
     The sprite filenames and stats are sourced from the Siralim Ultimate API:
     https://github.com/rovermicrover/siralim-ultimate-api
 
-    Args:
-        json_data (list): A list of JSON rows, where each row corresponds to a
-          monster/trait.
+    Traits are joined to SUAPI creatures by normalized trait name, falling
+    back to fuzzy matching for the traits of creatures (see
+    siralim_data/join.py).
 
-    Returns:
-        list: The updated JSON data now with sprites and stats.
+    Args:
+        records (iterable): The TraitRecords, where each record corresponds to
+          a monster/trait.
+        suapi_filename (str): The filename of the SUAPI creatures.csv.
+        sprites (AssetIndex): The index of the sprites folder. If not given,
+          the shared index of SPRITES_FOLDER is used.
+        report_filename (str, optional): If given, save the join report to
+          this filename once the records have been consumed.
+
+    Yields:
+        TraitRecord: The records, now with sprites and stats.
     """
-    suapi_data = load_suapi_data(SUAPI_DATA_FILENAME)
-    traits_not_in_suapi = []
-    for obj in json_data:
-        t = obj["trait_name"].lower()
-        if t in suapi_data:
-            for (k, v) in suapi_data[t].items():
-                obj[k] = v
+    suapi_data = load_suapi_data(suapi_filename)
+    index = JoinIndex(suapi_data.items(), name="suapi_creatures")
+
+    def join(records):
+        for record in records:
+            is_creature = is_creature_class(record.class_)
+            suapi_row = index.get(
+                record.trait_name, fuzzy=is_creature, report=is_creature
+            )
+            if suapi_row is not None:
+                record.stats = suapi_row["stats"]
+                record.sprite_filename = suapi_row["sprite_filename"]
+                record.sources = list(suapi_row["sources"])
+            yield record
 
-    validate_traits(json_data, suapi_data)
+        index.report.log()
+        if report_filename is not None:
+            index.report.save(report_filename)
 
-    return json_data
+    return validate_traits(join(records), sprites)
 
 
-def add_godshop_locations(json_data: list):
+@CSV_CACHE.cached()
+def load_godshop_locations(filename: str):
+    """Load the location of each god shop.
 
+    Args:
+        filename (str): The filename of godshop_locations.csv.
+
+    Returns:
+        dict: Map of (lowercase) god name -> location.
+    """
     locations = {}
-    with open(GODSHOP_LOCATIONS_FILENAME, "r") as f:
+    with open(filename, "r") as f:
         reader = csv.DictReader(f)
         for row in reader:
             locations[row["God"].lower()] = row["Location"]
+    return locations
 
-    for i, obj in enumerate(json_data):
-        if "sources" not in obj:
-            continue
-        sources = obj["sources"]
+
+def add_godshop_locations(
+    records, locations_filename: str = GODSHOP_LOCATIONS_FILENAME
+):
+    """Add the location of each god shop to the sources of each record.
+
+    Args:
+        records (iterable): The TraitRecords.
+        locations_filename (str): The filename of godshop_locations.csv.
+
+    Yields:
+        TraitRecord: The records, with god shop locations.
+    """
+    locations = load_godshop_locations(locations_filename)
+
+    for record in records:
+        sources = record.sources or []
         for j, s in enumerate(sources):
             if "God Shop" in s:
-                location = "nowhere"
                 god = s.split(" God Shop")[0].lower()
 
                 try:
                     location = locations[god]
-                    json_data[i]["sources"][j] += f" ({location})"
+                    sources[j] += f" ({location})"
                 except KeyError as e:
                     logger.warning(
                         f"Missing god name: {god} in godshop_locations.csv"
                     )
-
-    return json_data
+        yield record
 
 
 def is_creature_class(c: str):
@@ -255,44 +394,45 @@ def is_creature_class(c: str):
     return c in ["Nature", "Death", "Chaos", "Life", "Sorcery"]
 
 
-def validate_traits(json_data: list, suapi_data: dict):
-    """For each trait in the json_data, check whether it exists in the SUAPI
-    data, and if so, check whether the sprite actually exists.
+def validate_traits(records, sprites: AssetIndex = None):
+    """For each trait in the records, check whether it was joined to the
+    SUAPI data, and if so, check whether the sprite actually exists. A
+    summary is logged once the records have been consumed.
 
     Args:
-        json_data (list): A list of JSON rows, where each row corresponds to a
-          monster/trait.
-        suapi_data (dict): A dict mapping each trait to a list of stats for
-          that creature, as well as the sprite filename of that creature.
+        records (iterable): The TraitRecords, where each record corresponds to
+          a monster/trait, after joining them to the SUAPI data.
+        sprites (AssetIndex): The index of the sprites folder. If not given,
+          the shared index of SPRITES_FOLDER is used.
+
+    Yields:
+        TraitRecord: The records, with their sprite filenames set to the path
+        of the sprite.
     """
+    if sprites is None:
+        sprites = get_asset_index(SPRITES_FOLDER, BUILD_CACHE_FOLDER)
     n_missing = 0
     n_missing_sprites = 0
-    for i, obj in enumerate(json_data):
-        creature = obj["creature"]
-        t = obj["trait_name"].lower()
-        c = obj["class"]
-        if is_creature_class(c) and t not in suapi_data:
+    for record in records:
+        creature = record.creature
+        if is_creature_class(record.class_) and record.stats is None:
             logger.warning(
-                f"[{creature} ({obj['trait_name']})] does not "
+                f"[{creature} ({record.trait_name})] does not "
                 "appear in SUAPI data."
             )
             n_missing += 1
-            continue
-
-        # If not a creature class that does not appear in suapi data, continue
-        if t not in suapi_data:
-            continue
-
-        sf = suapi_data[t]["sprite_filename"]
-        sprite_path = get_sprite_path(sf, obj["creature"])
-        if not sprite_path:
-            logger.info(f"[{creature}] sprite ({sf}) is not present.")
-            json_data[i]["sprite_filename"] = "MISSING.png"
-            n_missing_sprites += 1
-        else:
-            json_data[i]["sprite_filename"] = sprite_path
-            # A bit hacky, but set the suapi filename to the actual filename
-            # (which may be under forum_avatars).
+        elif record.stats is not None:
+            sf = record.sprite_filename
+            sprite_path = get_sprite_path(sf, creature, sprites)
+            if not sprite_path:
+                logger.info(f"[{creature}] sprite ({sf}) is not present.")
+                record.sprite_filename = "MISSING.png"
+                n_missing_sprites += 1
+            else:
+                record.sprite_filename = sprite_path
+                # A bit hacky, but set the suapi filename to the actual
+                # filename (which may be under forum_avatars).
+        yield record
 
     if n_missing > 0:
         logger.warning(
@@ -304,54 +444,54 @@ def validate_traits(json_data: list, suapi_data: dict):
             f"{n_missing_sprites} traits have sprite_filenames "
             "that do not exist."
         )
-    print()
 
 
-def get_sprite_path(sprite_filename: str, creature_name: str):
+def get_sprite_path(
+    sprite_filename: str, creature_name: str, sprites: AssetIndex = None
+):
     """Return the sprite_filename.
-    First check whether it exists under
-    /public/suapi_battle_sprites.
-    If not, check under the forum_avatars.
+    Check whether it exists under /public/suapi_battle_sprites, ignoring case
+    and apostrophes if there is no exact match.
     If not found, return False.
 
     Args:
         sprite_filename (str): The filename of the sprite.
+        creature_name (str): The name of the creature.
+        sprites (AssetIndex): The index of the sprites folder. If not given,
+          the shared index is used.
     """
+    if sprites is None:
+        sprites = get_asset_index(SPRITES_FOLDER, BUILD_CACHE_FOLDER)
 
-    def sanitise(name):
-        return name.replace("'", "")
-
-    if os.path.isfile(
-        os.path.join("public", "suapi-battle-sprites", sprite_filename)
-    ):
-        return f"suapi-battle-sprites/{sprite_filename}"
+    name = sprites.find(sprite_filename)
+    if name is not None:
+        return f"suapi-battle-sprites/{name}"
     return False
 
 
-def load_specializations_data(specs_filename, perks_filename):
-    """Load the specializations data from the given filename.
-    This is taken from the Steam guide for the specializations.
+@CSV_CACHE.cached()
+def load_suapi_perk_icons(filename: str):
+    """Load the icon filename of each perk from the SUAPI perks.csv.
 
     Args:
-        specs_filename (str): The filename of specializations.
-        perks_filename (str): The filename of perks.
+        filename (str): The filename of the SUAPI perks.csv.
 
     Returns:
-        list: A list of all specializations.
+        dict: Map of (specialization, perk name) -> icon filename.
     """
-    specializations = []
-    specialization_ids = {}
-    specialization_abbrevs = {}
-
-    # Load perk filenames from SUAPI
     perk_icons = {}
-    with open(SUAPI_PERK_DATA_FILENAME, "r") as f:
+    with open(filename, "r") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            spec = row["specialization"]
-            perk = row["name"]
-            icon = row["icon"]
-            perk_icons[f"{spec}_{perk}"] = icon
+            perk_icons[(row["specialization"], row["name"])] = row["icon"]
+    return perk_icons
+
+
+@CSV_CACHE.cached()
+def _load_specializations(specs_filename: str, perks_filename: str):
+    specializations = []
+    specialization_ids = {}
+    specialization_abbrevs = {}
 
     # Load specs
     with open(specs_filename, "r") as f:
@@ -381,21 +521,91 @@ def load_specializations_data(specs_filename, perks_filename):
                 ]
             )
             del json_obj["specialization"]
-            name = json_obj["name"].split(" (ASCENSION)")[0]
-            try:
-                icon = perk_icons[f"{spec}_{name}"]
-            except KeyError:
+            specializations[specialization_ids[spec]]["perks"].append(json_obj)
+
+    return specializations
+
+
+def load_specializations_data(
+    specs_filename,
+    perks_filename,
+    suapi_perks_filename=SUAPI_PERK_DATA_FILENAME,
+    report_filename: str = None,
+):
+    """Load the specializations data from the given filename.
+    This is taken from the Steam guide for the specializations.
+    The icon of each perk is joined from the SUAPI data by specialization and
+    normalized perk name (see siralim_data/join.py).
+
+    Args:
+        specs_filename (str): The filename of specializations.
+        perks_filename (str): The filename of perks.
+        suapi_perks_filename (str): The filename of the SUAPI perks.csv,
+          which holds the icon filename of each perk.
+        report_filename (str, optional): If given, save the join report of
+          the perk icons to this filename.
+
+    Returns:
+        list: A list of all specializations.
+    """
+    specializations = _load_specializations(specs_filename, perks_filename)
+    index = JoinIndex(
+        load_suapi_perk_icons(suapi_perks_filename).items(), name="suapi_perks"
+    )
+
+    for spec in specializations:
+        for perk in spec["perks"]:
+            icon = index.get((perk["spec"], perk["name"]))
+            if icon is None:
                 icon = MISSING_ICON_FILENAME
                 logger.warning(
-                    f"Missing perk icon in SUAPI data for perk '{name}'"
+                    "Missing perk icon in SUAPI data for perk "
+                    f"'{perk['name']}'"
                 )
+            perk["icon"] = icon
 
-            json_obj["icon"] = icon
-            specializations[specialization_ids[spec]]["perks"].append(json_obj)
+    index.report.log()
+    if report_filename is not None:
+        index.report.save(report_filename)
 
     return specializations
 
 
+def _letters_only(s: str):
+    return "".join([c for c in s if c in "abcdefghijklmnopqrstuvwxyz"])
+
+
+def generate_relic_uid(name: str):
+    """Generate the two-character uid of a relic, i.e. the 6th and 13th
+    letters of its name (which happen not to collide).
+
+    Args:
+        name (str): The name of the relic.
+
+    Returns:
+        str: The uid.
+    """
+    raw_name = _letters_only(name.lower())
+    return raw_name[5] + raw_name[12]
+
+
+def generate_spell_uid(name: str, spell_class: str):
+    """Generate the uid of a spell, i.e. the hash of the letters of its name
+    and class. Note that the class is not lowercased, so only its lowercase
+    letters count.
+
+    Args:
+        name (str): The name of the spell.
+        spell_class (str): The class of the spell.
+
+    Returns:
+        str: The uid.
+    """
+    raw_name = _letters_only(name.lower() + spell_class)
+    return hashlib.md5(raw_name.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+
+@CSV_CACHE.cached()
 def load_relics_data(relics_filename):
     """Load the list of relics from the compendium.
 
@@ -404,7 +614,6 @@ def load_relics_data(relics_filename):
           the compendium.
     """
     relics = {}
-    uids = {}
     with open(relics_filename, "r") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -416,25 +625,8 @@ def load_relics_data(relics_filename):
             )
             relic["abbreviation"] = abbrev
 
-            # Get uid and ensure it is unique.
-            # A bit messy but gets the job done.
-            raw_name = "".join(
-                [
-                    c
-                    for c in relic["name"].lower()
-                    if c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ".lower()
-                ]
-            )
-            uid = raw_name[5] + raw_name[12]
-            uid = uid.lower()
-            if uid in uids and uids[uid] != raw_name:
-                logger.error(
-                    f"uid '{uid}' already exists. "
-                    f"({raw_name}, {uids[uid]})"
-                )
-                sys.exit(0)
-            uids[uid] = raw_name
-            relic["uid"] = uid
+            # Uniqueness is checked by the uids stage.
+            relic["uid"] = generate_relic_uid(relic["name"])
 
             if relic["name"] not in relics:
                 relics[relic["name"]] = relic
@@ -450,6 +642,7 @@ def load_relics_data(relics_filename):
     return sorted_relics
 
 
+@CSV_CACHE.cached()
 def load_spells_data(spells_filename):
     """Load the list of relics from the compendium.
 
@@ -458,7 +651,6 @@ def load_spells_data(spells_filename):
           the compendium.
     """
     spells = {}
-    uids = {}
     with open(spells_filename, "r") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -476,25 +668,8 @@ def load_spells_data(spells_filename):
                 ]
             )
 
-            # Get uid and ensure it is unique.
-            # A bit messy but gets the job done.
-            uid = "".join(
-                [
-                    c
-                    for c in spell["name"].lower()+spell["class"]
-                    if c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ".lower()
-                ]
-            )
-            uid = hashlib.md5(uid.encode("utf-8")).hexdigest()[:HASH_LENGTH]
-            if uid in uids:
-                print(uid)
-                logger.error(
-                    f"uid '{uid}' already exists. "
-                    f"({spell}, {uids[uid]})"
-                )
-                sys.exit(0)
-            uids[uid] = 1
-            spell["uid"] = uid
+            # Uniqueness is checked by the uids stage.
+            spell["uid"] = generate_spell_uid(spell["name"], spell["class"])
 
             if spell["name"] not in spells:
                 spells[spell["name"]] = spell
@@ -507,127 +682,1410 @@ def generate_metadata(compendium_version, json_data):
     """Simple function to generate some 'metadata' (compendium version,
     highest/lowest stats etc) and save it as a dictionary.
 
+    The stats are aggregated over a StatTable (see siralim_data.stats), both
+    overall and per class/family, along with percentiles and histograms.
+
     Args:
         compendium_version (str): The version of the SU Compendium.
         json_data (list): A list of JSON rows, each corresponding to a monster
           /trait.
 
     Returns:
-        dict: A dict of metadata (comp version, min stats, max stats).
+        dict: A dict of metadata (comp version, min stats, max stats etc).
     """
-    metadata = {
-        "compendium_version": compendium_version,
-        "min_stats": {},
-        "max_stats": {},
-    }
+    table = StatTable.from_traits(json_data)
+    summary = table.summary()
 
-    total_stats = {}
-    n_monsters_with_stats = 0
-
-    for obj in json_data:
-        if "stats" in obj:
-            n_monsters_with_stats += 1
-            stats = obj["stats"]
-            for (k, v) in stats.items():
-                if k not in metadata["min_stats"]:
-                    metadata["min_stats"][k] = v
-                if k not in metadata["max_stats"]:
-                    metadata["max_stats"][k] = v
-                if v < metadata["min_stats"][k]:
-                    metadata["min_stats"][k] = v
-                if v > metadata["max_stats"][k]:
-                    metadata["max_stats"][k] = v
-
-                if k not in total_stats:
-                    total_stats[k] = 0
-                total_stats[k] += v
-
-    metadata["average_stats"] = {
-        k: round(v / n_monsters_with_stats) for k, v in total_stats.items()
+    return {
+        "compendium_version": compendium_version,
+        "min_stats": summary["min_stats"],
+        "max_stats": summary["max_stats"],
+        "average_stats": summary["average_stats"],
+        "stat_percentiles": summary["percentiles"],
+        "stat_histograms": table.histograms(),
+        "class_stats": {
+            k: t.summary() for (k, t) in table.group_by("class").items()
+        },
+        "family_stats": {
+            k: t.summary(with_percentiles=False)
+            for (k, t) in table.group_by("family").items()
+        },
     }
 
-    return metadata
-
 
-def build_perk_icon_image(specializations_data):
+def build_perk_icon_image(
+    specializations_data,
+    icons_folder=PERK_ICONS_FOLDER,
+    output_folder=PERK_ICON_OUTPUT_FOLDER,
+    jobs: int = 1,
+    optimize: bool = False,
+    webp: bool = False,
+):
     """Build a big image of all the perk icons joined together.
     This is done to avoid having 500 requests for all the perk icons.
+    Decoded icons are cached in TILE_CACHE, and the image is only re-encoded
+    when an icon or its position has changed.
 
     Args:
         specializations_data (dict): The specializations data.
+        icons_folder (str): The folder containing the perk icons.
+        output_folder (str): The folder to save perk_icons.png to (which
+          must also contain MISSING_ICON.png).
+        jobs (int): The number of processes to decode the icons with.
+        optimize (bool): Whether to compress perk_icons.png harder
+          (losslessly).
+        webp (bool): Whether to also save a lossless perk_icons.webp.
 
     Returns:
         dict: The updated specializations data, with the coordinates of the
         perk's respective icons in the big image.
     """
+    icons = get_asset_index(icons_folder, BUILD_CACHE_FOLDER)
     max_perks = max([len(spec["perks"]) for spec in specializations_data])
 
-    perk_image = Image.new(
-        "RGBA", (16 * max_perks, 16 * len(specializations_data))
-    )
-
+    tiles = []
     for i, spec in enumerate(specializations_data):
         for j, perk in enumerate(spec["perks"]):
-            icon = perk["icon"]
-            icon_filename = os.path.join(PERK_ICONS_FOLDER, icon)
-            if not os.path.isfile(icon_filename):
+            icon_filename = icons.path(perk["icon"])
+            if icon_filename is None:
                 logger.warning(f"Missing perk icon for {perk['name']}")
                 icon_filename = os.path.join(
-                    PERK_ICON_OUTPUT_FOLDER, MISSING_ICON_FILENAME
+                    output_folder, MISSING_ICON_FILENAME
                 )
 
-            im = Image.open(icon_filename)
             coords = (j * 16, i * 16)
-            perk_image.paste(im, coords)
+            tiles.append((icon_filename, coords))
             specializations_data[i]["perks"][j]["icon_coords"] = coords
 
-    perk_image.save(os.path.join(PERK_ICON_OUTPUT_FOLDER, "perk_icons.png"))
+    composite_sheet(
+        (16 * max_perks, 16 * len(specializations_data)),
+        tiles,
+        os.path.join(output_folder, "perk_icons.png"),
+        TILE_CACHE,
+        jobs=jobs,
+        optimize=optimize,
+        webp=webp,
+    )
 
     return specializations_data
 
 
-def build_data(output_folder: str):
-    """Build the data to the specified output folder.
+def _atlas_shard(record: TraitRecord, shard_by_class: bool):
+    if not shard_by_class:
+        return "all"
+    return record.class_.lower().replace(" ", "_")
+
+
+def build_sprite_atlas(
+    records: list,
+    max_size: int = SPRITE_ATLAS_MAX_SIZE,
+    shard_by_class: bool = False,
+    sprites_folder: str = SPRITES_FOLDER,
+    output_folder: str = SPRITE_ATLAS_FOLDER,
+):
+    """Pack the battle sprites of the given traits into one or more sprite
+    sheets, in the same spirit as build_perk_icon_image, and set the
+    sprite_atlas of each trait to the location of its sprite, i.e.
+    {"sheet": <filename relative to public>, "x", "y", "w", "h"}.
+
+    The sheets are saved as <output_folder>/sprites_<shard>_<n>.png, along
+    with an index of the sheets (sprite_atlas.json).
+
+    Args:
+        records (list): The TraitRecords, with their sprite filenames.
+        max_size (int): The maximum width and height of each sheet.
+        shard_by_class (bool): Whether to build separate sheets for each
+          class, so that a page only loads the sprites it shows.
+        sprites_folder (str): The folder containing the sprites.
+        output_folder (str): The folder to save the sheets to.
+
+    Returns:
+        dict: The index of the sheets.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    public_folder = os.path.dirname(os.path.normpath(output_folder))
+    sprites = get_asset_index(sprites_folder, BUILD_CACHE_FOLDER)
+
+    shards = {}
+    for record in records:
+        if not record.sprite_filename:
+            continue
+        if sprites.find(os.path.basename(record.sprite_filename)) is None:
+            continue
+        shard = _atlas_shard(record, shard_by_class)
+        shards.setdefault(shard, []).append(record)
+
+    sheet_filenames = []
+    for (shard, shard_records) in sorted(shards.items()):
+        images = {
+            r.sprite_filename: sprites.path(
+                os.path.basename(r.sprite_filename)
+            )
+            for r in shard_records
+        }
+        coords, filenames = atlas.build_atlas(
+            images, output_folder, f"sprites_{shard}", max_size, TILE_CACHE
+        )
+        sheets = [
+            os.path.relpath(f, public_folder).replace(os.sep, "/")
+            for f in filenames
+        ]
+        for record in shard_records:
+            c = coords[record.sprite_filename]
+            record.sprite_atlas = dict(c, sheet=sheets[c["sheet"]])
+        sheet_filenames += filenames
+
+    # Remove the sheets of previous builds that are no longer used.
+    for name in os.listdir(output_folder):
+        path = os.path.join(output_folder, name)
+        if name.startswith("sprites_") and path not in sheet_filenames:
+            os.remove(path)
+
+    index = {
+        "max_size": max_size,
+        "shard_by_class": shard_by_class,
+        "sheets": [
+            os.path.relpath(f, public_folder).replace(os.sep, "/")
+            for f in sheet_filenames
+        ],
+    }
+    index_filename = os.path.join(output_folder, SPRITE_ATLAS_INDEX_FILENAME)
+    with open(index_filename, "w") as f:
+        json.dump(index, f, indent=1)
+
+    return index
+
+
+def build_traits(
+    output_folder: str, sprite_atlas: dict = None, emitters: list = None
+):
+    """Build the traits data (data.json) and the metadata (metadata.json).
+
+    Args:
+        output_folder (str): The output folder.
+        sprite_atlas (dict, optional): If given, the keyword arguments of
+          build_sprite_atlas, which packs the battle sprites into sprite
+          sheets and adds the location of each sprite to the traits.
+        emitters (list, optional): The extra emitters to save the outputs
+          with (see save_json_data).
+
+    Returns:
+        list: The traits data.
+    """
+    version = read_compendium_version(SUC_DATA_FILENAME)
+
+    records = iter_csv_file(SUC_DATA_FILENAME)
+    records = instrument.metered(records, "traits.load")
+    os.makedirs(os.path.join(output_folder, JOIN_REPORT_FOLDER), exist_ok=True)
+    with instrument.span("traits.load_suapi"):
+        records = add_sprites_and_stats(
+            records,
+            report_filename=os.path.join(
+                output_folder, JOIN_REPORT_FOLDER, "suapi_creatures.json"
+            ),
+        )
+    records = instrument.metered(records, "traits.enrich")
+    records = add_godshop_locations(records)
+    records = instrument.metered(records, "traits.godshop")
+    if sprite_atlas is not None:
+        records = list(records)
+        with instrument.span("traits.sprite_atlas") as span:
+            index = build_sprite_atlas(records, **sprite_atlas)
+            span.add_rows(len(records))
+            for sheet in index["sheets"]:
+                span.add_output(os.path.join("public", sheet))
+    json_data = [record.to_dict() for record in records]
+
+    with instrument.span("traits.serialize") as span:
+        filename = os.path.join(output_folder, "data.json")
+        for f in save_json_data(json_data, filename, emitters):
+            span.add_output(f)
+        span.add_rows(len(json_data))
+
+    with instrument.span("traits.metadata") as span:
+        filename = os.path.join(output_folder, "metadata.json")
+        metadata = generate_metadata(version, json_data)
+        for f in save_json_data(metadata, filename, emitters):
+            span.add_output(f)
+
+    return json_data
+
+
+def build_steam_guide(output_folder: str):
+    """Convert the text dump of the Steam guide to the perks and
+    specializations csv files (see siralim_data.steam_guide).
+
+    Args:
+        output_folder (str): The output folder (unused, as the csv files are
+          inputs of the specializations stage).
+
+    Returns:
+        dict: The number of perks and specializations.
+    """
+    with instrument.span("steam_guide.convert") as span:
+        counts = steam_guide.convert_steam_guide(
+            STEAM_GUIDE_FILENAME,
+            STEAM_GUIDE_SPECS_FILENAME,
+            PERKS_FILENAME,
+            SPECIALIZATIONS_FILENAME,
+        )
+        span.add_rows(counts["perks"])
+        span.add_output(PERKS_FILENAME)
+        span.add_output(SPECIALIZATIONS_FILENAME)
+    return counts
+
+
+def build_specializations(
+    output_folder: str, perk_icons: dict = None, emitters: list = None
+):
+    """Build the specializations data (specializations.json) and the
+    perk icon image.
+
+    Args:
+        output_folder (str): The output folder.
+        perk_icons (dict, optional): Keyword arguments of
+          build_perk_icon_image ("jobs", "optimize" and "webp").
+        emitters (list, optional): The extra emitters to save the output
+          with (see save_json_data).
+
+    Returns:
+        list: The specializations data.
+    """
+    with instrument.span("specializations.load") as span:
+        os.makedirs(
+            os.path.join(output_folder, JOIN_REPORT_FOLDER), exist_ok=True
+        )
+        specializations_data = load_specializations_data(
+            SPECIALIZATIONS_FILENAME,
+            PERKS_FILENAME,
+            report_filename=os.path.join(
+                output_folder, JOIN_REPORT_FOLDER, "suapi_perks.json"
+            ),
+        )
+        span.add_rows(sum(len(s["perks"]) for s in specializations_data))
+
+    with instrument.span("specializations.sprite_sheet") as span:
+        specializations_data = build_perk_icon_image(
+            specializations_data, **(perk_icons or {})
+        )
+        filename = os.path.join(PERK_ICON_OUTPUT_FOLDER, "perk_icons.png")
+        span.add_output(filename)
+        if (perk_icons or {}).get("webp") and os.path.exists(
+            atlas.webp_filename(filename)
+        ):
+            span.add_output(atlas.webp_filename(filename))
+
+    with instrument.span("specializations.serialize") as span:
+        filename = os.path.join(output_folder, "specializations.json")
+        for f in save_json_data(specializations_data, filename, emitters):
+            span.add_output(f)
+
+    return specializations_data
+
+
+def build_relics(output_folder: str, emitters: list = None):
+    """Build the relics data (relics.json).
 
     Args:
         output_folder (str): The output folder.
+        emitters (list, optional): The extra emitters to save the output
+          with (see save_json_data).
+
+    Returns:
+        list: The relics data.
     """
-    json_data, version = load_csv_file(SUC_DATA_FILENAME)
+    with instrument.span("relics.load") as span:
+        relics_data = load_relics_data(RELICS_FILENAME)
+        span.add_rows(len(relics_data))
+
+    with instrument.span("relics.serialize") as span:
+        filename = os.path.join(output_folder, "relics.json")
+        for f in save_json_data(relics_data, filename, emitters):
+            span.add_output(f)
+
+    return relics_data
 
-    json_data = add_sprites_and_stats(json_data)
-    json_data = add_godshop_locations(json_data)
 
-    save_json_data(json_data, os.path.join(output_folder, "data.json"))
-    with open(os.path.join(output_folder, "metadata.json"), "w") as f:
-        json.dump(generate_metadata(version, json_data), f)
+def build_spells(output_folder: str, emitters: list = None):
+    """Build the spells data (spells.json).
+
+    Args:
+        output_folder (str): The output folder.
+        emitters (list, optional): The extra emitters to save the output
+          with (see save_json_data).
+
+    Returns:
+        list: The spells data.
+    """
+    with instrument.span("spells.load") as span:
+        spells_data = load_spells_data(SPELLS_FILENAME)
+        span.add_rows(len(spells_data))
+
+    with instrument.span("spells.serialize") as span:
+        filename = os.path.join(output_folder, "spells.json")
+        for f in save_json_data(spells_data, filename, emitters):
+            span.add_output(f)
+
+    return spells_data
+
+
+def build_uids(
+    output_folder: str,
+    traits: list,
+    specializations: list,
+    relics: list,
+    spells: list,
+    accept_uid_changes: bool = False,
+):
+    """Check the uids of the traits, perks, relics and spells, and publish
+    the index of the uids (uids.json). See siralim_data.uids.
+
+    Every collision, and every published uid that was removed or now refers
+    to something else, is saved to uid_report.json. The index is only
+    updated if there are no collisions and no reassigned uids (unless
+    accept_uid_changes is set), so that the check keeps failing until the
+    problem is fixed.
+
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+        specializations (list): The specializations data.
+        relics (list): The relics data.
+        spells (list): The spells data.
+        accept_uid_changes (bool): Whether to publish the uids even if
+          published uids were reassigned.
 
-    specializations_data = load_specializations_data(
-        SPECIALIZATIONS_FILENAME, PERKS_FILENAME
+    Raises:
+        uids.UidError: If uids collide or were reassigned.
+
+    Returns:
+        dict: The uid index.
+    """
+    with instrument.span("uids.check") as span:
+        registry = uids.UidRegistry.from_data(
+            traits, specializations, relics, spells
+        )
+        index_filename = os.path.join(output_folder, uids.UID_INDEX_FILENAME)
+        report = registry.report(uids.load_uid_index(index_filename))
+        span.add_rows(sum(report["counts"].values()))
+
+        filename = os.path.join(output_folder, uids.UID_REPORT_FILENAME)
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=1)
+        span.add_output(filename)
+        uids.log_report(report)
+
+    if report["collisions"]:
+        n = sum(len(u) for u in report["collisions"].values())
+        raise uids.UidError(
+            f"{n} uids collide, see {filename} for details.", report
+        )
+    if report["reassigned"] and not accept_uid_changes:
+        n = sum(len(u) for u in report["reassigned"].values())
+        raise uids.UidError(
+            f"{n} published uids now refer to something else, which would "
+            f"break existing builds (see {filename}). Pass "
+            "--accept-uid-changes to publish them anyway.",
+            report,
+        )
+
+    with instrument.span("uids.serialize") as span:
+        index = registry.to_json()
+        with open(index_filename, "w") as f:
+            json.dump(index, f, indent=1)
+        span.add_output(index_filename)
+    return index
+
+
+def build_columnar(output_folder: str, traits: list):
+    """Save the traits data in the columnar layout (data.columnar.json plus
+    the chunks of the heavy text fields). See siralim_data.columnar.
+
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+
+    Returns:
+        dict: The header of the columnar data.
+    """
+    with instrument.span("columnar.serialize") as span:
+        header = columnar.save_columnar(traits, output_folder)
+        span.add_rows(len(traits))
+        span.add_output(os.path.join(output_folder, "data.columnar.json"))
+        for field in header["fields"]:
+            for chunk in field.get("chunks", []):
+                span.add_output(os.path.join(output_folder, chunk["filename"]))
+    return header
+
+
+def build_shards(output_folder: str, traits: list, by_family: bool = False):
+    """Save the traits data in the sharded layout (shards.json plus one
+    file per class or family), and log the size of the shards of each
+    class. See siralim_data.shards.
+
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+        by_family (bool): Whether to shard by family within each class.
+
+    Returns:
+        dict: The index of the shards.
+    """
+    with instrument.span("shards.serialize") as span:
+        index = shards.save_shards(traits, output_folder, by_family)
+        span.add_rows(len(traits))
+        span.add_output(
+            os.path.join(output_folder, shards.SHARD_INDEX_FILENAME)
+        )
+        for shard in index["shards"]:
+            span.add_output(
+                os.path.join(output_folder, *shard["filename"].split("/"))
+            )
+
+    index_bytes = os.path.getsize(
+        os.path.join(output_folder, shards.SHARD_INDEX_FILENAME)
+    )
+    logger.info(
+        f"Saved {len(traits)} traits to {len(index['shards'])} shards "
+        f"(index: {index_bytes / 1024:.1f} KiB)."
     )
+    for (c, n, length, size, largest) in shards.summarize(index):
+        logger.info(
+            f"  {c}: {size / 1024:.1f} KiB, {length} traits in {n} "
+            f"shard(s), largest {largest / 1024:.1f} KiB"
+        )
+    return index
 
-    specializations_data = build_perk_icon_image(specializations_data)
 
-    with open(os.path.join(output_folder, "specializations.json"), "w") as f:
-        json.dump(specializations_data, f)
+def build_search_index(
+    output_folder: str,
+    traits: list,
+    spells: list,
+    specializations: list,
+    with_prefixes: bool = False,
+    with_trigrams: bool = False,
+):
+    """Build the inverted search index of the traits, spells and perks
+    (search_index.json). See siralim_data.search_index.
 
-    relics_data = load_relics_data(RELICS_FILENAME)
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+        spells (list): The spells data.
+        specializations (list): The specializations data.
+        with_prefixes (bool): Whether to add prefix entries to the index.
+        with_trigrams (bool): Whether to add trigram entries to the index.
 
-    with open(os.path.join(output_folder, "relics.json"), "w") as f:
-        json.dump(relics_data, f)
+    Returns:
+        dict: The search index.
+    """
+    with instrument.span("search_index.build"):
+        index = search_index.build_search_index(
+            traits, spells, specializations, with_prefixes, with_trigrams
+        )
 
-    spells_data = load_spells_data(SPELLS_FILENAME)
+    with instrument.span("search_index.serialize") as span:
+        filename = os.path.join(output_folder, "search_index.json")
+        with open(filename, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        span.add_output(filename)
+    return index
+
+
+def build_database(
+    output_folder: str,
+    traits: list,
+    specializations: list,
+    relics: list,
+    spells: list,
+):
+    """Export the traits, specializations, relics and spells to a SQLite
+    database with a full-text index of the traits. See
+    siralim_data.database.
 
-    with open(os.path.join(output_folder, "spells.json"), "w") as f:
-        json.dump(spells_data, f)
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+        specializations (list): The specializations data.
+        relics (list): The relics data.
+        spells (list): The spells data.
 
-    # Print a pretty version of it for manual inspection etc
-    with open("src/data/specializations_pretty.json", "w") as f:
-        json.dump(specializations_data, f, indent=1)
+    Returns:
+        dict: The number of rows of each table.
+    """
+    with instrument.span("database.export") as span:
+        filename = os.path.join(output_folder, database.DATABASE_FILENAME)
+        counts = database.export_database(
+            filename,
+            traits,
+            specializations,
+            relics,
+            spells,
+            {"compendium_version": read_compendium_version(SUC_DATA_FILENAME)},
+        )
+        span.add_rows(sum(counts.values()))
+        span.add_output(filename)
+    logger.info(
+        f"Exported {counts['traits']} traits, {counts['perks']} perks, "
+        f"{counts['relics']} relics and {counts['spells']} spells to "
+        f"{filename}."
+    )
+    return counts
+
+
+def build_trait_store(output_folder: str, traits: list):
+    """Save the traits data to a memory-mappable binary store (traits.bin),
+    for Python services. See siralim_data.trait_store.
+
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+
+    Returns:
+        int: The size of the store in bytes.
+    """
+    with instrument.span("trait_store.encode") as span:
+        filename = os.path.join(output_folder, trait_store.STORE_FILENAME)
+        size = trait_store.save_store(traits, filename)
+        span.add_rows(len(traits))
+        span.add_output(filename)
+    logger.info(
+        f"Saved {len(traits)} traits to {filename} ({size / 1024:.1f} KiB)."
+    )
+    return size
+
+
+def build_releases(
+    output_folder: str,
+    traits: list,
+    relics: list,
+    spells: list,
+    snapshot_interval: int = releases.SNAPSHOT_INTERVAL,
+):
+    """Publish a release of the traits, relics and spells data if they
+    changed since the latest release, with the delta from it and a snapshot
+    every snapshot_interval releases. See siralim_data.releases.
+
+    Args:
+        output_folder (str): The output folder.
+        traits (list): The traits data.
+        relics (list): The relics data.
+        spells (list): The spells data.
+        snapshot_interval (int): The number of releases between snapshots.
+
+    Returns:
+        dict: The release manifest.
+    """
+    outputs = dict(zip(releases.OUTPUTS, [traits, relics, spells]))
+    with instrument.span("releases.publish") as span:
+        (manifest, published) = releases.publish_release(
+            output_folder,
+            outputs,
+            read_compendium_version(SUC_DATA_FILENAME),
+            snapshot_interval,
+        )
+        span.add_rows(sum(len(records) for records in outputs.values()))
+        span.add_output(
+            os.path.join(
+                output_folder,
+                releases.RELEASES_FOLDER,
+                releases.RELEASE_MANIFEST_FILENAME,
+            )
+        )
+
+    latest = manifest["releases"][-1]
+    if not published:
+        logger.info(
+            f"The outputs are unchanged since release {latest['release']}."
+        )
+        return manifest
+    sizes = []
+    if "delta" in latest:
+        sizes.append(f"delta {latest['delta_bytes'] / 1024:.1f} KiB")
+    if "snapshot" in latest:
+        sizes.append(f"snapshot {latest['snapshot_bytes'] / 1024:.1f} KiB")
+    logger.info(f"Published release {latest['release']} ({', '.join(sizes)}).")
+    return manifest
+
+
+def build_precompressed(
+    output_folder: str,
+    filenames: list,
+    encodings: list,
+    budgets: dict = None,
+):
+    """Save the precompressed (.gz/.br) siblings of the given artifacts,
+    and check their sizes against the size budgets. See
+    siralim_data.compress.
+
+    Args:
+        output_folder (str): The output folder.
+        filenames (list): The filenames of the artifacts.
+        encodings (list): The encodings to compress with.
+        budgets (dict): Map of artifact name (e.g. "data.json.gz") -> the
+          maximum size in bytes.
+
+    Raises:
+        compress.SizeBudgetError: If artifacts are larger than their budget.
+
+    Returns:
+        dict: The record of the content hashes and compressed sizes of the
+        artifacts.
+    """
+    record_filename = os.path.join(
+        output_folder, compress.PRECOMPRESS_FILENAME
+    )
+    with instrument.span("precompress.compress") as span:
+        (record, compressed) = compress.precompress(
+            filenames, encodings, record_filename
+        )
+        for filename in compressed:
+            for e in encodings:
+                span.add_output(compress.compressed_filename(filename, e))
+        span.add_output(record_filename)
+
+    logger.info(
+        f"Precompressed {len(compressed)} artifacts "
+        f"({len(filenames) - len(compressed)} unchanged)."
+    )
+    for (filename, entry) in record.items():
+        sizes = ", ".join(
+            f"{e} {n / 1024:.1f} KiB" for (e, n) in entry["sizes"].items()
+        )
+        logger.info(f"  {filename}: {entry['bytes'] / 1024:.1f} KiB, {sizes}")
+
+    over = compress.check_budgets(record, budgets or {})
+    if over:
+        for (name, (size, budget)) in over.items():
+            logger.error(
+                f"{name} is {size} bytes, over its budget of {budget} bytes."
+            )
+        raise compress.SizeBudgetError(
+            f"{len(over)} artifacts are over their size budget.", over
+        )
+    return record
+
+
+def get_stages(
+    output_folder: str,
+    columnar_output: bool = False,
+    search_index_options: list = None,
+    sprite_atlas: dict = None,
+    perk_icons: dict = None,
+    accept_uid_changes: bool = False,
+    shard_options: dict = None,
+    precompress_options: dict = None,
+    emitters: list = None,
+    sqlite_output: bool = False,
+    release_options: dict = None,
+    binary_store: bool = False,
+):
+    """Return the stages of the build, along with their inputs, outputs and
+    dependencies. The first output of each stage is the JSON file that is
+    loaded back in when the stage is skipped.
+
+    Args:
+        output_folder (str): The output folder.
+        columnar_output (bool): Whether to also save the traits data in the
+          columnar layout.
+        search_index_options (list): If given, build the search index, with
+          the given extra entries ("prefixes" and/or "trigrams").
+        sprite_atlas (dict): If given, the options of the sprite atlas (see
+          build_sprite_atlas).
+        perk_icons (dict): If given, the options of the perk icon image (see
+          build_perk_icon_image).
+        accept_uid_changes (bool): Whether to publish the uids even if
+          published uids were reassigned (see build_uids).
+        shard_options (dict): If given, also save the traits data in the
+          sharded layout, with the given options (see build_shards).
+        precompress_options (dict): If given, precompress the artifacts,
+          with the given options ("budgets", see build_precompressed).
+        emitters (list): The extra emitters to save the JSON outputs with
+          (see save_json_data).
+        sqlite_output (bool): Whether to also export the data to a SQLite
+          database (see build_database).
+        release_options (dict): If given, publish releases of the outputs,
+          with the given options (see build_releases).
+        binary_store (bool): Whether to also save the traits data to a
+          binary store (see build_trait_store).
+
+    Raises:
+        ValueError: If size budgets are given for .br siblings, but brotli
+          is not installed (see compress.select_encodings).
+
+    Returns:
+        list: A list of Stages.
+    """
+    serializer = serialize.Serializer(emitters)
+    serialize_filename = os.path.relpath(serialize.__file__)
+
+    def out(filename):
+        return os.path.join(output_folder, filename)
+
+    def saved(filename):
+        return serializer.filenames(out(filename))
+
+    def params(**kwargs):
+        # None rather than {} without options, as params are recorded in
+        # the build manifest.
+        return {k: v for (k, v) in kwargs.items() if v} or None
+
+    traits_inputs = [
+        BUILD_SCRIPT_FILENAME,
+        serialize_filename,
+        SUC_DATA_FILENAME,
+        SUAPI_DATA_FILENAME,
+        GODSHOP_LOCATIONS_FILENAME,
+        (SPRITES_FOLDER, False),
+    ]
+    traits_outputs = saved("data.json") + saved("metadata.json")
+    if sprite_atlas is not None:
+        # The sheets depend on the contents of the sprites, not just their
+        # names.
+        traits_inputs += [SPRITES_FOLDER, os.path.relpath(atlas.__file__)]
+        traits_outputs.append(
+            os.path.join(SPRITE_ATLAS_FOLDER, SPRITE_ATLAS_INDEX_FILENAME)
+        )
+
+    perk_icons_filename = os.path.join(
+        PERK_ICON_OUTPUT_FOLDER, "perk_icons.png"
+    )
+    specializations_outputs = saved("specializations.json") + [
+        perk_icons_filename
+    ]
+    if perk_icons and perk_icons.get("webp"):
+        specializations_outputs.append(
+            atlas.webp_filename(perk_icons_filename)
+        )
+
+    stages = [
+        Stage(
+            "steam_guide",
+            build_steam_guide,
+            [
+                BUILD_SCRIPT_FILENAME,
+                STEAM_GUIDE_FILENAME,
+                STEAM_GUIDE_SPECS_FILENAME,
+                os.path.relpath(steam_guide.__file__),
+            ],
+            [PERKS_FILENAME, SPECIALIZATIONS_FILENAME],
+        ),
+        Stage(
+            "traits",
+            build_traits,
+            traits_inputs,
+            traits_outputs,
+            params=params(sprite_atlas=sprite_atlas, emitters=emitters),
+        ),
+        Stage(
+            "specializations",
+            build_specializations,
+            [
+                BUILD_SCRIPT_FILENAME,
+                serialize_filename,
+                SPECIALIZATIONS_FILENAME,
+                PERKS_FILENAME,
+                SUAPI_PERK_DATA_FILENAME,
+                PERK_ICONS_FOLDER,
+                os.path.join(PERK_ICON_OUTPUT_FOLDER, MISSING_ICON_FILENAME),
+                os.path.relpath(atlas.__file__),
+            ],
+            specializations_outputs,
+            params=params(perk_icons=perk_icons, emitters=emitters),
+            after=["steam_guide"],
+        ),
+        Stage(
+            "relics",
+            build_relics,
+            [BUILD_SCRIPT_FILENAME, serialize_filename, RELICS_FILENAME],
+            saved("relics.json"),
+            params=params(emitters=emitters),
+        ),
+        Stage(
+            "spells",
+            build_spells,
+            [BUILD_SCRIPT_FILENAME, serialize_filename, SPELLS_FILENAME],
+            saved("spells.json"),
+            params=params(emitters=emitters),
+        ),
+    ]
+
+    stages.append(
+        Stage(
+            "uids",
+            build_uids,
+            [BUILD_SCRIPT_FILENAME, os.path.relpath(uids.__file__)],
+            [out(uids.UID_INDEX_FILENAME), out(uids.UID_REPORT_FILENAME)],
+            ["traits", "specializations", "relics", "spells"],
+            {"accept_uid_changes": True} if accept_uid_changes else None,
+        )
+    )
+
+    columnar_outputs = [out("data.columnar.json")] + [
+        out(f) for f in columnar.chunk_filenames()
+    ]
+    if columnar_output:
+        stages.append(
+            Stage(
+                "columnar",
+                build_columnar,
+                [BUILD_SCRIPT_FILENAME, os.path.relpath(columnar.__file__)],
+                columnar_outputs,
+                ["traits"],
+            )
+        )
+
+    if shard_options is not None:
+        stages.append(
+            Stage(
+                "shards",
+                build_shards,
+                [BUILD_SCRIPT_FILENAME, os.path.relpath(shards.__file__)],
+                [out(shards.SHARD_INDEX_FILENAME)],
+                ["traits"],
+                shard_options,
+            )
+        )
+
+    if sqlite_output:
+        stages.append(
+            Stage(
+                "database",
+                build_database,
+                [
+                    BUILD_SCRIPT_FILENAME,
+                    SUC_DATA_FILENAME,
+                    os.path.relpath(database.__file__),
+                ],
+                [out(database.DATABASE_FILENAME)],
+                ["traits", "specializations", "relics", "spells"],
+                # Only export uids that have been checked.
+                after=["uids"],
+            )
+        )
+
+    if binary_store:
+        stages.append(
+            Stage(
+                "trait_store",
+                build_trait_store,
+                [BUILD_SCRIPT_FILENAME, os.path.relpath(trait_store.__file__)],
+                [out(trait_store.STORE_FILENAME)],
+                ["traits"],
+                # Only store uids that have been checked.
+                after=["uids"],
+            )
+        )
+
+    if release_options is not None:
+        stages.append(
+            Stage(
+                "releases",
+                build_releases,
+                [
+                    BUILD_SCRIPT_FILENAME,
+                    SUC_DATA_FILENAME,
+                    serialize_filename,
+                    os.path.relpath(releases.__file__),
+                ],
+                [
+                    os.path.join(
+                        out(releases.RELEASES_FOLDER),
+                        releases.RELEASE_MANIFEST_FILENAME,
+                    )
+                ],
+                ["traits", "relics", "spells"],
+                release_options,
+                # Only release uids that have been checked.
+                after=["uids"],
+            )
+        )
+
+    if search_index_options is not None:
+        stages.append(
+            Stage(
+                "search_index",
+                build_search_index,
+                [
+                    BUILD_SCRIPT_FILENAME,
+                    os.path.relpath(search_index.__file__),
+                ],
+                [out("search_index.json")],
+                ["traits", "spells", "specializations"],
+                {
+                    "with_prefixes": "prefixes" in search_index_options,
+                    "with_trigrams": "trigrams" in search_index_options,
+                },
+            )
+        )
+
+    if precompress_options is not None:
+        # The app bundles the JSON outputs with webpack, so it does not
+        # serve their siblings: they measure the transfer size of the data
+        # for the size budgets, and are for hosting the output folder
+        # directly. The files under public/ are served as they are.
+        artifacts = {
+            "traits": [out("data.json")],
+            "specializations": [out("specializations.json")],
+            "relics": [out("relics.json")],
+            "spells": [out("spells.json")],
+            "columnar": columnar_outputs,
+            "search_index": [out("search_index.json")],
+        }
+        artifacts["specializations"].append(perk_icons_filename)
+        if perk_icons and perk_icons.get("webp"):
+            artifacts["specializations"].append(
+                atlas.webp_filename(perk_icons_filename)
+            )
+        if sprite_atlas is not None:
+            artifacts["traits"].append(
+                os.path.join(SPRITE_ATLAS_FOLDER, SPRITE_ATLAS_INDEX_FILENAME)
+            )
+        names = {s.name for s in stages}
+        artifacts = {k: v for (k, v) in artifacts.items() if k in names}
+        filenames = [f for files in artifacts.values() for f in files]
+        encodings = compress.select_encodings(
+            precompress_options.get("budgets")
+        )
+        stages.append(
+            Stage(
+                "precompress",
+                build_precompressed,
+                [BUILD_SCRIPT_FILENAME, os.path.relpath(compress.__file__)],
+                [out(compress.PRECOMPRESS_FILENAME)]
+                + [
+                    compress.compressed_filename(f, e)
+                    for f in filenames
+                    for e in encodings
+                ],
+                params={
+                    "filenames": filenames,
+                    "encodings": encodings,
+                    "budgets": precompress_options.get("budgets"),
+                },
+                after=list(artifacts),
+            )
+        )
+
+    return stages
+
+
+def build_data(
+    output_folder: str,
+    force: bool = False,
+    jobs: int = 1,
+    use_processes: bool = False,
+    columnar_output: bool = False,
+    search_index_options: list = None,
+    report: bool = False,
+    profile: bool = False,
+    trace_memory: bool = False,
+    sprite_atlas: dict = None,
+    perk_icons: dict = None,
+    accept_uid_changes: bool = False,
+    shard_options: dict = None,
+    precompress_options: dict = None,
+    emitters: list = None,
+    sqlite_output: bool = False,
+    release_options: dict = None,
+    binary_store: bool = False,
+):
+    """Build the data to the specified output folder.
+    Stages whose inputs and outputs are unchanged since the last build
+    (according to the build manifest in the output folder) are skipped, and
+    their previous outputs are reused. Stages that do not depend on each
+    other are run concurrently.
+
+    Args:
+        output_folder (str): The output folder.
+        force (bool): Whether to rebuild every stage regardless of the
+          build manifest.
+        jobs (int): The maximum number of stages to run at once.
+        use_processes (bool): Whether to run stages on a process pool rather
+          than a thread pool.
+        columnar_output (bool): Whether to also save the traits data in the
+          columnar layout (data.columnar.json).
+        search_index_options (list): If given, build the search index
+          (search_index.json), with the given extra entries ("prefixes"
+          and/or "trigrams").
+        report (bool): Whether to record the metrics of each stage and save
+          them to build_report.json in the output folder.
+        profile (bool): Whether to also profile each stage with cProfile,
+          saving the stats to the profiles folder in the output folder.
+        trace_memory (bool): Whether to also record the peak memory traced
+          by tracemalloc for each stage.
+        sprite_atlas (dict): If given, pack the battle sprites into sprite
+          sheets with the given options ("max_size" and "shard_by_class"),
+          and add the location of each sprite to data.json.
+        perk_icons (dict): If given, the options of the perk icon image
+          ("jobs", "optimize" and "webp", see build_perk_icon_image).
+        accept_uid_changes (bool): Whether to publish the uids even if
+          published uids now refer to something else (see build_uids).
+        shard_options (dict): If given, also save the traits data in the
+          sharded layout (shards.json plus the shards folder), with the given
+          options ("by_family").
+        precompress_options (dict): If given, save precompressed .gz (and
+          .br) siblings of the artifacts, and fail the build if artifacts
+          are larger than their size budget ("budgets", a map of artifact
+          name -> maximum size in bytes).
+        emitters (list): The extra emitters to save the JSON outputs with,
+          e.g. ["pretty"] to also save pretty-printed copies of them for
+          manual inspection (see siralim_data.serialize).
+        sqlite_output (bool): Whether to also export the data to a SQLite
+          database (siralim.sqlite), with a full-text index of the traits.
+        release_options (dict): If given, publish a release of the traits,
+          relics and spells data whenever it changes, with the delta from
+          the previous release, under the releases folder
+          ("snapshot_interval", the number of releases between full
+          snapshots).
+        binary_store (bool): Whether to also save the traits data to a
+          memory-mappable binary store (traits.bin), for Python services to
+          look traits up without parsing data.json.
+    """
+    manifest = BuildManifest(output_folder)
+    recorder = None
+    if report or profile or trace_memory:
+        recorder = instrument.Recorder(
+            profile_folder=os.path.join(output_folder, "profiles")
+            if profile
+            else None,
+            trace_memory=trace_memory,
+        )
+        instrument.enable(recorder)
+    stages = get_stages(
+        output_folder,
+        columnar_output=columnar_output,
+        search_index_options=search_index_options,
+        sprite_atlas=sprite_atlas,
+        perk_icons=perk_icons,
+        accept_uid_changes=accept_uid_changes,
+        shard_options=shard_options,
+        precompress_options=precompress_options,
+        emitters=emitters,
+        sqlite_output=sqlite_output,
+        release_options=release_options,
+        binary_store=binary_store,
+    )
+    try:
+        results, _ = run_stages(
+            stages,
+            output_folder,
+            manifest,
+            jobs=jobs,
+            force=force,
+            use_processes=use_processes,
+            recorder=recorder,
+        )
+    finally:
+        if recorder is not None:
+            instrument.disable()
+            recorder.save(
+                os.path.join(output_folder, instrument.REPORT_FILENAME)
+            )
 
     logger.info("Data building complete.")
 
-    return json_data, specializations_data, relics_data
+    return (
+        results["traits"],
+        results["specializations"],
+        results["relics"],
+    )
+
+
+def watch_data(
+    output_folder: str,
+    force: bool = False,
+    jobs: int = 1,
+    use_processes: bool = False,
+    interval: float = watch.POLL_INTERVAL,
+    debounce: float = watch.DEBOUNCE_INTERVAL,
+    **options,
+):
+    """Build the data to the specified output folder, then watch the inputs
+    of the build and rebuild the stages affected by each change, until
+    interrupted.
+
+    The results of the stages and the parsed csv files are kept in memory
+    between rebuilds, so a rebuild only runs the stages that have a changed
+    input or depend on one. A failed rebuild is logged, and the failed
+    stages are retried on the next change.
+
+    Args:
+        output_folder (str): The output folder.
+        force (bool): Whether to rebuild every stage on the initial build,
+          regardless of the build manifest.
+        jobs (int): The maximum number of stages to run at once.
+        use_processes (bool): Whether to run stages on a process pool rather
+          than a thread pool.
+        interval (float): The time (in seconds) between polls of the inputs.
+        debounce (float): The time (in seconds) to wait for further changes
+          before rebuilding.
+        **options: The options of the stages (see get_stages).
+    """
+    CSV_CACHE.in_memory = True
+    stages = get_stages(output_folder, **options)
+    results = {}
+
+    def run(affected: set, force: bool = False):
+        warm = {n: r for (n, r) in results.items() if n not in affected}
+        try:
+            (rebuilt, _) = run_stages(
+                stages,
+                output_folder,
+                BuildManifest(output_folder),
+                jobs=jobs,
+                force=force,
+                use_processes=use_processes,
+                results=warm,
+            )
+        except Exception:
+            logger.exception("Build failed, waiting for further changes.")
+            for name in affected:
+                results.pop(name, None)
+            return False
+        results.update(rebuilt)
+        return True
+
+    def rebuild(affected: set, changed: set):
+        start = time.perf_counter()
+        if run(affected):
+            logger.info(
+                f"Rebuilt {', '.join(sorted(affected))} in "
+                f"{time.perf_counter() - start:.2f}s "
+                f"({', '.join(sorted(changed))} changed)."
+            )
+
+    run({s.name for s in stages}, force=force)
+    watch.Watcher(stages, rebuild, interval, debounce).run()
+
+
+def parse_args(args=None):
+    """Parse the command line arguments of the script.
+
+    Args:
+        args (list): The arguments to parse (defaults to sys.argv).
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every stage, even if its inputs have not changed.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of stages to run at once.",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="Run stages on a process pool rather than a thread pool.",
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Also save the traits data in the columnar layout, with the "
+        "heavy text fields split into separately loadable chunks.",
+    )
+    parser.add_argument(
+        "--shards",
+        action="store_true",
+        help="Also save the traits data in shards by class, with an index "
+        "of the shard of each uid, so clients can load only what they need.",
+    )
+    parser.add_argument(
+        "--shards-by-family",
+        action="store_true",
+        help="Shard the traits data by family within each class (implies "
+        "--shards).",
+    )
+    parser.add_argument(
+        "--sqlite",
+        action="store_true",
+        help="Also export the data to a SQLite database, with a full-text "
+        "index of the traits.",
+    )
+    parser.add_argument(
+        "--binary-store",
+        action="store_true",
+        help="Also save the traits data to a memory-mappable binary store "
+        "(traits.bin), for Python services.",
+    )
+    parser.add_argument(
+        "--releases",
+        action="store_true",
+        help="Publish a release of the traits, relics and spells data when "
+        "it changes, with the delta from the previous release, so clients "
+        "can update without downloading everything again.",
+    )
+    parser.add_argument(
+        "--snapshot-interval",
+        type=int,
+        help="The number of releases between full snapshots (implies "
+        f"--releases, default: {releases.SNAPSHOT_INTERVAL}).",
+    )
+    parser.add_argument(
+        "--search-index",
+        nargs="*",
+        choices=["prefixes", "trigrams"],
+        help="Build an inverted search index of the traits, spells and "
+        "perks, optionally with prefix and/or trigram entries.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every csv file and decode every image rather than "
+        "loading them from the cache.",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Save the time, rows, bytes written and peak memory of each "
+        "stage to build_report.json in the output folder.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each stage with cProfile (implies --report).",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the peak memory traced by tracemalloc for each stage "
+        "(implies --report). Most accurate with --jobs 1.",
+    )
+    parser.add_argument(
+        "--sprite-atlas",
+        action="store_true",
+        help="Pack the battle sprites into sprite sheets, and add the "
+        "location of each sprite to the traits data.",
+    )
+    parser.add_argument(
+        "--atlas-max-size",
+        type=int,
+        default=SPRITE_ATLAS_MAX_SIZE,
+        help="The maximum width and height of each sprite sheet.",
+    )
+    parser.add_argument(
+        "--atlas-shard-by-class",
+        action="store_true",
+        help="Build separate sprite sheets for each class.",
+    )
+    parser.add_argument(
+        "--accept-uid-changes",
+        action="store_true",
+        help="Publish the uids even if published uids now refer to "
+        "something else, breaking existing builds.",
+    )
+    parser.add_argument(
+        "--image-jobs",
+        type=int,
+        default=1,
+        help="The number of processes to decode the perk icons with.",
+    )
+    parser.add_argument(
+        "--optimize-images",
+        action="store_true",
+        help="Compress the perk icon image harder (losslessly).",
+    )
+    parser.add_argument(
+        "--webp",
+        action="store_true",
+        help="Also save a lossless WebP copy of the perk icon image.",
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Also save pretty-printed copies of the JSON outputs "
+        "(<name>_pretty.json), for manual inspection.",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="Save precompressed .gz (and .br, if brotli is installed) "
+        "copies of the JSON outputs and the perk icon image.",
+    )
+    parser.add_argument(
+        "--size-budget",
+        action="append",
+        type=compress.parse_budget,
+        metavar="ARTIFACT=SIZE",
+        help="Fail the build if an artifact (e.g. data.json.gz) is larger "
+        "than SIZE bytes (with an optional K or M suffix). May be given more "
+        "than once, and implies --precompress.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After building, watch the data files and asset folders, and "
+        "rebuild the outputs that depend on each changed file.",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=watch.POLL_INTERVAL,
+        help="The time (in seconds) between checks for changes.",
+    )
+    return parser.parse_args(args)
 
 
 if __name__ == "__main__":  # pragma: no cover
-    build_data(os.path.join("src", "data"))
+    args = parse_args()
+    CSV_CACHE.enabled = not args.no_cache
+    TILE_CACHE.enabled = not args.no_cache
+    options = dict(
+        columnar_output=args.columnar,
+        search_index_options=args.search_index,
+        sprite_atlas={
+            "max_size": args.atlas_max_size,
+            "shard_by_class": args.atlas_shard_by_class,
+        }
+        if args.sprite_atlas
+        else None,
+        perk_icons={
+            "jobs": args.image_jobs,
+            "optimize": args.optimize_images,
+            "webp": args.webp,
+        },
+        accept_uid_changes=args.accept_uid_changes,
+        shard_options={"by_family": args.shards_by_family}
+        if args.shards or args.shards_by_family
+        else None,
+        precompress_options={"budgets": dict(args.size_budget or [])}
+        if args.precompress or args.size_budget
+        else None,
+        emitters=["pretty"] if args.pretty else None,
+        sqlite_output=args.sqlite,
+        binary_store=args.binary_store,
+        release_options={
+            "snapshot_interval": args.snapshot_interval
+            or releases.SNAPSHOT_INTERVAL
+        }
+        if args.releases or args.snapshot_interval
+        else None,
+    )
+    if args.watch:
+        watch_data(
+            os.path.join("src", "data"),
+            force=args.force,
+            jobs=args.jobs,
+            use_processes=args.processes,
+            interval=args.watch_interval,
+            **options,
+        )
+    else:
+        build_data(
+            os.path.join("src", "data"),
+            force=args.force,
+            jobs=args.jobs,
+            use_processes=args.processes,
+            report=args.report,
+            profile=args.profile,
+            trace_memory=args.trace_memory,
+            **options,
+        )
@@ -0,0 +1,3 @@
+""" Support modules for build_data.py, the script that builds the data for
+the web application.
+"""
@@ -0,0 +1,175 @@
+""" In-memory indexes of the files in the asset folders (sprites, perk
+icons), so that checking whether an asset exists does not require a stat
+per file.
+
+Each index is built with a single os.scandir pass, shared between stages
+of the build, and cached on disk keyed on the modification time of the
+folder (which changes whenever a file is added, removed or renamed).
+"""
+
+import os
+import json
+import hashlib
+import threading
+import logging as logger
+
+ASSET_INDEX_VERSION = 1
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def sanitise(name: str):
+    """Normalise a filename for lenient lookups, i.e. ignore case and
+    apostrophes.
+
+    Args:
+        name (str): The filename.
+
+    Returns:
+        str: The normalised filename.
+    """
+    return name.replace("'", "").replace("’", "").casefold()
+
+
+class AssetIndex:
+    """The set of files in an asset folder.
+
+    Args:
+        folder (str): The folder.
+        names (list): The names of the files in the folder.
+        mtime_ns (int): The modification time of the folder when it was
+          scanned.
+    """
+
+    def __init__(self, folder: str, names: list, mtime_ns: int = None):
+        self.folder = folder
+        self.mtime_ns = mtime_ns
+        self.names = set(names)
+        self._casefolded = {}
+        self._sanitised = {}
+        for name in sorted(self.names):
+            self._casefolded.setdefault(name.casefold(), name)
+            self._sanitised.setdefault(sanitise(name), name)
+
+    @classmethod
+    def scan(cls, folder: str):
+        """Build the index of the given folder.
+
+        Args:
+            folder (str): The folder to scan.
+
+        Returns:
+            AssetIndex: The index (empty if the folder does not exist).
+        """
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+            with os.scandir(folder) as it:
+                names = [e.name for e in it if e.is_file()]
+        except FileNotFoundError:
+            return cls(folder, [], None)
+        return cls(folder, names, mtime_ns)
+
+    def __contains__(self, name: str):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name: str):
+        """Find the file with the given name. If there is no exact match, fall
+        back to a case-insensitive match and then to a match that also
+        ignores apostrophes.
+
+        Args:
+            name (str): The filename to find.
+
+        Returns:
+            str: The actual name of the file, or None if it does not exist.
+        """
+        if name in self.names:
+            return name
+        match = self._casefolded.get(name.casefold())
+        if match is None:
+            match = self._sanitised.get(sanitise(name))
+        return match
+
+    def path(self, name: str):
+        """Return the path to the file with the given name (see find).
+
+        Args:
+            name (str): The filename to find.
+
+        Returns:
+            str: The path of the file, or None if it does not exist.
+        """
+        match = self.find(name)
+        return None if match is None else os.path.join(self.folder, match)
+
+
+def _cache_filename(folder: str, cache_folder: str):
+    key = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()
+    return os.path.join(cache_folder, "asset_index", f"{key}.json")
+
+
+def _load_cached(folder: str, cache_folder: str, mtime_ns: int):
+    try:
+        with open(_cache_filename(folder, cache_folder), "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        cached.get("version") != ASSET_INDEX_VERSION
+        or cached.get("mtime_ns") != mtime_ns
+    ):
+        return None
+    return AssetIndex(folder, cached["names"], mtime_ns)
+
+
+def _save_cached(index: AssetIndex, cache_folder: str):
+    filename = _cache_filename(index.folder, cache_folder)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w") as f:
+        json.dump(
+            {
+                "version": ASSET_INDEX_VERSION,
+                "folder": index.folder,
+                "mtime_ns": index.mtime_ns,
+                "names": sorted(index.names),
+            },
+            f,
+        )
+
+
+def get_asset_index(folder: str, cache_folder: str = None):
+    """Return the index of the given folder. The index is memoised in memory
+    and (if cache_folder is given) cached on disk, and rebuilt whenever the
+    modification time of the folder changes.
+
+    Args:
+        folder (str): The asset folder.
+        cache_folder (str): The folder to cache indexes in, if any.
+
+    Returns:
+        AssetIndex: The index.
+    """
+    try:
+        mtime_ns = os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+
+    with _lock:
+        index = _indexes.get(folder)
+        if index is not None and index.mtime_ns == mtime_ns:
+            return index
+
+        index = None
+        if cache_folder and mtime_ns is not None:
+            index = _load_cached(folder, cache_folder, mtime_ns)
+        if index is None:
+            index = AssetIndex.scan(folder)
+            logger.debug(f"Indexed {len(index)} files in {folder}.")
+            if cache_folder and index.mtime_ns is not None:
+                _save_cached(index, cache_folder)
+        _indexes[folder] = index
+        return index
@@ -0,0 +1,420 @@
+""" Packing of images into sprite sheets (atlases), so that the front end can
+load many sprites with a few requests.
+
+Decoded images ("tiles") are cached as raw RGBA pixels in a TileCache, keyed
+on the content hash of the image file, so that unchanged images are not
+decoded again. The cache also records the layout of each sheet it composited,
+so that a sheet is only recomposited and re-encoded when the images in it or
+their positions change. Like the csv cache, the tiles are bounded in size:
+the least recently used tiles are evicted beyond max_bytes.
+"""
+
+import os
+import json
+import struct
+import hashlib
+import logging as logger
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, features
+
+from siralim_data.manifest import hash_file
+
+TILE_CACHE_VERSION = 1
+TILE_HEADER = struct.Struct(">II")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class Tile:
+    """A decoded image.
+
+    Args:
+        size (tuple): The (width, height) of the image.
+        data (bytes): The RGBA pixels of the image.
+    """
+
+    __slots__ = ("size", "data")
+
+    def __init__(self, size: tuple, data: bytes):
+        self.size = size
+        self.data = data
+
+    def to_image(self):
+        """Return the tile as an RGBA PIL Image."""
+        return Image.frombytes("RGBA", self.size, self.data)
+
+
+def decode_tile(filename: str):
+    """Decode the given image file into a Tile.
+
+    Args:
+        filename (str): The image filename.
+
+    Returns:
+        Tile: The decoded image.
+    """
+    with Image.open(filename) as im:
+        return Tile(im.size, im.convert("RGBA").tobytes())
+
+
+class TileCache:
+    """An on-disk cache of decoded tiles and of the layouts of the sheets
+    composited from them.
+
+    Args:
+        folder (str): The folder to store the cache in.
+        max_bytes (int): The maximum total size of the tiles.
+    """
+
+    def __init__(self, folder: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def _filename(self, *parts):
+        return os.path.join(self.folder, *parts)
+
+    def _write(self, filename: str, data: bytes):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, "wb") as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+
+    def get(self, key: str):
+        """Return the cached tile with the given key, or None.
+
+        Args:
+            key (str): The content hash of the image file.
+
+        Returns:
+            Tile: The tile, or None if it is not cached.
+        """
+        if not self.enabled:
+            return None
+        filename = self._filename("tiles", f"{key}.rgba")
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < TILE_HEADER.size:
+            return None
+        (w, h) = TILE_HEADER.unpack_from(data)
+        pixels = data[TILE_HEADER.size :]
+        if len(pixels) != w * h * 4:
+            return None
+        try:
+            os.utime(filename)  # Mark as recently used.
+        except OSError:
+            pass
+        return Tile((w, h), pixels)
+
+    def put(self, key: str, tile: Tile):
+        """Store the given tile.
+
+        Args:
+            key (str): The content hash of the image file.
+            tile (Tile): The tile.
+        """
+        if not self.enabled:
+            return
+        self._write(
+            self._filename("tiles", f"{key}.rgba"),
+            TILE_HEADER.pack(*tile.size) + tile.data,
+        )
+
+    def evict(self):
+        """Remove the least recently used tiles until they fit in
+        max_bytes.
+        """
+        entries = []
+        try:
+            with os.scandir(self._filename("tiles")) as it:
+                for e in it:
+                    if e.name.endswith(".rgba"):
+                        st = e.stat()
+                        entries.append((st.st_mtime, st.st_size, e.path))
+        except FileNotFoundError:
+            return
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _sheet_filename(self, filename: str):
+        key = hashlib.sha1(os.path.abspath(filename).encode("utf-8"))
+        return self._filename("sheets", f"{key.hexdigest()}.json")
+
+    def is_sheet_current(self, filenames: list, layout: str):
+        """Return whether the given sheet files were last composited from the
+        given layout, and are unmodified since.
+
+        Args:
+            filenames (list): The files the sheet was saved to.
+            layout (str): The hash of the layout (see layout_hash).
+
+        Returns:
+            bool: Whether the sheet can be reused.
+        """
+        if not self.enabled:
+            return False
+        try:
+            with open(self._sheet_filename(filenames[0])) as f:
+                record = json.load(f)
+            return record["layout"] == layout and all(
+                record["outputs"].get(filename) == hash_file(filename)
+                for filename in filenames
+            )
+        except (OSError, ValueError, KeyError, AttributeError):
+            return False
+
+    def record_sheet(self, filenames: list, layout: str):
+        """Record the layout the given sheet files were composited from.
+
+        Args:
+            filenames (list): The files the sheet was saved to.
+            layout (str): The hash of the layout (see layout_hash).
+        """
+        if not self.enabled:
+            return
+        record = {
+            "layout": layout,
+            "outputs": {f: hash_file(f) for f in filenames},
+        }
+        self._write(
+            self._sheet_filename(filenames[0]),
+            json.dumps(record).encode("utf-8"),
+        )
+
+
+def decode_tiles(filenames, cache: TileCache = None, jobs: int = 1):
+    """Decode the given image files, reusing the tiles cached for files whose
+    contents have not changed. The remaining files are decoded on a process
+    pool when jobs > 1.
+
+    Args:
+        filenames (iterable): The image filenames.
+        cache (TileCache, optional): The tile cache.
+        jobs (int): The number of processes to decode images with.
+
+    Returns:
+        dict, dict: Map of filename -> Tile, and map of filename -> content
+        hash.
+    """
+    hashes = {filename: hash_file(filename) for filename in set(filenames)}
+    tiles = {}
+    misses = []
+    for (filename, key) in sorted(hashes.items()):
+        tile = cache.get(key) if cache is not None else None
+        if tile is None:
+            misses.append(filename)
+        else:
+            tiles[filename] = tile
+
+    if jobs > 1 and len(misses) > 1:
+        chunksize = max(1, len(misses) // (jobs * 4))
+        with ProcessPoolExecutor(jobs) as executor:
+            decoded = list(
+                executor.map(decode_tile, misses, chunksize=chunksize)
+            )
+    else:
+        decoded = [decode_tile(filename) for filename in misses]
+
+    for (filename, tile) in zip(misses, decoded):
+        tiles[filename] = tile
+        if cache is not None:
+            cache.put(hashes[filename], tile)
+
+    if cache is not None:
+        cache.hits += len(tiles) - len(misses)
+        cache.misses += len(misses)
+        if misses and cache.enabled:
+            cache.evict()
+
+    return tiles, hashes
+
+
+def layout_hash(size: tuple, tiles, hashes: dict, options: dict):
+    """Return a hash of the layout of a sheet, i.e. everything that
+    determines its contents.
+
+    Args:
+        size (tuple): The (width, height) of the sheet.
+        tiles (iterable): (image filename, (x, y)) tuples.
+        hashes (dict): Map of image filename -> content hash.
+        options (dict): The encoding options of the sheet.
+
+    Returns:
+        str: The hex digest.
+    """
+    layout = {
+        "version": TILE_CACHE_VERSION,
+        "size": list(size),
+        "tiles": [[hashes[f], list(coords)] for (f, coords) in tiles],
+        "options": options,
+    }
+    return hashlib.sha256(
+        json.dumps(layout, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def pack(sizes: list, max_size: int):
+    """Pack rectangles of the given sizes into as few sheets as possible,
+    using a simple shelf algorithm: rectangles are sorted by height and
+    placed left to right in rows ("shelves"), starting a new shelf when a row
+    is full and a new sheet when a sheet is full.
+
+    Args:
+        sizes (list): The (width, height) of each rectangle.
+        max_size (int): The maximum width and height of a sheet.
+
+    Raises:
+        ValueError: If a rectangle is bigger than max_size.
+
+    Returns:
+        list, list: The (sheet, x, y) of each rectangle, and the (width,
+        height) of each sheet.
+    """
+    placements = [None] * len(sizes)
+    sheets = []
+    order = sorted(
+        range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0], i)
+    )
+
+    sheet = -1
+    x = y = shelf_height = 0
+    for i in order:
+        (w, h) = sizes[i]
+        if w > max_size or h > max_size:
+            raise ValueError(
+                f"A {w}x{h} image does not fit in a {max_size}px sheet."
+            )
+        if sheet >= 0 and x + w > max_size:
+            # New shelf
+            y += shelf_height
+            x = shelf_height = 0
+        if sheet < 0 or y + h > max_size:
+            # New sheet
+            sheet += 1
+            sheets.append([0, 0])
+            x = y = shelf_height = 0
+        placements[i] = (sheet, x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+        sheets[sheet][0] = max(sheets[sheet][0], x)
+        sheets[sheet][1] = max(sheets[sheet][1], y + h)
+
+    return placements, [tuple(s) for s in sheets]
+
+
+def webp_filename(filename: str):
+    """Return the filename of the WebP copy of the given sheet."""
+    return os.path.splitext(filename)[0] + ".webp"
+
+
+def composite_sheet(
+    size: tuple,
+    tiles,
+    filename: str,
+    cache: TileCache = None,
+    jobs: int = 1,
+    optimize: bool = False,
+    webp: bool = False,
+    decoded: dict = None,
+):
+    """Paste the given images onto a transparent sheet and save it. If a
+    cache is given and the sheet was last composited from the same images
+    at the same positions, the existing sheet is kept as is.
+
+    Args:
+        size (tuple): The (width, height) of the sheet.
+        tiles (iterable): (image filename, (x, y)) tuples.
+        filename (str): The filename to save the sheet to.
+        cache (TileCache, optional): The tile cache.
+        jobs (int): The number of processes to decode images with.
+        optimize (bool): Whether to spend more time compressing the PNG
+          (losslessly).
+        webp (bool): Whether to also save a lossless WebP copy of the sheet,
+          next to the PNG.
+        decoded (tuple, optional): The tiles and hashes returned by
+          decode_tiles, if the images have already been decoded.
+
+    Returns:
+        bool: Whether the sheet was (re)composited.
+    """
+    tiles = list(tiles)
+    if decoded is None:
+        decoded = decode_tiles([f for (f, _) in tiles], cache, jobs)
+    (images, hashes) = decoded
+
+    if webp and not features.check("webp"):
+        logger.warning("Pillow was built without WebP support.")
+        webp = False
+    filenames = [filename] + ([webp_filename(filename)] if webp else [])
+    layout = layout_hash(size, tiles, hashes, {"optimize": optimize})
+    if cache is not None and cache.is_sheet_current(filenames, layout):
+        logger.info(f"{filename} is up to date.")
+        return False
+
+    sheet = Image.new("RGBA", size)
+    for (tile_filename, coords) in tiles:
+        sheet.paste(images[tile_filename].to_image(), coords)
+    sheet.save(filename, optimize=optimize)
+    if webp:
+        sheet.save(filenames[1], lossless=True, quality=100, method=6)
+
+    if cache is not None:
+        cache.record_sheet(filenames, layout)
+    return True
+
+
+def build_atlas(
+    images: dict,
+    output_folder: str,
+    prefix: str,
+    max_size: int,
+    cache: TileCache = None,
+    jobs: int = 1,
+):
+    """Pack the given images into one or more sheets, saved as
+    <output_folder>/<prefix>_<n>.png.
+
+    Args:
+        images (dict): Map of name -> image filename.
+        output_folder (str): The folder to save the sheets to.
+        prefix (str): The prefix of the sheet filenames.
+        max_size (int): The maximum width and height of a sheet.
+        cache (TileCache, optional): The tile cache.
+        jobs (int): The number of processes to decode images with.
+
+    Returns:
+        dict, list: Map of name -> {"sheet", "x", "y", "w", "h"} (where sheet
+        is the index of the sheet), and the filename of each sheet.
+    """
+    names = sorted(images)
+    decoded = decode_tiles(images.values(), cache, jobs)
+    sizes = [decoded[0][images[name]].size for name in names]
+
+    placements, sheet_sizes = pack(sizes, max_size)
+
+    coords = {}
+    tiles = [[] for _ in sheet_sizes]
+    for (name, (w, h), (sheet, x, y)) in zip(names, sizes, placements):
+        coords[name] = {"sheet": sheet, "x": x, "y": y, "w": w, "h": h}
+        tiles[sheet].append((images[name], (x, y)))
+
+    filenames = []
+    for (n, size) in enumerate(sheet_sizes):
+        filename = os.path.join(output_folder, f"{prefix}_{n}.png")
+        composite_sheet(size, tiles[n], filename, cache, decoded=decoded)
+        filenames.append(filename)
+
+    return coords, filenames
@@ -0,0 +1,330 @@
+""" Columnar layout for the traits data.
+
+Rather than a list of objects (which repeats every key name for every trait),
+the columnar layout stores one array per field. Low-cardinality fields such
+as class and family are dictionary-encoded, i.e. stored as indexes into a
+list of distinct values. Heavy text fields are split into chunks that are
+stored in separate files, so that they can be loaded lazily.
+
+The header file describes the layout:
+
+    {
+      "format": "siralim-planner-columnar",
+      "version": 1,
+      "length": <number of rows>,
+      "fields": [
+        {"name": "uid", "encoding": "plain"},
+        {"name": "class", "encoding": "dictionary", "dictionary": [...]},
+        {"name": "sources", "encoding": "dictionary_list",
+         "dictionary": [...]},
+        {"name": "stats", "encoding": "record", "keys": [...]},
+        {"name": "search_text", "encoding": "chunked", "chunk_size": 160,
+         "chunks": [{"filename": ..., "sha256": ...}, ...]},
+        ...
+      ],
+      "columns": {"uid": [...], "class": [...], ...}
+    }
+
+Missing values (e.g. the stats of traits that are not in the SUAPI data) are
+stored as null and omitted from the decoded rows.
+"""
+
+import os
+import re
+import json
+import hashlib
+
+COLUMNAR_FORMAT = "siralim-planner-columnar"
+COLUMNAR_VERSION = 1
+
+DICTIONARY_FIELDS = ("class", "family", "sources")
+CHUNKED_FIELDS = ("trait_description", "search_text")
+# The number of chunks of each chunked field. It is fixed (rather than the
+# number of rows per chunk) so that the chunk filenames are known before the
+# data is built.
+CHUNK_COUNT = 8
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def _field_names(json_data: list):
+    names = {}
+    for obj in json_data:
+        for k in obj:
+            names.setdefault(k, None)
+    return list(names)
+
+
+def _dictionary(values):
+    dictionary = {}
+    for v in values:
+        if v is not None:
+            dictionary.setdefault(v, len(dictionary))
+    return dictionary
+
+
+def chunk_filename(prefix: str, name: str, n: int):
+    """Return the filename of a chunk.
+
+    Args:
+        prefix (str): The prefix of the filenames.
+        name (str): The name of the chunked field.
+        n (int): The index of the chunk.
+
+    Returns:
+        str: The filename.
+    """
+    return f"{prefix}.{name}.{n}.json"
+
+
+def chunk_filenames(
+    prefix: str = "data",
+    chunked_fields=CHUNKED_FIELDS,
+    chunk_count: int = CHUNK_COUNT,
+):
+    """Return the filenames of the chunks saved by to_columnar with a fixed
+    number of chunks.
+
+    Args:
+        prefix (str): The prefix of the filenames.
+        chunked_fields (tuple): The chunked fields.
+        chunk_count (int): The number of chunks of each field.
+
+    Returns:
+        list: The filenames.
+    """
+    return [
+        chunk_filename(prefix, name, n)
+        for name in chunked_fields
+        for n in range(chunk_count)
+    ]
+
+
+def to_columnar(
+    json_data: list,
+    prefix: str = "data",
+    dictionary_fields=DICTIONARY_FIELDS,
+    chunked_fields=CHUNKED_FIELDS,
+    chunk_size: int = None,
+    chunk_count: int = CHUNK_COUNT,
+):
+    """Convert a list of JSON rows into the columnar layout.
+
+    Args:
+        json_data (list): The list of JSON rows.
+        prefix (str): The prefix of the chunk filenames.
+        dictionary_fields (tuple): The fields to dictionary-encode.
+        chunked_fields (tuple): The fields to split into chunks.
+        chunk_size (int): The number of rows per chunk. By default, each
+          field is split into chunk_count chunks (some of which may be
+          empty), so that the filenames do not depend on the number of rows.
+        chunk_count (int): The number of chunks, if chunk_size is not given.
+
+    Returns:
+        dict, dict: The header, and a dict mapping the filename of each chunk
+        to its contents.
+    """
+    header = {
+        "format": COLUMNAR_FORMAT,
+        "version": COLUMNAR_VERSION,
+        "length": len(json_data),
+        "fields": [],
+        "columns": {},
+    }
+    chunks = {}
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(json_data) // chunk_count))
+    else:
+        chunk_count = -(-len(json_data) // chunk_size)
+
+    for name in _field_names(json_data):
+        values = [obj.get(name) for obj in json_data]
+        field = {"name": name}
+
+        if name in chunked_fields:
+            field["encoding"] = "chunked"
+            field["chunk_size"] = chunk_size
+            field["chunks"] = []
+            for n in range(chunk_count):
+                filename = chunk_filename(prefix, name, n)
+                i = n * chunk_size
+                contents = _dumps(values[i : i + chunk_size])
+                chunks[filename] = contents
+                field["chunks"].append(
+                    {
+                        "filename": filename,
+                        "sha256": hashlib.sha256(
+                            contents.encode("utf-8")
+                        ).hexdigest(),
+                    }
+                )
+            header["fields"].append(field)
+            continue
+
+        if name in dictionary_fields:
+            is_list = any(isinstance(v, list) for v in values)
+            flat = (
+                [x for v in values if v is not None for x in v]
+                if is_list
+                else values
+            )
+            dictionary = _dictionary(flat)
+            field["encoding"] = "dictionary_list" if is_list else "dictionary"
+            field["dictionary"] = list(dictionary)
+            if is_list:
+                column = [
+                    None if v is None else [dictionary[x] for x in v]
+                    for v in values
+                ]
+            else:
+                column = [None if v is None else dictionary[v] for v in values]
+        elif any(isinstance(v, dict) for v in values):
+            keys = _field_names([v for v in values if v is not None])
+            field["encoding"] = "record"
+            field["keys"] = keys
+            column = [
+                None if v is None else [v.get(k) for k in keys] for v in values
+            ]
+        else:
+            field["encoding"] = "plain"
+            column = values
+
+        header["fields"].append(field)
+        header["columns"][name] = column
+
+    return header, chunks
+
+
+def save_columnar(
+    json_data: list, folder: str, prefix: str = "data", **kwargs
+):
+    """Save the JSON data to the given folder in the columnar layout. The
+    header is saved to <prefix>.columnar.json, and each chunk alongside it.
+    Chunks left over from a previous build are removed.
+
+    Args:
+        json_data (list): The list of JSON rows.
+        folder (str): The folder to save to.
+        prefix (str): The prefix of the filenames.
+        **kwargs: Passed to to_columnar.
+
+    Returns:
+        dict: The header.
+    """
+    header, chunks = to_columnar(json_data, prefix=prefix, **kwargs)
+    for (filename, contents) in chunks.items():
+        with open(os.path.join(folder, filename), "w") as f:
+            f.write(contents)
+    pattern = re.compile(re.escape(prefix) + r"\.\w+\.\d+\.json")
+    for name in os.listdir(folder):
+        if pattern.fullmatch(name) and name not in chunks:
+            os.remove(os.path.join(folder, name))
+    with open(os.path.join(folder, f"{prefix}.columnar.json"), "w") as f:
+        f.write(_dumps(header))
+    return header
+
+
+class ColumnarData:
+    """Reader for data saved in the columnar layout. Chunked fields are only
+    loaded from disk when they are first accessed.
+
+    Args:
+        filename (str): The filename of the header.
+
+    Raises:
+        ValueError: If the file is not in a supported columnar format.
+    """
+
+    def __init__(self, filename: str):
+        with open(filename, "r") as f:
+            self.header = json.load(f)
+        if (
+            self.header.get("format") != COLUMNAR_FORMAT
+            or self.header.get("version") != COLUMNAR_VERSION
+        ):
+            raise ValueError(f"{filename} is not a supported columnar file.")
+        self.folder = os.path.dirname(filename)
+        self.fields = {f["name"]: f for f in self.header["fields"]}
+        self._columns = {}
+        self._chunks = {}
+
+    def __len__(self):
+        return self.header["length"]
+
+    def _chunk(self, name: str, n: int):
+        if (name, n) not in self._chunks:
+            chunk = self.fields[name]["chunks"][n]
+            with open(os.path.join(self.folder, chunk["filename"]), "r") as f:
+                self._chunks[(name, n)] = json.load(f)
+        return self._chunks[(name, n)]
+
+    def _decode(self, name: str, value):
+        field = self.fields[name]
+        if value is None:
+            return None
+        encoding = field["encoding"]
+        if encoding == "dictionary":
+            return field["dictionary"][value]
+        if encoding == "dictionary_list":
+            return [field["dictionary"][i] for i in value]
+        if encoding == "record":
+            return dict(zip(field["keys"], value))
+        return value
+
+    def value(self, name: str, i: int):
+        """Return the value of a field for a single row, loading only the
+        chunk that holds it if the field is chunked.
+
+        Args:
+            name (str): The name of the field.
+            i (int): The index of the row.
+
+        Returns:
+            The value, or None if the row does not have the field.
+        """
+        field = self.fields[name]
+        if field["encoding"] == "chunked":
+            size = field["chunk_size"]
+            return self._chunk(name, i // size)[i % size]
+        return self._decode(name, self.header["columns"][name][i])
+
+    def column(self, name: str):
+        """Return the decoded values of a field for every row.
+
+        Args:
+            name (str): The name of the field.
+
+        Returns:
+            list: The values.
+        """
+        if name not in self._columns:
+            field = self.fields[name]
+            if field["encoding"] == "chunked":
+                column = []
+                for n in range(len(field["chunks"])):
+                    column += self._chunk(name, n)
+            else:
+                column = [
+                    self._decode(name, v) for v in self.header["columns"][name]
+                ]
+            self._columns[name] = column
+        return self._columns[name]
+
+    def rows(self, fields: list = None):
+        """Decode the data back into a list of JSON rows.
+
+        Args:
+            fields (list): The fields to include (defaults to all fields).
+              Chunked fields that are not included are never loaded.
+
+        Returns:
+            list: The list of JSON rows.
+        """
+        names = [n for n in self.fields if fields is None or n in fields]
+        columns = [(n, self.column(n)) for n in names]
+        return [
+            {n: c[i] for (n, c) in columns if c[i] is not None}
+            for i in range(len(self))
+        ]
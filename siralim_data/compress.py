@@ -0,0 +1,275 @@
+""" Precompression of the output artifacts, for static hosting that does not
+compress responses on the fly.
+
+Each artifact is saved alongside its precompressed siblings (<name>.gz, and
+<name>.br if the optional brotli package is installed), at maximum
+compression. The content hash and compressed sizes of each artifact are
+recorded in precompressed.json, and an artifact is only compressed again
+when its content hash changes. Files are compressed on a thread pool, as
+zlib and brotli release the GIL while compressing.
+
+Size budgets cap the size of an artifact (e.g. "data.json") or of one of its
+siblings (e.g. "data.json.gz"), so that growth in transfer size fails the
+build rather than going unnoticed.
+"""
+
+import os
+import gzip
+import json
+import logging as logger
+from concurrent.futures import ThreadPoolExecutor
+
+from siralim_data.manifest import hash_file
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover (optional dependency)
+    brotli = None
+
+PRECOMPRESS_FILENAME = "precompressed.json"
+EXTENSIONS = {"gzip": ".gz", "brotli": ".br"}
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 * 1024}
+
+
+class SizeBudgetError(ValueError):
+    """Raised when artifacts are larger than their size budget.
+
+    Args:
+        message (str): The error message.
+        over (dict): Map of artifact name -> (size, budget), for each
+          artifact over its budget.
+    """
+
+    def __init__(self, message: str, over: dict = None):
+        super().__init__(message)
+        self.over = over
+
+    def __reduce__(self):
+        return (type(self), (str(self), self.over))
+
+
+def available_encodings():
+    """Return the encodings that can be used, i.e. gzip, and brotli if the
+    brotli package is installed.
+
+    Returns:
+        list: The names of the encodings.
+    """
+    return ["gzip"] if brotli is None else ["gzip", "brotli"]
+
+
+def select_encodings(budgets: dict = None):
+    """Return the encodings to precompress with, i.e. the available
+    encodings (see available_encodings), logging a warning if brotli is not
+    installed.
+
+    Args:
+        budgets (dict): Map of artifact name -> budget in bytes.
+
+    Raises:
+        ValueError: If brotli is not installed, and budgets are given for
+          .br siblings.
+
+    Returns:
+        list: The names of the encodings.
+    """
+    encodings = available_encodings()
+    if "brotli" not in encodings:
+        names = sorted(
+            n for n in budgets or {} if n.endswith(EXTENSIONS["brotli"])
+        )
+        if names:
+            raise ValueError(
+                f"Cannot check the budgets of {', '.join(names)}, as the "
+                "brotli package is not installed."
+            )
+        logger.warning(
+            "The brotli package is not installed, so no .br copies are saved."
+        )
+    return encodings
+
+
+def compressed_filename(filename: str, encoding: str):
+    """Return the filename of the precompressed sibling of a file.
+
+    Args:
+        filename (str): The filename of the artifact.
+        encoding (str): The encoding ("gzip" or "brotli").
+
+    Returns:
+        str: The filename of the sibling.
+    """
+    return filename + EXTENSIONS[encoding]
+
+
+def compress(data: bytes, encoding: str):
+    """Compress data at maximum compression. gzip output does not include
+    a timestamp, so that it only changes when the data does.
+
+    Args:
+        data (bytes): The data to compress.
+        encoding (str): The encoding ("gzip" or "brotli").
+
+    Returns:
+        bytes: The compressed data.
+    """
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "brotli" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"Unsupported encoding '{encoding}'.")
+
+
+def _is_current(filename: str, encodings: list, digest: str, entry: dict):
+    if entry is None or entry["sha256"] != digest:
+        return False
+    for encoding in encodings:
+        sibling = compressed_filename(filename, encoding)
+        size = entry["sizes"].get(encoding)
+        if size is None or not os.path.isfile(sibling):
+            return False
+        if os.path.getsize(sibling) != size:
+            return False
+    return True
+
+
+def _precompress_file(filename: str, encodings: list, entry: dict):
+    digest = hash_file(filename)
+    if _is_current(filename, encodings, digest, entry):
+        return entry, False
+    with open(filename, "rb") as f:
+        data = f.read()
+    sizes = {}
+    for encoding in encodings:
+        compressed = compress(data, encoding)
+        with open(compressed_filename(filename, encoding), "wb") as f:
+            f.write(compressed)
+        sizes[encoding] = len(compressed)
+    return {"sha256": digest, "bytes": len(data), "sizes": sizes}, True
+
+
+def precompress(
+    filenames: list,
+    encodings: list,
+    record_filename: str,
+    jobs: int = None,
+):
+    """Save the precompressed siblings of the given files, skipping the
+    files whose contents have not changed since they were last compressed.
+
+    Args:
+        filenames (list): The filenames of the artifacts.
+        encodings (list): The encodings to compress with.
+        record_filename (str): The filename of the record of the content
+          hashes and compressed sizes (precompressed.json).
+        jobs (int): The number of threads to compress with (defaults to the
+          number of CPUs).
+
+    Returns:
+        dict, list: The record, mapping each filename to its "sha256",
+        "bytes" and compressed "sizes", and the filenames that were
+        compressed.
+    """
+    try:
+        with open(record_filename, "r") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(filenames)))
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(
+            pool.map(
+                lambda f: _precompress_file(f, encodings, previous.get(f)),
+                filenames,
+            )
+        )
+
+    record = {f: entry for (f, (entry, _)) in zip(filenames, results)}
+    compressed = [f for (f, (_, done)) in zip(filenames, results) if done]
+    with open(record_filename, "w") as f:
+        json.dump(record, f, indent=1)
+    return record, compressed
+
+
+def parse_size(size: str):
+    """Parse a size in bytes, with an optional K or M suffix (in units of
+    1024), e.g. "120K".
+
+    Args:
+        size (str): The size.
+
+    Raises:
+        ValueError: If the size cannot be parsed.
+
+    Returns:
+        int: The size in bytes.
+    """
+    size = size.strip().upper().rstrip("B")
+    unit = size[-1:] if size[-1:] in SIZE_UNITS else ""
+    number = size[: len(size) - len(unit)]
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size '{size}'.") from None
+
+
+def parse_budget(budget: str):
+    """Parse a size budget of the form <artifact>=<size>, e.g.
+    "data.json.gz=120K".
+
+    Args:
+        budget (str): The budget.
+
+    Raises:
+        ValueError: If the budget cannot be parsed.
+
+    Returns:
+        (str, int): The name of the artifact and its budget in bytes.
+    """
+    (name, sep, size) = budget.partition("=")
+    if not sep or not name:
+        raise ValueError(f"Invalid size budget '{budget}'.")
+    return name.strip(), parse_size(size)
+
+
+def artifact_sizes(record: dict):
+    """Return the size of every artifact and precompressed sibling in a
+    record, keyed on the basename of the file.
+
+    Args:
+        record (dict): The record (see precompress).
+
+    Returns:
+        dict: Map of name -> size in bytes.
+    """
+    sizes = {}
+    for (filename, entry) in record.items():
+        name = os.path.basename(filename)
+        sizes[name] = entry["bytes"]
+        for (encoding, size) in entry["sizes"].items():
+            sizes[compressed_filename(name, encoding)] = size
+    return sizes
+
+
+def check_budgets(record: dict, budgets: dict):
+    """Check the sizes of the artifacts against their budgets. Budgets of
+    artifacts that are not in the record (e.g. the outputs of stages that
+    were not built) are logged and ignored.
+
+    Args:
+        record (dict): The record (see precompress).
+        budgets (dict): Map of artifact name -> budget in bytes.
+
+    Returns:
+        dict: Map of artifact name -> (size, budget), for each artifact over
+        its budget.
+    """
+    sizes = artifact_sizes(record)
+    over = {}
+    for (name, budget) in sorted(budgets.items()):
+        if name not in sizes:
+            logger.warning(f"No artifact '{name}' to check the budget of.")
+        elif sizes[name] > budget:
+            over[name] = (sizes[name], budget)
+    return over
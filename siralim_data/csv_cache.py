@@ -0,0 +1,260 @@
+""" Persistent on-disk cache of the results of the csv loaders.
+
+The result of a loader is pickled to the cache folder, keyed on the loader's
+name and version, the source code of its module (and of any modules it
+depends on), its arguments, and the content hashes of any arguments that are
+paths to files. Subsequent calls with unchanged files load the pickle instead
+of parsing the csv again.
+
+The cache is bounded in size: when it grows beyond max_bytes, the least
+recently used entries are evicted.
+
+Long-running builds (e.g. build_data.py --watch) can also keep the entries in
+memory, and memoise the content hash of each file on its modification time
+and size, so that a rebuild neither reads the pickles nor rehashes unchanged
+files.
+"""
+
+import os
+import copy
+import pickle
+import hashlib
+import inspect
+import functools
+import threading
+import collections
+import logging as logger
+
+from siralim_data.manifest import hash_file
+
+CSV_CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CsvCache:
+    """A size-bounded cache of loader results.
+
+    Args:
+        folder (str): The folder to store the cache in.
+        max_bytes (int): The maximum total size of the cache.
+    """
+
+    def __init__(self, folder: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.in_memory = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._file_hashes = {}
+
+    def _filename(self, key: str):
+        return os.path.join(self.folder, f"{key}.pickle")
+
+    def get(self, key: str):
+        """Return the cached value for the given key.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            (bool, object): Whether the key was found, and the value.
+        """
+        if self.in_memory:
+            with self._lock:
+                data = self._memory.get(key)
+                if data is not None:
+                    self._memory.move_to_end(key)
+            if data is not None:
+                # Unpickled for every call, as the caller may modify it.
+                return True, pickle.loads(data)
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+            value = pickle.loads(data)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return False, None
+        try:
+            os.utime(filename)  # Mark as recently used.
+        except OSError:
+            pass
+        self._remember(key, data)
+        return True, value
+
+    def put(self, key: str, value):
+        """Store the given value, then evict entries if the cache is too big.
+
+        Args:
+            key (str): The key.
+            value: The (picklable) value.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        filename = self._filename(key)
+        tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}"
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(tmp_filename, "wb") as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+        self._remember(key, data)
+        self.evict()
+
+    def _remember(self, key: str, data: bytes):
+        """Keep a pickled value in memory (if in_memory is set), evicting
+        the least recently used values beyond max_bytes.
+        """
+        if not self.in_memory:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory and self._memory_bytes > self.max_bytes:
+                (_, evicted) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def hash_file(self, filename: str):
+        """Return the content hash of a file. If in_memory is set, the hash
+        is memoised on the modification time and size of the file.
+
+        Args:
+            filename (str): The filename.
+
+        Returns:
+            str: The hex digest.
+        """
+        if not self.in_memory:
+            return hash_file(filename)
+        st = os.stat(filename)
+        stamp = (st.st_mtime_ns, st.st_size)
+        memo = self._file_hashes.get(filename)
+        if memo is None or memo[0] != stamp:
+            memo = (stamp, hash_file(filename))
+            self._file_hashes[filename] = memo
+        return memo[1]
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        with self._lock:
+            entries = []
+            try:
+                with os.scandir(self.folder) as it:
+                    for e in it:
+                        if e.name.endswith(".pickle"):
+                            st = e.stat()
+                            entries.append((st.st_mtime, st.st_size, e.path))
+            except FileNotFoundError:
+                return
+            total = sum(size for (_, size, _) in entries)
+            for (_, size, path) in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    def cached(self, version: int = 1, depends: list = None):
+        """Decorator that caches the result of a loader. Arguments that are
+        paths to existing files are keyed on the contents of the file.
+        Generator functions are supported: the items are cached once the
+        generator has been exhausted.
+
+        The whole source of the module that defines the loader is part of
+        the key, so that changes to the helpers and constants it uses are
+        picked up as well.
+
+        Args:
+            version (int): The version of the loader. Bump it when the output
+              of the loader changes without any of the source code in the
+              key changing.
+            depends (list): Objects defined in other modules that the output
+              of the loader depends on (e.g. the classes of its results).
+              The source of their modules is part of the key too.
+
+        Returns:
+            callable: The decorator.
+        """
+
+        def decorator(func):
+            signature = inspect.signature(func)
+            source_hashes = [
+                hash_file(inspect.getsourcefile(obj))
+                for obj in [func] + list(depends or [])
+            ]
+            name = f"{func.__module__}.{func.__qualname__}"
+
+            def key_of(args, kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                h = hashlib.sha256()
+                h.update(
+                    repr((CSV_CACHE_VERSION, name, version, source_hashes))
+                    .encode("utf-8")
+                )
+                for (arg, value) in bound.arguments.items():
+                    h.update(repr((arg, value)).encode("utf-8"))
+                    if isinstance(value, str) and os.path.isfile(value):
+                        h.update(self.hash_file(value).encode("ascii"))
+                return h.hexdigest()
+
+            if inspect.isgeneratorfunction(func):
+
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        yield from func(*args, **kwargs)
+                        return
+                    key = key_of(args, kwargs)
+                    found, items = self.get(key)
+                    if found:
+                        self.hits += 1
+                        yield from items
+                        return
+                    self.misses += 1
+                    items = []
+                    for item in func(*args, **kwargs):
+                        # Copy the item, as the consumer may modify it.
+                        items.append(copy.copy(item))
+                        yield item
+                    self.put(key, items)
+
+            else:
+
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return func(*args, **kwargs)
+                    key = key_of(args, kwargs)
+                    found, value = self.get(key)
+                    if found:
+                        self.hits += 1
+                        return value
+                    self.misses += 1
+                    value = func(*args, **kwargs)
+                    self.put(key, value)
+                    logger.debug(f"Cached the result of {name}.")
+                    return value
+
+            return wrapper
+
+        return decorator
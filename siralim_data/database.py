@@ -0,0 +1,348 @@
+""" Export of the built data to a SQLite database, for tooling that looks
+up or searches the data (e.g. bots), rather than loading the JSON outputs.
+
+The database is normalized: the stats and sources of each trait, the perks
+of each specialization and the rank perks of each relic are stored in their
+own tables. Traits are indexed on uid, class, family, creature and material,
+and the fields joined into the search text of each trait (see
+build_data.SEARCH_TEXT_COLUMNS) are indexed by an FTS5 table, traits_fts,
+whose rowids are the ids of the traits:
+
+    SELECT t.* FROM traits_fts JOIN traits t ON t.id = traits_fts.rowid
+    WHERE traits_fts MATCH 'burning' ORDER BY bm25(traits_fts);
+
+The database is written to a temporary file in a single transaction, then
+moved into place, so readers never see a partially written database.
+"""
+
+import os
+import sqlite3
+
+DATABASE_FILENAME = "siralim.sqlite"
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE traits (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    class TEXT NOT NULL,
+    family TEXT NOT NULL,
+    creature TEXT NOT NULL,
+    trait_name TEXT NOT NULL,
+    trait_description TEXT NOT NULL,
+    material_name TEXT NOT NULL,
+    sprite_filename TEXT
+);
+CREATE INDEX traits_class ON traits (class);
+CREATE INDEX traits_family ON traits (family);
+CREATE INDEX traits_creature ON traits (creature);
+CREATE INDEX traits_material_name ON traits (material_name);
+
+CREATE TABLE trait_stats (
+    trait_id INTEGER PRIMARY KEY REFERENCES traits (id),
+    health INTEGER,
+    attack INTEGER,
+    intelligence INTEGER,
+    defense INTEGER,
+    speed INTEGER,
+    total INTEGER
+);
+
+CREATE TABLE sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE trait_sources (
+    trait_id INTEGER NOT NULL REFERENCES traits (id),
+    source_id INTEGER NOT NULL REFERENCES sources (id),
+    PRIMARY KEY (trait_id, source_id)
+) WITHOUT ROWID;
+CREATE INDEX trait_sources_source ON trait_sources (source_id);
+
+CREATE VIRTUAL TABLE traits_fts USING fts5 (
+    class,
+    creature,
+    family,
+    trait_name,
+    trait_description,
+    material_name,
+    content = 'traits',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TABLE specializations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    abbreviation TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL
+);
+
+CREATE TABLE perks (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    specialization_id INTEGER NOT NULL REFERENCES specializations (id),
+    name TEXT NOT NULL,
+    ranks INTEGER,
+    cost_per_rank INTEGER,
+    anointment INTEGER,
+    description TEXT,
+    icon TEXT
+);
+CREATE INDEX perks_specialization ON perks (specialization_id);
+CREATE INDEX perks_name ON perks (name);
+
+CREATE TABLE relics (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    abbreviation TEXT NOT NULL,
+    stat_bonus TEXT
+);
+
+CREATE TABLE relic_perks (
+    relic_id INTEGER NOT NULL REFERENCES relics (id),
+    rank INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (relic_id, rank)
+) WITHOUT ROWID;
+
+CREATE TABLE spells (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    charges INTEGER,
+    description TEXT NOT NULL
+);
+CREATE INDEX spells_class ON spells (class);
+"""
+
+TABLES = [
+    "metadata",
+    "traits",
+    "trait_stats",
+    "sources",
+    "trait_sources",
+    "specializations",
+    "perks",
+    "relics",
+    "relic_perks",
+    "spells",
+]
+STAT_NAMES = ["health", "attack", "intelligence", "defense", "speed", "total"]
+ANOINTMENT_VALUES = {"Yes": 1, "No": 0}
+
+
+def _insert_traits(conn, traits: list):
+    conn.executemany(
+        "INSERT INTO traits (id, uid, class, family, creature, trait_name, "
+        "trait_description, material_name, sprite_filename) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                i,
+                t["uid"],
+                t["class"],
+                t["family"],
+                t["creature"],
+                t["trait_name"],
+                t["trait_description"],
+                t["material_name"],
+                t.get("sprite_filename"),
+            )
+            for (i, t) in enumerate(traits, 1)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO trait_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            [i] + [t["stats"].get(s) for s in STAT_NAMES]
+            for (i, t) in enumerate(traits, 1)
+            if t.get("stats")
+        ),
+    )
+
+    source_ids = {}
+    for t in traits:
+        for source in t.get("sources", []):
+            source_ids.setdefault(source, len(source_ids) + 1)
+    conn.executemany(
+        "INSERT INTO sources (id, name) VALUES (?, ?)",
+        ((i, name) for (name, i) in source_ids.items()),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO trait_sources VALUES (?, ?)",
+        (
+            (i, source_ids[source])
+            for (i, t) in enumerate(traits, 1)
+            for source in t.get("sources", [])
+        ),
+    )
+    # Index the traits table (the content of the FTS table) in one pass.
+    conn.execute("INSERT INTO traits_fts (traits_fts) VALUES ('rebuild')")
+
+
+def _insert_specializations(conn, specializations: list):
+    conn.executemany(
+        "INSERT INTO specializations (id, name, abbreviation, description) "
+        "VALUES (?, ?, ?, ?)",
+        (
+            (i, s["name"], s["abbreviation"], s["description"])
+            for (i, s) in enumerate(specializations, 1)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO perks (uid, specialization_id, name, ranks, "
+        "cost_per_rank, anointment, description, icon) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                p["uid"],
+                i,
+                p["name"],
+                p.get("ranks"),
+                p.get("cost_per_rank"),
+                ANOINTMENT_VALUES.get(p.get("anointment")),
+                p.get("description"),
+                p.get("icon"),
+            )
+            for (i, s) in enumerate(specializations, 1)
+            for p in s["perks"]
+        ),
+    )
+
+
+def _insert_relics(conn, relics: list):
+    conn.executemany(
+        "INSERT INTO relics (id, uid, name, abbreviation, stat_bonus) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, r["uid"], r["name"], r["abbreviation"], r.get("stat_bonus"))
+            for (i, r) in enumerate(relics, 1)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO relic_perks VALUES (?, ?, ?)",
+        (
+            (i, p["rank"], p["description"])
+            for (i, r) in enumerate(relics, 1)
+            for p in r["perks"]
+        ),
+    )
+
+
+def _insert_spells(conn, spells: list):
+    conn.executemany(
+        "INSERT INTO spells (uid, name, class, charges, description) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (s["uid"], s["name"], s["class"], s["charges"], s["description"])
+            for s in spells
+        ),
+    )
+
+
+def export_database(
+    filename: str,
+    traits: list,
+    specializations: list,
+    relics: list,
+    spells: list,
+    metadata: dict = None,
+):
+    """Export the built data to a SQLite database.
+
+    Args:
+        filename (str): The filename of the database. It is replaced if it
+          exists.
+        traits (list): The traits data.
+        specializations (list): The specializations data.
+        relics (list): The relics data.
+        spells (list): The spells data.
+        metadata (dict): Extra key/values to save to the metadata table,
+          e.g. the compendium version.
+
+    Returns:
+        dict: The number of rows of each table.
+    """
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_filename):
+        os.remove(tmp_filename)
+
+    conn = sqlite3.connect(tmp_filename)
+    try:
+        # The file is only moved into place once complete (and removed
+        # otherwise), so there is no need for a journal.
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.executemany(
+                "INSERT INTO metadata VALUES (?, ?)",
+                [("schema_version", str(SCHEMA_VERSION))]
+                + sorted((metadata or {}).items()),
+            )
+            _insert_traits(conn, traits)
+            _insert_specializations(conn, specializations)
+            _insert_relics(conn, relics)
+            _insert_spells(conn, spells)
+        conn.execute("INSERT INTO traits_fts (traits_fts) VALUES ('optimize')")
+        conn.execute("ANALYZE")
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in TABLES
+        }
+    except BaseException:
+        conn.close()
+        os.remove(tmp_filename)
+        raise
+    conn.close()
+    os.replace(tmp_filename, filename)
+    return counts
+
+
+def fts_query(text: str):
+    """Convert free text to an FTS5 query matching every word of it (the
+    last word as a prefix), without interpreting FTS5 syntax, so that user
+    input such as "Titan's" cannot cause a syntax error.
+
+    Args:
+        text (str): The text to search for.
+
+    Returns:
+        str: The FTS5 query, or None if the text has no words.
+    """
+    words = ['"%s"' % w.replace('"', '""') for w in text.split()]
+    if not words:
+        return None
+    words[-1] += "*"
+    return " ".join(words)
+
+
+def search_traits(conn, text: str, limit: int = 20):
+    """Search the traits, best matches first.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+        text (str): The text to search for (see fts_query).
+        limit (int): The maximum number of traits to return.
+
+    Returns:
+        list: The uid, creature and trait name of each matching trait.
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    return conn.execute(
+        "SELECT t.uid, t.creature, t.trait_name FROM traits_fts "
+        "JOIN traits t ON t.id = traits_fts.rowid "
+        "WHERE traits_fts MATCH ? ORDER BY bm25(traits_fts) LIMIT ?",
+        (query, limit),
+    ).fetchall()
@@ -0,0 +1,288 @@
+""" Opt-in instrumentation of the stages of the data build.
+
+When a Recorder is active, each stage of the build and each step within it
+(load, enrich, validate, serialize, sprite sheet, ...) is recorded as a span
+with its wall time, CPU time, number of rows processed, bytes written and the
+peak RSS of the process so far. Optionally each stage is profiled with
+cProfile, and the peak memory traced by tracemalloc is recorded.
+
+When no recorder is active, span() and metered() cost next to nothing, so the
+build functions can be instrumented unconditionally.
+
+Notes:
+  - Steps that are chained generators (e.g. load -> enrich -> validate) are
+    wrapped with metered(), which records the time spent in each generator
+    excluding the time spent in the generators it pulls from.
+  - Traced memory is process-wide, so it is only accurate per stage when the
+    stages are run one at a time (--jobs 1).
+  - Only the top-level stage spans are recorded when stages are run on a
+    process pool.
+"""
+
+import os
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (Windows)
+    resource = None
+
+REPORT_FILENAME = "build_report.json"
+
+_active = None
+_local = threading.local()
+
+
+def _peak_rss():
+    """Return the peak RSS of the process in bytes (None if unavailable)."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux (and bytes on macOS).
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Span:
+    """The metrics of a single stage or step of the build.
+
+    Args:
+        name (str): The name of the span, e.g. "traits.load".
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = 0
+        self.bytes_written = 0
+        self.peak_rss_bytes = None
+        self.traced_peak_bytes = None
+        self.profile_filename = None
+        self.skipped = False
+
+    def add_rows(self, n: int):
+        """Record that n more rows were processed."""
+        self.rows += n
+
+    def add_output(self, filename: str):
+        """Record that the given file was written."""
+        self.bytes_written += os.path.getsize(filename)
+
+    def to_json(self):
+        return {k: v for (k, v) in vars(self).items() if v is not None}
+
+
+class _NullSpan(Span):
+    def add_rows(self, n: int):
+        pass
+
+    def add_output(self, filename: str):
+        pass
+
+
+_null_span = _NullSpan("")
+
+
+class Recorder:
+    """Records the spans of a build.
+
+    Args:
+        profile_folder (str): If given, profile each stage with cProfile and
+          save the stats to <profile_folder>/<stage>.prof.
+        trace_memory (bool): Whether to record the peak memory traced by
+          tracemalloc for each stage.
+    """
+
+    def __init__(self, profile_folder: str = None, trace_memory=False):
+        self.profile_folder = profile_folder
+        self.trace_memory = trace_memory
+        self.spans = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def _add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str):
+        """Record the wall and CPU time of the enclosed block.
+
+        Args:
+            name (str): The name of the span.
+
+        Yields:
+            Span: The span, so that rows and outputs can be recorded.
+        """
+        span = Span(name)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield span
+        finally:
+            span.wall_seconds += time.perf_counter() - wall
+            span.cpu_seconds += time.thread_time() - cpu
+            span.peak_rss_bytes = _peak_rss()
+            self._add(span)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record a stage of the build, i.e. a span that is also profiled
+        and memory traced if enabled.
+
+        Args:
+            name (str): The name of the stage.
+
+        Yields:
+            Span: The span of the stage.
+        """
+        profiler = None
+        if self.profile_folder:
+            profiler = cProfile.Profile()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        with self.span(name) as span:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield span
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    os.makedirs(self.profile_folder, exist_ok=True)
+                    span.profile_filename = os.path.join(
+                        self.profile_folder, f"{name}.prof"
+                    )
+                    profiler.dump_stats(span.profile_filename)
+                if self.trace_memory:
+                    span.traced_peak_bytes = tracemalloc.get_traced_memory()[1]
+
+    def record(self, name: str, wall_seconds: float):
+        """Record a span that was timed elsewhere (e.g. a stage that was run
+        in another process).
+
+        Args:
+            name (str): The name of the span.
+            wall_seconds (float): The wall time of the span.
+        """
+        span = Span(name)
+        span.wall_seconds = wall_seconds
+        self._add(span)
+
+    def skipped(self, name: str):
+        """Record that a stage was skipped.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        span = Span(name)
+        span.skipped = True
+        self._add(span)
+
+    def report(self):
+        """Return the report of the build.
+
+        Returns:
+            dict: The report.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.name)
+        return {
+            "total_wall_seconds": time.perf_counter() - self._start,
+            "peak_rss_bytes": _peak_rss(),
+            "spans": [s.to_json() for s in spans],
+        }
+
+    def save(self, filename: str):
+        """Save the report to the given filename.
+
+        Args:
+            filename (str): The filename.
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=1)
+
+
+def enable(recorder: Recorder):
+    """Make the given recorder the active recorder."""
+    global _active
+    _active = recorder
+
+
+def disable():
+    """Deactivate the active recorder (if any)."""
+    global _active
+    _active = None
+
+
+@contextmanager
+def span(name: str):
+    """Record a span with the active recorder (if any). See Recorder.span.
+
+    Args:
+        name (str): The name of the span.
+
+    Yields:
+        Span: The span.
+    """
+    if _active is None:
+        yield _null_span
+        return
+    with _active.span(name) as s:
+        yield s
+
+
+def metered(iterable, name: str):
+    """Wrap a generator so that the time spent producing its items (excluding
+    the time spent in any metered generators it pulls from) and the number
+    of items are recorded as a span with the active recorder (if any).
+
+    Args:
+        iterable (iterable): The generator to wrap.
+        name (str): The name of the span.
+
+    Returns:
+        iterable: The wrapped generator.
+    """
+    if _active is None:
+        return iterable
+    return _metered(iterable, name, _active)
+
+
+def _metered(iterable, name: str, recorder: Recorder):
+    s = Span(name)
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    stack = _local.stack
+    it = iter(iterable)
+    # Time spent in nested metered generators, to be excluded.
+    nested = [0.0, 0.0]
+    while True:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        stack.append(nested)
+        try:
+            item = next(it)
+        except StopIteration:
+            break
+        finally:
+            stack.pop()
+            d_wall = time.perf_counter() - wall
+            d_cpu = time.thread_time() - cpu
+            s.wall_seconds += d_wall - nested[0]
+            s.cpu_seconds += d_cpu - nested[1]
+            nested[0] = nested[1] = 0.0
+            if stack:
+                stack[-1][0] += d_wall
+                stack[-1][1] += d_cpu
+        s.rows += 1
+        yield item
+    s.peak_rss_bytes = _peak_rss()
+    recorder._add(s)
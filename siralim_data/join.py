@@ -0,0 +1,273 @@
+""" Joining of rows from different datasets by name.
+
+A JoinIndex maps the names of one dataset (e.g. the SUAPI creatures) to their
+rows. Names are looked up in three passes:
+
+1. exact: the names are equal, ignoring case.
+2. normalized: the names are equal after normalize_key, which ignores case,
+   accents, apostrophes, punctuation and the (ASCENSION) suffix.
+3. fuzzy: the most similar name, by the Dice coefficient of the character
+   trigrams of the normalized names, if it is similar enough. Candidates are
+   found through an inverted index of trigrams, so only names sharing at
+   least one trigram with the query are scored.
+
+Keys may be tuples, in which case every element but the last must match
+exactly (e.g. the specialization of a perk) and only the last is normalized
+and fuzzily matched.
+
+Every lookup is recorded in a JoinReport, along with the method and the
+confidence of the match, so that the fuzzy matches can be reviewed.
+"""
+
+import re
+import json
+import unicodedata
+import logging as logger
+from collections import Counter
+from dataclasses import dataclass
+
+NGRAM_SIZE = 3
+DEFAULT_MIN_SCORE = 0.7
+
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'", "´": "'"})
+_SUFFIXES = [" (ascension)"]
+
+
+def normalize_key(name: str):
+    """Normalize the given name for joining.
+
+    Args:
+        name (str): The name.
+
+    Returns:
+        str: The lowercase name, without accents, apostrophes, punctuation
+        or suffixes such as (ASCENSION), and with single spaces between
+        words.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = name.translate(_APOSTROPHES).lower()
+    for suffix in _SUFFIXES:
+        name = name.split(suffix)[0]
+    name = name.replace("'", "")
+    return re.sub(r"[^a-z0-9]+", " ", name).strip()
+
+
+def ngrams(name: str, n: int = NGRAM_SIZE):
+    """Return the set of character n-grams of the given (normalized) name,
+    padded with a space at each end.
+
+    Args:
+        name (str): The name.
+        n (int): The length of each n-gram.
+
+    Returns:
+        set: The n-grams.
+    """
+    padded = f" {name} "
+    return {padded[i : i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+def _split_key(key):
+    if isinstance(key, tuple):
+        return key[:-1], key[-1]
+    return (), key
+
+
+@dataclass
+class Match:
+    """The result of looking up a key in a JoinIndex.
+
+    Args:
+        key: The key that was looked up.
+        matched_key: The key of the row it was matched to.
+        value: The row it was matched to.
+        method (str): "exact", "normalized" or "fuzzy".
+        confidence (float): 1 for exact and normalized matches, and the
+          similarity of the names for fuzzy matches.
+    """
+
+    key: object
+    matched_key: object
+    value: object
+    method: str
+    confidence: float
+
+
+class JoinReport:
+    """A record of the lookups made in a JoinIndex.
+
+    Args:
+        name (str): The name of the join.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = Counter()
+        self.inexact = []
+        self.unmatched = []
+
+    def add(self, key, match: Match = None):
+        """Record the result of a lookup.
+
+        Args:
+            key: The key that was looked up.
+            match (Match): The match, or None if the key was not matched.
+        """
+        if match is None:
+            self.counts["unmatched"] += 1
+            self.unmatched.append(key)
+            return
+        self.counts[match.method] += 1
+        if match.method != "exact":
+            self.inexact.append(match)
+
+    def to_json(self):
+        """Return the report as a JSON-serialisable dict."""
+
+        def key_to_json(key):
+            return list(key) if isinstance(key, tuple) else key
+
+        return {
+            "name": self.name,
+            "counts": dict(self.counts),
+            "inexact": [
+                {
+                    "key": key_to_json(m.key),
+                    "matched_key": key_to_json(m.matched_key),
+                    "method": m.method,
+                    "confidence": round(m.confidence, 3),
+                }
+                for m in sorted(self.inexact, key=lambda m: m.confidence)
+            ],
+            "unmatched": [key_to_json(key) for key in self.unmatched],
+        }
+
+    def log(self):
+        """Log a summary of the report, and each fuzzy match."""
+        for m in self.inexact:
+            if m.method == "fuzzy":
+                logger.warning(
+                    f"[{self.name}] Fuzzily matched {m.key!r} to "
+                    f"{m.matched_key!r} (confidence {m.confidence:.2f})."
+                )
+        logger.info(
+            f"[{self.name}] {self.counts['exact']} exact, "
+            f"{self.counts['normalized']} normalized and "
+            f"{self.counts['fuzzy']} fuzzy matches, "
+            f"{self.counts['unmatched']} unmatched."
+        )
+
+    def save(self, filename: str):
+        """Save the report to the given filename.
+
+        Args:
+            filename (str): The filename.
+        """
+        with open(filename, "w") as f:
+            json.dump(self.to_json(), f, indent=1)
+
+
+class JoinIndex:
+    """Hash indexes over the (normalized) keys of a dataset, with a fuzzy
+    fallback.
+
+    Args:
+        items (iterable): (key, value) pairs. The first value of keys that
+          collide after normalization is kept.
+        name (str): The name of the join, used in the report.
+        min_score (float): The minimum similarity of a fuzzy match.
+    """
+
+    def __init__(
+        self, items, name: str = "join", min_score: float = DEFAULT_MIN_SCORE
+    ):
+        self.min_score = min_score
+        self.report = JoinReport(name)
+        self._exact = {}
+        self._normalized = {}
+        self._ngrams = None
+        for (key, value) in items:
+            (block, row_name) = _split_key(key)
+            self._exact.setdefault((block, row_name.casefold()), (key, value))
+            self._normalized.setdefault(
+                (block, normalize_key(row_name)), (key, value)
+            )
+
+    def __len__(self):
+        return len(self._exact)
+
+    def _build_ngram_index(self):
+        # Only built when the first fuzzy lookup is made, which is never if
+        # every key matches.
+        self._ngrams = {}
+        self._ngram_counts = {}
+        for (block, name) in self._normalized:
+            grams = ngrams(name)
+            self._ngram_counts[(block, name)] = len(grams)
+            for gram in grams:
+                self._ngrams.setdefault((block, gram), []).append(name)
+
+    def _fuzzy(self, block: tuple, name: str):
+        if self._ngrams is None:
+            self._build_ngram_index()
+        grams = ngrams(name)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._ngrams.get((block, gram), ()))
+
+        best = None
+        for (candidate, n) in shared.items():
+            n_candidate = self._ngram_counts[(block, candidate)]
+            score = 2 * n / (len(grams) + n_candidate)
+            if best is None or (score, candidate) > best:
+                best = (score, candidate)
+        if best is None or best[0] < self.min_score:
+            return None
+        return best
+
+    def match(self, key, fuzzy: bool = True, report: bool = True):
+        """Look up the given key, and record the result in the report.
+
+        Args:
+            key: The key (a name, or a tuple whose last element is a name).
+            fuzzy (bool): Whether to fall back to fuzzy matching.
+            report (bool): Whether to record the result in the report (e.g.
+              not for keys that are not expected to match).
+
+        Returns:
+            Match: The match, or None if the key was not matched.
+        """
+        (block, name) = _split_key(key)
+        match = None
+        normalized = normalize_key(name)
+        if (block, name.casefold()) in self._exact:
+            (matched_key, value) = self._exact[(block, name.casefold())]
+            match = Match(key, matched_key, value, "exact", 1.0)
+        elif (block, normalized) in self._normalized:
+            (matched_key, value) = self._normalized[(block, normalized)]
+            match = Match(key, matched_key, value, "normalized", 1.0)
+        elif fuzzy:
+            best = self._fuzzy(block, normalized)
+            if best is not None:
+                (score, candidate) = best
+                (matched_key, value) = self._normalized[(block, candidate)]
+                match = Match(key, matched_key, value, "fuzzy", score)
+        if report:
+            self.report.add(key, match)
+        return match
+
+    def get(self, key, default=None, fuzzy: bool = True, report: bool = True):
+        """Return the value matched to the given key, or the default.
+
+        Args:
+            key: The key.
+            default: The value to return if the key is not matched.
+            fuzzy (bool): Whether to fall back to fuzzy matching.
+            report (bool): Whether to record the result in the report.
+
+        Returns:
+            object: The value.
+        """
+        match = self.match(key, fuzzy, report)
+        return default if match is None else match.value
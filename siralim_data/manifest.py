@@ -0,0 +1,207 @@
+""" Build manifest used to skip stages of the data build whose inputs have
+not changed since the last run.
+
+The manifest is a JSON file stored in the output folder. For each stage it
+records the content hash of every input and output. A stage is considered up
+to date when all of its inputs hash to the same values as last time and all
+of its outputs still exist and are unmodified.
+"""
+
+import os
+import json
+import hashlib
+import logging as logger
+
+MANIFEST_FILENAME = ".build_manifest.json"
+MANIFEST_VERSION = 1
+
+CHUNK_SIZE = 1 << 16
+
+
+def hash_file(filename: str):
+    """Return the sha256 hex digest of the contents of the given file.
+
+    Args:
+        filename (str): The filename to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_folder(folder: str, contents: bool = True):
+    """Return a hash of the given folder. Files are visited in sorted order
+    so that the hash does not depend on the order returned by the OS.
+    Hidden files and __pycache__ folders are ignored.
+
+    Args:
+        folder (str): The folder to hash.
+        contents (bool): Whether to hash the contents of each file. If False,
+          only the (relative) filenames are hashed, which is enough for
+          inputs where only the existence of a file matters.
+
+    Returns:
+        str: The hex digest.
+    """
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(
+            d for d in dirs if not d.startswith(".") and d != "__pycache__"
+        )
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            h.update(os.path.relpath(path, folder).encode("utf-8"))
+            h.update(b"\0")
+            if contents:
+                h.update(hash_file(path).encode("ascii"))
+    return h.hexdigest()
+
+
+class BuildManifest:
+    """The content hashes of the inputs and outputs of each stage of the
+    most recent build to a particular output folder.
+
+    Input hashes are memoised for the lifetime of the manifest, as several
+    stages share the same inputs.
+
+    Args:
+        output_folder (str): The output folder of the build.
+    """
+
+    def __init__(self, output_folder: str):
+        self.filename = os.path.join(output_folder, MANIFEST_FILENAME)
+        self.stages = {}
+        self._hashes = {}
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk. A missing or unreadable manifest is
+        treated as empty, i.e. every stage will be rebuilt.
+        """
+        try:
+            with open(self.filename, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.info("Build manifest is out of date, rebuilding all.")
+            return
+        self.stages = manifest.get("stages", {})
+
+    def save(self):
+        """Write the manifest to disk."""
+        with open(self.filename, "w") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "stages": self.stages},
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+
+    def hash_input(self, path):
+        """Return the (memoised) hash of an input.
+
+        Args:
+            path (str or tuple): The path of the input. A (folder, False)
+              tuple hashes only the names of the files in the folder.
+
+        Returns:
+            str: The hash, or None if the input does not exist.
+        """
+        if path not in self._hashes:
+            self._hashes[path] = _hash_path(path)
+        return self._hashes[path]
+
+    def _input_hashes(self, inputs):
+        return {_input_key(p): self.hash_input(p) for p in inputs}
+
+    def is_up_to_date(
+        self, stage: str, inputs: list, outputs: list, params: dict = None
+    ):
+        """Determine whether the given stage can be skipped.
+
+        Args:
+            stage (str): The name of the stage.
+            inputs (list): The inputs of the stage.
+            outputs (list): The output filenames of the stage.
+            params (dict): The (JSON-serialisable) options the stage was
+              run with, if any.
+
+        Returns:
+            bool: Whether the inputs and outputs are unchanged since the
+            stage was last recorded.
+        """
+        if stage not in self.stages:
+            return False
+        record = self.stages[stage]
+        if record.get("params") != params:
+            return False
+        if record["inputs"] != self._input_hashes(inputs):
+            return False
+        if sorted(record["outputs"]) != sorted(outputs):
+            return False
+        for (filename, h) in record["outputs"].items():
+            if _hash_path(filename) != h:
+                return False
+        return True
+
+    def record(
+        self, stage: str, inputs: list, outputs: list, params: dict = None
+    ):
+        """Record the hashes of the inputs and outputs of a stage that has
+        just been built.
+
+        Args:
+            stage (str): The name of the stage.
+            inputs (list): The inputs of the stage.
+            outputs (list): The output filenames of the stage.
+            params (dict): The (JSON-serialisable) options the stage was
+              run with, if any.
+        """
+        self.stages[stage] = {
+            "inputs": self._input_hashes(inputs),
+            "outputs": {f: _hash_path(f) for f in outputs},
+            "params": params,
+        }
+
+    def forget_hashes(self, paths: list):
+        """Forget the memoised hashes of the given paths, e.g. because they
+        are the outputs of a stage that has just been rebuilt.
+
+        Args:
+            paths (list): The paths to forget.
+        """
+        for path in paths:
+            self._hashes.pop(path, None)
+
+    def invalidate(self, stage: str):
+        """Forget a stage so that it is rebuilt on the next run.
+
+        Args:
+            stage (str): The name of the stage.
+        """
+        self.stages.pop(stage, None)
+
+
+def _input_key(path):
+    if isinstance(path, tuple):
+        return "%s (names only)" % path[0]
+    return path
+
+
+def _hash_path(path):
+    contents = True
+    if isinstance(path, tuple):
+        path, contents = path
+    if os.path.isdir(path):
+        return hash_folder(path, contents=contents)
+    if os.path.isfile(path):
+        return hash_file(path)
+    return None
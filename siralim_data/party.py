@@ -0,0 +1,518 @@
+""" Parsing and validation of the build strings exported by Siralim Ultimate.
+
+This is a port of src/functions/parsePartyString.js and
+src/functions/getTraitErrors.js, along with the lookups done by
+uploadPartyFromString in src/SiralimPlanner.js, so that build strings can be
+validated against the data produced by build_data.py without the app.
+
+Build strings can also be validated in bulk, e.g.
+
+    python -m siralim_data.party builds.jsonl -o diagnostics.jsonl -j 4
+
+where each line of builds.jsonl is either a JSON string (the build string) or
+an object with a "build" key and an optional "id". One line of diagnostics is
+written per build, in the same order.
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import logging as logger
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+CREATURES_HEADER = "========== CREATURES =========="
+CREATURE_SEPARATOR = "------------------------------"
+INNATE_TEXT = "Innate Trait: "
+FUSED_TEXT = "Fused Trait: "
+TRAIT_SLOT_TEXT = "Trait Slot: "
+RELIC_TEXT = "Relic: "
+SPELLS_TEXT = "Spell Gems:"
+
+MAX_CREATURES = 6
+MAX_ANOINTMENTS = 5
+MAX_ROYAL_ANOINTMENTS = 15
+NON_CREATURE_CLASSES = [
+    "Rodian Master",
+    "Nether Boss",
+    "Backer",
+    "Pandemonium",
+]
+NO_MATERIAL = ["N/A", "No Material Exists"]
+TRAIT_NOT_FOUND = "<not found>"
+
+DEFAULT_CHUNK_SIZE = 64
+
+
+class PartyStringError(ValueError):
+    """Raised when a build string cannot be parsed."""
+
+
+def parse_character_section(text: str):
+    """Parse the character section of a build string.
+
+    Args:
+        text (str): The character section of the build string.
+
+    Raises:
+        PartyStringError: If there are duplicate or too many anointments.
+
+    Returns:
+        str, list: The specialization and the names of the anointments.
+    """
+    spec = ""
+    anointment_names = []
+
+    for line in text.split("\n"):
+        if "the " in line and not spec:
+            spec = line.split("the ")[1]
+            if " (" in spec:
+                spec = spec.split(" (")[0]  # Remove (Ascended)
+        elif "Anointments: " in line:
+            anointment_names = line.split("Anointments: ")[1].split(", ")
+
+    if len(set(anointment_names)) != len(anointment_names):
+        raise PartyStringError("Duplicate anointment.")
+    if len(anointment_names) > MAX_ROYAL_ANOINTMENTS:
+        raise PartyStringError("Too many anointments.")
+    if spec != "Royal" and len(anointment_names) > MAX_ANOINTMENTS:
+        raise PartyStringError("Too many anointments.")
+
+    return spec, anointment_names
+
+
+def parse_creature_section(text: str):
+    """Parse the creature section of a build string.
+
+    Args:
+        text (str): The creature section of the build string.
+
+    Raises:
+        PartyStringError: If there are more than 6 creatures, a creature has
+          more than one trait of a type or more than one relic, or there are
+          no traits at all.
+
+    Returns:
+        list, list, list: The 18 trait names (3 per creature, None for empty
+        slots), the 6 relic names and the spell names of each creature.
+    """
+    creatures = text.split(CREATURE_SEPARATOR)
+    if len(creatures) > MAX_CREATURES + 1:
+        raise PartyStringError("Party appears to have more than 6 creatures.")
+
+    traits = []
+    relics = []
+    spells = []
+    for i in range(MAX_CREATURES):
+        if i >= len(creatures) or not creatures[i]:
+            traits += [None, None, None]
+            relics.append(None)
+            spells.append(None)
+            continue
+
+        innate = fused = artifact = relic = None
+        spell = []
+        checking_spells = True
+
+        def check_unique(value, what):
+            if value:
+                raise PartyStringError(
+                    f"Creature #{i + 1} has more than one {what}."
+                )
+
+        for line in creatures[i].split("\n"):
+            if line.startswith(INNATE_TEXT):
+                check_unique(innate, "primary trait")
+                innate = line[len(INNATE_TEXT) :]
+            elif line.startswith(FUSED_TEXT):
+                check_unique(fused, "secondary trait")
+                fused = line[len(FUSED_TEXT) :]
+            elif line.startswith(TRAIT_SLOT_TEXT):
+                check_unique(artifact, "artifact trait")
+                artifact = line[len(TRAIT_SLOT_TEXT) :].split(":")[0]
+            elif line.startswith(RELIC_TEXT):
+                check_unique(relic, "relic")
+                relic = line[len(RELIC_TEXT) :].split(" (Rank")[0]
+            elif line.startswith(SPELLS_TEXT):
+                checking_spells = True
+            elif checking_spells:
+                if line == "":
+                    checking_spells = False
+                    continue
+                spell.append(line)
+
+        traits += [innate, fused, artifact]
+        relics.append(relic)
+        spells.append(spell)
+
+    if not any(traits):
+        raise PartyStringError(
+            "The party string does not appear to contain any traits."
+        )
+
+    return traits, relics, spells
+
+
+def parse_party_string(text: str):
+    """Parse a build string exported by Siralim Ultimate.
+
+    Args:
+        text (str): The build string.
+
+    Raises:
+        PartyStringError: If the build string is invalid.
+
+    Returns:
+        dict: The trait names ("traits"), relic names ("relics"), the
+        specialization name ("spec"), anointment names ("anointment_names")
+        and spell names of each creature ("raw_spells").
+    """
+    if CREATURES_HEADER not in text:
+        raise PartyStringError(
+            "The string does not appear to be a valid Siralim Ultimate build "
+            "string."
+        )
+    sections = text.split(CREATURES_HEADER)
+    spec, anointment_names = parse_character_section(sections[0])
+    traits, relics, spells = parse_creature_section(sections[1])
+    return {
+        "traits": traits,
+        "relics": relics,
+        "spec": spec,
+        "anointment_names": anointment_names,
+        "raw_spells": spells,
+    }
+
+
+def get_trait_errors(trait: dict, slot: int):
+    """Check whether the given trait can be placed in the given slot of a
+    creature.
+
+    Args:
+        trait (dict): The trait (from data.json), or None for an empty slot.
+        slot (int): The trait slot (0: innate, 1: fused, 2: artifact).
+
+    Returns:
+        str: The error message, or None if there is no error.
+    """
+    if not trait:
+        return None
+    if slot != 2 and trait["class"] in NON_CREATURE_CLASSES:
+        return (
+            "This trait cannot be found on a playable creature and cannot be "
+            "placed in a creature slot."
+        )
+    if slot == 2 and trait.get("material_name") in NO_MATERIAL:
+        return (
+            "This trait has no material and cannot be placed in the trait "
+            "slot."
+        )
+    return None
+
+
+class PartyValidator:
+    """Validates build strings against the data built by build_data.py.
+
+    Args:
+        traits (list): The traits data (data.json).
+        specializations (list): The specializations data
+          (specializations.json).
+        relics (list): The relics data (relics.json).
+        spells (list): The spells data (spells.json).
+    """
+
+    def __init__(self, traits, specializations, relics, spells):
+        self.traits = {}
+        for trait in traits:
+            self.traits[trait["trait_name"].lower()] = trait
+        self.specializations = {s["name"]: s for s in specializations}
+        self.anointments = {}
+        for spec in specializations:
+            for perk in spec["perks"]:
+                if perk["anointment"] != "No":
+                    self.anointments[perk["name"]] = perk
+        self.relics = {}
+        for relic in relics:
+            self.relics.setdefault(relic["name"], relic)
+        self.spells = {}
+        for spell in spells:
+            self.spells.setdefault(spell["name"], spell)
+
+    @classmethod
+    def from_folder(cls, folder: str):
+        """Load the validator from the output folder of build_data.py.
+
+        Args:
+            folder (str): The folder containing data.json,
+              specializations.json, relics.json and spells.json.
+
+        Returns:
+            PartyValidator: The validator.
+        """
+
+        def load(filename):
+            with open(os.path.join(folder, filename)) as f:
+                return json.load(f)
+
+        return cls(
+            load("data.json"),
+            load("specializations.json"),
+            load("relics.json"),
+            load("spells.json"),
+        )
+
+    def validate(self, text: str):
+        """Parse and validate the given build string.
+
+        Errors are problems that stop the app from loading the build, or that
+        make the build illegal. Warnings are problems that the app loads
+        the build in spite of, e.g. an anointment that no longer exists.
+
+        Args:
+            text (str): The build string.
+
+        Returns:
+            dict: The diagnostics, i.e. whether the build is valid ("valid"),
+            the "errors" and "warnings", and the uids of the traits
+            ("traits", where unknown traits are "<not found>"), the
+            specialization, the anointments, relics and spells.
+        """
+        errors = []
+        warnings = []
+        try:
+            party = parse_party_string(text)
+        except PartyStringError as e:
+            return {"valid": False, "errors": [str(e)], "warnings": []}
+
+        trait_uids = []
+        for (i, name) in enumerate(party["traits"]):
+            if name is None:
+                trait_uids.append(None)
+                continue
+            trait = self.traits.get(name.lower())
+            (creature, slot) = divmod(i, 3)
+            if trait is None:
+                trait_uids.append(TRAIT_NOT_FOUND)
+                warnings.append(
+                    f"Creature #{creature + 1}: trait '{name}' does not exist "
+                    "or has changed."
+                )
+                continue
+            trait_uids.append(trait["uid"])
+            error = get_trait_errors(trait, slot)
+            if error is not None:
+                errors.append(f"Creature #{creature + 1}: {name}: {error}")
+
+        spell_uids = []
+        for creature_spells in party["raw_spells"]:
+            uids = []
+            for name in creature_spells or []:
+                spell = self.spells.get(name)
+                if spell is None:
+                    errors.append(f"Spell '{name}' was not found.")
+                uids.append(spell["uid"] if spell else None)
+            spell_uids.append(uids)
+
+        spec = self.specializations.get(party["spec"])
+        if spec is None:
+            errors.append(f"Specialization '{party['spec']}' was not found.")
+
+        anointment_uids = []
+        for name in party["anointment_names"]:
+            if name in self.anointments:
+                anointment_uids.append(self.anointments[name]["uid"])
+            else:
+                warnings.append(f"Anointment '{name}' was not found.")
+
+        relic_uids = []
+        for name in party["relics"]:
+            relic = self.relics.get(name) if name is not None else None
+            if name is not None and relic is None:
+                warnings.append(f"Relic '{name}' was not found.")
+            relic_uids.append(relic["uid"] if relic else None)
+
+        return {
+            "valid": not errors,
+            "errors": errors,
+            "warnings": warnings,
+            "traits": trait_uids,
+            "specialization": spec["abbreviation"] if spec else None,
+            "anointments": anointment_uids,
+            "relics": relic_uids,
+            "spells": spell_uids,
+        }
+
+
+_worker_validator = None
+
+
+def _init_worker(data_folder: str):
+    global _worker_validator
+    _worker_validator = PartyValidator.from_folder(data_folder)
+
+
+def _validate_chunk(texts: list):
+    return [_worker_validator.validate(text) for text in texts]
+
+
+def _chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_batch(
+    texts,
+    data_folder: str,
+    jobs: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """Validate many build strings, on a process pool if jobs > 1. The build
+    strings are consumed lazily, with at most a few chunks in flight per
+    process, so the input can be streamed from a file of any size.
+
+    Args:
+        texts (iterable): The build strings.
+        data_folder (str): The output folder of build_data.py.
+        jobs (int): The number of processes to use.
+        chunk_size (int): The number of build strings sent to a process at a
+          time.
+
+    Yields:
+        dict: The diagnostics of each build string (see
+        PartyValidator.validate), in order.
+    """
+    if jobs <= 1:
+        validator = PartyValidator.from_folder(data_folder)
+        for text in texts:
+            yield validator.validate(text)
+        return
+
+    with ProcessPoolExecutor(
+        jobs, initializer=_init_worker, initargs=(data_folder,)
+    ) as executor:
+        pending = deque()
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(executor.submit(_validate_chunk, chunk))
+            if len(pending) >= jobs * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_builds(f):
+    """Read the builds of a JSON Lines file.
+
+    Args:
+        f (file): The file. Each line is either a JSON string (the build
+          string) or an object with a "build" key and an optional "id".
+
+    Yields:
+        (object, str): The id (the line number if not given) and build string
+        of each build.
+    """
+    for (n, line) in enumerate(f, 1):
+        if not line.strip():
+            continue
+        build = json.loads(line)
+        if isinstance(build, str):
+            yield n, build
+        else:
+            yield build.get("id", n), build["build"]
+
+
+def validate_file(
+    input_filename: str,
+    output_filename: str,
+    data_folder: str,
+    jobs: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """Validate the builds of a JSON Lines file (see read_builds), writing
+    the diagnostics of each build to another JSON Lines file.
+
+    Args:
+        input_filename (str): The filename of the builds.
+        output_filename (str): The filename to write the diagnostics to, or
+          "-" for stdout.
+        data_folder (str): The output folder of build_data.py.
+        jobs (int): The number of processes to use.
+        chunk_size (int): The number of builds sent to a process at a time.
+
+    Returns:
+        dict: The number of builds, and of valid builds.
+    """
+    counts = {"builds": 0, "valid": 0}
+    with open(input_filename) as f_in:
+        ids = deque()
+
+        def texts():
+            for (build_id, text) in read_builds(f_in):
+                ids.append(build_id)
+                yield text
+
+        if output_filename == "-":
+            f_out = sys.stdout
+        else:
+            f_out = open(output_filename, "w")
+        try:
+            for diagnostics in validate_batch(
+                texts(), data_folder, jobs, chunk_size
+            ):
+                obj = {"id": ids.popleft()}
+                obj.update(diagnostics)
+                f_out.write(json.dumps(obj) + "\n")
+                counts["builds"] += 1
+                counts["valid"] += diagnostics["valid"]
+        finally:
+            if f_out is not sys.stdout:
+                f_out.close()
+
+    logger.info(f"{counts['valid']} of {counts['builds']} builds are valid.")
+    return counts
+
+
+def main(args=None):
+    """Validate a file of build strings from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("builds", help="The JSON Lines file of builds.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="The JSON Lines file to write the diagnostics to (default: "
+        "stdout).",
+    )
+    parser.add_argument(
+        "--data",
+        default=os.path.join("src", "data"),
+        help="The output folder of build_data.py.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of processes to use.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="The number of builds sent to a process at a time.",
+    )
+    args = parser.parse_args(args)
+    counts = validate_file(
+        args.builds, args.output, args.data, args.jobs, args.chunk_size
+    )
+    return 0 if counts["valid"] == counts["builds"] else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    logger.basicConfig(format="%(levelname)s: %(message)s", level=logger.INFO)
+    sys.exit(main())
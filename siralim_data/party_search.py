@@ -0,0 +1,692 @@
+""" Search for parties of creatures that satisfy a set of constraints.
+
+The innate trait of a creature determines its class, family and stats, so a
+party is chosen as 6 innate traits, and the score of a party is the sum of a
+weighted combination of the stats of its creatures (the "total" stat by
+default). Required traits that are not innate to a creature of the party are
+placed in the fused and artifact slots, following the rules of
+get_trait_errors: only traits of playable creatures can be fused, and only
+traits with a material can be placed in the artifact slot.
+
+Parties are enumerated as combinations of the candidates (the creatures with
+stats) by a depth-first branch-and-bound search, best candidates first:
+
+- candidates dominated by enough better candidates of their class cannot be
+  in a top-k party, and are dropped up front;
+- the best possible score of a partial party is bounded using the best
+  scores (and relaxed scores, which account for the minimum stats) of the
+  remaining candidates, so once that cannot beat the worst of the top-k
+  parties found so far, no later candidate can either;
+- partial parties that can no longer reach a minimum stat, or fill the
+  minimum number of creatures of a class, are pruned.
+
+The search can be split across a process pool by the first candidate of
+the party, and stops when the time budget runs out, returning the best
+parties found so far. For example:
+
+    python -m siralim_data.party_search --require "Flesh Rot" \
+        --class-count Chaos=2:6 --min-stat attack=150 -k 5 -j 4
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import argparse
+import logging as logger
+from operator import add, mul, sub
+from concurrent.futures import ProcessPoolExecutor
+
+from siralim_data.party import (
+    MAX_CREATURES,
+    NO_MATERIAL,
+    NON_CREATURE_CLASSES,
+)
+
+STAT_NAMES = ["health", "attack", "intelligence", "defense", "speed", "total"]
+DEFAULT_WEIGHTS = {"total": 1}
+DEFAULT_TOP_K = 10
+# The number of nodes visited between checks of the time budget.
+CHECK_INTERVAL = 1024
+# The multipliers tried for the minimum stats in the relaxed bound.
+MULTIPLIERS = [0, 0.125, 0.25, 0.5, 1, 2, 4]
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def can_fuse(trait: dict):
+    """Whether a trait can be placed in the fused slot of a creature (see
+    get_trait_errors).
+    """
+    return trait["class"] not in NON_CREATURE_CLASSES
+
+
+def has_material(trait: dict):
+    """Whether a trait can be placed in the artifact slot of a creature (see
+    get_trait_errors).
+    """
+    return trait.get("material_name") not in NO_MATERIAL
+
+
+def _parse_range(value):
+    if isinstance(value, int):
+        return (value, value)
+    (low, high) = value
+    return (low, high)
+
+
+class PartySearch:
+    """A search for the top-k parties satisfying a set of constraints, with
+    the indexes used to prune the search precomputed.
+
+    Args:
+        traits (list): The traits data (data.json).
+        k (int): The number of parties to find.
+        required (list): The names or uids of the traits the party must
+          have, in any slot they can be placed in.
+        innate (list): The names or uids of the innate traits of the
+          creatures the party must have.
+        class_counts (dict): Map of class -> the number of creatures of that
+          class, either exact or a (min, max) range. Other classes are
+          unrestricted.
+        families (list): If given, only creatures of these families are
+          considered (required traits may still come from any family).
+        min_stats (dict): Map of stat -> the minimum sum of that stat over
+          the party.
+        weights (dict): Map of stat -> weight. The score of a creature is
+          the weighted sum of its stats.
+
+    Raises:
+        ValueError: If a trait or stat is unknown, the required traits or
+          creatures cannot all be placed in a party, or the required
+          creatures exceed the maximum count of a class.
+    """
+
+    def __init__(
+        self,
+        traits: list,
+        k: int = DEFAULT_TOP_K,
+        required: list = None,
+        innate: list = None,
+        class_counts: dict = None,
+        families: list = None,
+        min_stats: dict = None,
+        weights: dict = None,
+    ):
+        self.k = k
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.min_stats = dict(min_stats or {})
+        for stat in list(self.weights) + list(self.min_stats):
+            if stat not in STAT_NAMES:
+                raise ValueError(f"Unknown stat '{stat}'.")
+        class_counts = {
+            c: _parse_range(v) for (c, v) in (class_counts or {}).items()
+        }
+
+        by_uid = {t["uid"]: t for t in traits}
+        by_name = {t["trait_name"].lower(): t for t in traits}
+
+        def find(key):
+            trait = by_uid.get(key) or by_name.get(key.lower())
+            if trait is None:
+                raise ValueError(f"Unknown trait '{key}'.")
+            return trait
+
+        self.required = []
+        for trait in map(find, required or []):
+            if not can_fuse(trait) and not has_material(trait):
+                raise ValueError(
+                    f"'{trait['trait_name']}' cannot be placed in any slot."
+                )
+            if trait not in self.required:
+                self.required.append(trait)
+        fused_only = [t for t in self.required if not has_material(t)]
+        artifact_only = [t for t in self.required if not can_fuse(t)]
+        if (
+            len(fused_only) > MAX_CREATURES
+            or len(artifact_only) > MAX_CREATURES
+            or len(self.required) > 2 * MAX_CREATURES
+        ):
+            raise ValueError("The required traits do not fit in a party.")
+
+        self.forced = []
+        for trait in map(find, innate or []):
+            if not (trait.get("stats") and can_fuse(trait)):
+                raise ValueError(
+                    f"'{trait['trait_name']}' is not the trait of a creature."
+                )
+            if trait not in self.forced:
+                self.forced.append(trait)
+        if len(self.forced) > MAX_CREATURES:
+            raise ValueError("Too many creatures are required.")
+
+        forced_uids = {t["uid"] for t in self.forced}
+        candidates = [
+            t
+            for t in traits
+            if t.get("stats")
+            and can_fuse(t)
+            and (families is None or t["family"] in families)
+            and t["uid"] not in forced_uids
+        ]
+        self.lows = tuple(self.min_stats.values())
+        self.multipliers = self._relax(candidates)
+        # Candidates are searched best first, by their relaxed score (see
+        # _relax).
+        candidates.sort(
+            key=lambda t: (
+                -self.relaxed_of(t),
+                -self.score_of(t),
+                tuple(-v for v in self._stats_of(t)),
+                t["uid"],
+            )
+        )
+        self.candidates = self._undominated(candidates)
+        self._build_indexes(class_counts)
+        for (c, i) in self.class_ids.items():
+            if self.base_counts[i] > self.class_max[i]:
+                raise ValueError(
+                    f"More than {self.class_max[i]} of the required "
+                    f"creatures are of class '{c}'."
+                )
+
+    def score_of(self, trait: dict):
+        """Return the score of a creature, by its innate trait."""
+        stats = trait["stats"]
+        return sum(w * (stats.get(s) or 0) for (s, w) in self.weights.items())
+
+    def relaxed_of(self, trait: dict, multipliers: tuple = None):
+        """Return the relaxed score of a creature (see _relax)."""
+        if multipliers is None:
+            multipliers = self.multipliers
+        stats = self._stats_of(trait)
+        return self.score_of(trait) + sum(map(mul, multipliers, stats))
+
+    def _stats_of(self, trait: dict):
+        return tuple(trait["stats"].get(s) or 0 for s in self.min_stats)
+
+    def _undominated(self, candidates: list):
+        """Drop the candidates that cannot be in a top-k party.
+
+        A candidate is dominated by an earlier candidate of the same class
+        with at least its score and minimum stats. If a
+        party has a candidate with k + MAX_CREATURES - 1 such dominators, at
+        least k of them are not in the party, and swapping the candidate for
+        each of them gives k distinct parties that satisfy the constraints
+        and rank before it.
+        """
+        limit = self.k + MAX_CREATURES - 1
+        kept = []
+        by_class = {}
+        for t in candidates:
+            stats = (self.score_of(t),) + self._stats_of(t)
+            previous = by_class.setdefault(t["class"], [])
+            dominators = 0
+            for other in previous:
+                if all(a >= b for (a, b) in zip(other, stats)):
+                    dominators += 1
+                    if dominators >= limit:
+                        break
+            if dominators < limit:
+                kept.append(t)
+            previous.append(stats)
+        return kept
+
+    def _build_indexes(self, class_counts: dict):
+        n = len(self.candidates)
+        self.scores = [self.score_of(t) for t in self.candidates]
+        self.stats = [self._stats_of(t) for t in self.candidates]
+
+        # Classes are numbered, so that the counts of a party are a list.
+        names = sorted({t["class"] for t in self.candidates + self.forced})
+        names += sorted(set(class_counts) - set(names))
+        self.class_ids = {c: i for (i, c) in enumerate(names)}
+        self.classes = [self.class_ids[t["class"]] for t in self.candidates]
+        self.class_min = [class_counts.get(c, (0, 0))[0] for c in names]
+        self.class_max = [
+            class_counts.get(c, (0, MAX_CREATURES))[1] for c in names
+        ]
+
+        # best_scores[i][j] = the best scores of j + 1 candidates from i
+        # onwards, summed, and likewise for the relaxed scores.
+        self.best_scores = self._suffix_best(self.scores)
+        self.best_relaxed = self._suffix_best(
+            [self.relaxed_of(t) for t in self.candidates]
+        )
+
+        # best_stats[i][j] = the best j + 1 values of each minimum stat from
+        # candidate i onwards, summed.
+        columns = [
+            self._suffix_best([stats[s] for stats in self.stats])
+            for s in range(len(self.lows))
+        ]
+        self.best_stats = [
+            [
+                tuple(best[i][j] for best in columns)
+                for j in range(MAX_CREATURES)
+            ]
+            for i in range(n + 1)
+        ]
+
+        # remaining[c][i] = the number of candidates of class c from
+        # candidate i onwards, for the classes with a minimum count.
+        self.remaining = {}
+        for (c, low) in enumerate(self.class_min):
+            if low > 0:
+                counts = [0] * (n + 1)
+                for i in range(n - 1, -1, -1):
+                    counts[i] = counts[i + 1] + (self.classes[i] == c)
+                self.remaining[c] = counts
+
+        self.base_score = sum(self.score_of(t) for t in self.forced)
+        self.base_stats = tuple(
+            sum(values) for values in zip(*map(self._stats_of, self.forced))
+        ) or tuple(0 for _ in self.lows)
+        self.base_counts = [0] * len(names)
+        for t in self.forced:
+            self.base_counts[self.class_ids[t["class"]]] += 1
+
+    def _suffix_best(self, values: list):
+        """Return best[i][j] = the sum of the best j + 1 values from i
+        onwards.
+        """
+        n = len(values)
+        best = [[0] * MAX_CREATURES for _ in range(n + 1)]
+        top = []
+        for i in range(n - 1, -1, -1):
+            if len(top) < MAX_CREATURES:
+                top = sorted(top + [values[i]], reverse=True)
+            elif values[i] > top[-1]:
+                top = sorted(top[:-1] + [values[i]], reverse=True)
+            total = 0
+            for (j, value) in enumerate(top):
+                total += value
+                best[i][j] = total
+            for j in range(len(top), MAX_CREATURES):
+                best[i][j] = total
+        return best
+
+    def _relax(self, candidates: list):
+        """Choose the multipliers of the relaxed score of the creatures.
+
+        The score of a party that satisfies the minimum stats is at most its
+        score plus sum(multiplier * (stat - min)) over the minimum stats, for
+        any multipliers >= 0, i.e. the sum of the relaxed scores (score +
+        sum(multiplier * stat)) of its creatures, minus sum(multiplier *
+        min). Unlike the scores, the relaxed scores account for the
+        creatures the minimum stats force into the party. The multipliers
+        are chosen one stat at a time, to minimize the bound of the whole
+        search.
+
+        Args:
+            candidates (list): The candidates.
+
+        Returns:
+            tuple: The multiplier of each minimum stat.
+        """
+
+        def root_bound(multipliers):
+            values = sorted(
+                (self.relaxed_of(t, multipliers) for t in candidates),
+                reverse=True,
+            )
+            return sum(values[:MAX_CREATURES]) - sum(
+                map(mul, multipliers, self.lows)
+            )
+
+        multipliers = [0] * len(self.lows)
+        if candidates:
+            for _ in range(2):
+                for s in range(len(multipliers)):
+                    bounds = {}
+                    for m in MULTIPLIERS:
+                        multipliers[s] = m
+                        bounds[m] = root_bound(tuple(multipliers))
+                    multipliers[s] = min(MULTIPLIERS, key=bounds.get)
+        return tuple(multipliers)
+
+    def _feasible(self, i: int, slots: int, counts: list, stats: tuple):
+        """Whether a party with the given class counts and stats, with the
+        given number of slots left to fill with candidates from i onwards,
+        can satisfy the minimum class counts and stats.
+        """
+        needed = 0
+        for (c, remaining) in self.remaining.items():
+            missing = self.class_min[c] - counts[c]
+            if missing > 0:
+                if remaining[i] < missing:
+                    return False
+                needed += missing
+        if needed > slots:
+            return False
+        if self.lows:
+            best = self.best_stats[i][slots - 1] if slots else self.lows
+            for (value, extra, low) in zip(stats, best, self.lows):
+                if value + (extra if slots else 0) < low:
+                    return False
+        return True
+
+    def search(self, time_budget: float = None, part: int = 0, parts: int = 1):
+        """Find the top-k parties.
+
+        Args:
+            time_budget (float): If given, stop after this many seconds,
+              returning the best parties found so far.
+            part (int): The part of the search space to search. Only the
+              parties whose first candidate i has i % parts == part are
+              searched.
+            parts (int): The number of parts the search space is split in.
+
+        Returns:
+            dict: The "parties" (see party), best first, whether the search
+            was "complete" (i.e. did not run out of time), and the number of
+            "nodes" visited.
+        """
+        deadline = None
+        if time_budget is not None:
+            deadline = time.monotonic() + time_budget
+        k = self.k
+        # Min-heap of (score, negated indexes), so the worst party (lowest
+        # score, then latest indexes) is at the top.
+        heap = []
+        nodes = 0
+        n = len(self.candidates)
+        (scores, classes) = (self.scores, self.classes)
+        (stats_of, class_max) = (self.stats, self.class_max)
+        (multipliers, lows) = (self.multipliers, self.lows)
+        (best_scores, best_relaxed) = (self.best_scores, self.best_relaxed)
+
+        def visit(start, chosen, score, counts, stats):
+            nonlocal nodes
+            nodes += 1
+            if deadline is not None and nodes % CHECK_INTERVAL == 0:
+                if time.monotonic() > deadline:
+                    raise _OutOfTime()
+
+            slots = MAX_CREATURES - len(self.forced) - len(chosen)
+            offset = score + sum(
+                map(mul, multipliers, map(sub, stats, lows))
+            )
+            if slots == 0:
+                key = (score, tuple(-i for i in chosen))
+                if len(heap) < k:
+                    heapq.heappush(heap, key)
+                elif key > heap[0]:
+                    heapq.heapreplace(heap, key)
+                return
+
+            for i in range(start, n - slots + 1):
+                if not chosen and i % parts != part:
+                    continue
+                if len(heap) == k:
+                    # Both bounds only decrease with i, so no later
+                    # candidate can do better.
+                    threshold = heap[0][0]
+                    if score + best_scores[i][slots - 1] < threshold:
+                        break
+                    if offset + best_relaxed[i][slots - 1] < threshold:
+                        break
+                c = classes[i]
+                if counts[c] >= class_max[c]:
+                    continue
+                next_counts = counts.copy()
+                next_counts[c] += 1
+                next_stats = tuple(map(add, stats, stats_of[i]))
+                if self._feasible(i + 1, slots - 1, next_counts, next_stats):
+                    visit(
+                        i + 1,
+                        chosen + [i],
+                        score + scores[i],
+                        next_counts,
+                        next_stats,
+                    )
+
+        complete = True
+        slots = MAX_CREATURES - len(self.forced)
+        if self._feasible(0, slots, self.base_counts, self.base_stats):
+            try:
+                visit(
+                    0, [], self.base_score, self.base_counts, self.base_stats
+                )
+            except _OutOfTime:
+                complete = False
+
+        ranked = sorted(heap, reverse=True)
+        return {
+            "parties": [
+                self.party([-i for i in indexes], score)
+                for (score, indexes) in ranked
+            ],
+            "complete": complete,
+            "nodes": nodes,
+        }
+
+    def party(self, indexes: list, score):
+        """Return a party, placing the required traits that are not innate
+        to one of its creatures in the fused and artifact slots.
+
+        Args:
+            indexes (list): The indexes of the (non-forced) candidates.
+            score: The score of the party.
+
+        Returns:
+            dict: The "score", the summed "stats" of the creatures, and the
+            "creatures", each with the uids of its "innate", "fused" and
+            "artifact" traits (None if free).
+        """
+        innate = self.forced + [self.candidates[i] for i in indexes]
+        innate_uids = {t["uid"] for t in innate}
+        creatures = [
+            {"innate": t["uid"], "fused": None, "artifact": None}
+            for t in innate
+        ]
+
+        placed = [t for t in self.required if t["uid"] not in innate_uids]
+        # Place the traits with only one possible slot first.
+        placed.sort(key=lambda t: (can_fuse(t) and has_material(t)))
+        # The creatures with a free fused and artifact slot.
+        fused = list(creatures)
+        artifact = list(creatures)
+        for t in placed:
+            if can_fuse(t) and (fused or not has_material(t)):
+                fused.pop(0)["fused"] = t["uid"]
+            else:
+                artifact.pop(0)["artifact"] = t["uid"]
+
+        return {
+            "score": score,
+            "stats": {
+                s: sum(t["stats"].get(s) or 0 for t in innate)
+                for s in STAT_NAMES
+            },
+            "creatures": creatures,
+        }
+
+
+_worker_search = None
+
+
+def _init_worker(search: PartySearch):
+    global _worker_search
+    _worker_search = search
+
+
+def _search_part(time_budget: float, part: int, parts: int):
+    return _worker_search.search(time_budget, part, parts)
+
+
+def search_parties(
+    traits: list,
+    k: int = DEFAULT_TOP_K,
+    time_budget: float = None,
+    jobs: int = 1,
+    **constraints,
+):
+    """Find the top-k parties satisfying the given constraints, on a process
+    pool if jobs > 1.
+
+    Args:
+        traits (list): The traits data (data.json).
+        k (int): The number of parties to return.
+        time_budget (float): If given, stop after this many seconds,
+          returning the best parties found so far.
+        jobs (int): The number of processes to split the search across.
+        **constraints: The constraints (see PartySearch).
+
+    Raises:
+        ValueError: If the constraints are invalid.
+
+    Returns:
+        dict: The "parties", best first, whether the search was "complete"
+        and the number of "nodes" visited (see PartySearch.search).
+    """
+    search = PartySearch(traits, k, **constraints)
+    if jobs <= 1:
+        return search.search(time_budget)
+
+    with ProcessPoolExecutor(
+        jobs, initializer=_init_worker, initargs=(search,)
+    ) as executor:
+        results = list(
+            executor.map(
+                _search_part,
+                [time_budget] * jobs,
+                range(jobs),
+                [jobs] * jobs,
+            )
+        )
+
+    order = {t["uid"]: i for (i, t) in enumerate(search.candidates)}
+
+    def rank(party):
+        indexes = [order.get(c["innate"], -1) for c in party["creatures"]]
+        return (-party["score"], indexes)
+
+    parties = sorted(
+        (p for result in results for p in result["parties"]), key=rank
+    )
+    return {
+        "parties": parties[:k],
+        "complete": all(result["complete"] for result in results),
+        "nodes": sum(result["nodes"] for result in results),
+    }
+
+
+def _key_value(text: str, parse):
+    (key, sep, value) = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got '{text}'.")
+    try:
+        return key, parse(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid value '{text}'.") from None
+
+
+def _count_range(value: str):
+    (low, sep, high) = value.partition(":")
+    return (int(low), int(high)) if sep else int(low)
+
+
+def main(args=None):
+    """Search for parties from the command line, printing them as JSON."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--data",
+        default=os.path.join("src", "data"),
+        help="The output folder of build_data.py.",
+    )
+    parser.add_argument(
+        "-r",
+        "--require",
+        action="append",
+        default=[],
+        help="The name or uid of a trait the party must have.",
+    )
+    parser.add_argument(
+        "--innate",
+        action="append",
+        default=[],
+        help="The name or uid of the innate trait of a creature the party "
+        "must have.",
+    )
+    parser.add_argument(
+        "--class-count",
+        action="append",
+        default=[],
+        type=lambda v: _key_value(v, _count_range),
+        metavar="CLASS=N[:M]",
+        help="The number of creatures of a class (exactly N, or N to M).",
+    )
+    parser.add_argument(
+        "--family",
+        action="append",
+        help="Only consider creatures of this family.",
+    )
+    parser.add_argument(
+        "--min-stat",
+        action="append",
+        default=[],
+        type=lambda v: _key_value(v, int),
+        metavar="STAT=N",
+        help="The minimum sum of a stat over the party.",
+    )
+    parser.add_argument(
+        "--weight",
+        action="append",
+        type=lambda v: _key_value(v, float),
+        metavar="STAT=W",
+        help="The weight of a stat in the score (default: total=1).",
+    )
+    parser.add_argument(
+        "-k",
+        type=int,
+        default=DEFAULT_TOP_K,
+        help="The number of parties to return.",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="The maximum time to search for, in seconds.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of processes to use.",
+    )
+    args = parser.parse_args(args)
+
+    with open(os.path.join(args.data, "data.json"), "r") as f:
+        traits = json.load(f)
+    try:
+        result = search_parties(
+            traits,
+            k=args.k,
+            time_budget=args.time_budget,
+            jobs=args.jobs,
+            required=args.require,
+            innate=args.innate,
+            class_counts=dict(args.class_count),
+            families=args.family,
+            min_stats=dict(args.min_stat),
+            weights=dict(args.weight) if args.weight else None,
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+    if not result["complete"]:
+        logger.warning("Ran out of time, the parties may not be the best.")
+    json.dump(result, sys.stdout, indent=1)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    logger.basicConfig(format="%(levelname)s: %(message)s", level=logger.INFO)
+    sys.exit(main())
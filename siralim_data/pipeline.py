@@ -0,0 +1,210 @@
+""" A small scheduler for the stages of the data build.
+
+Each stage declares its inputs, outputs and the stages it depends on, which
+together form a DAG. Stages whose dependencies are complete are run
+concurrently on a thread or process pool, and stages that are up to date
+according to the build manifest are skipped.
+"""
+
+import json
+import time
+import logging as logger
+from dataclasses import dataclass, field
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+
+@dataclass
+class Stage:
+    """A stage of the build.
+
+    The stage function is called as func(output_folder, **deps, **params),
+    where deps maps the name of each dependency to the result of that stage.
+    Functions must be defined at module level if the stage is run on a
+    process pool.
+    If the first output is a JSON file, it must hold the result of the stage,
+    as it is loaded back in when the stage is skipped. Otherwise the result
+    of a skipped stage is None.
+
+    Args:
+        name (str): The name of the stage.
+        func (callable): The function that builds the stage.
+        inputs (list): The input files/folders of the stage (see
+          BuildManifest.hash_input).
+        outputs (list): The output filenames of the stage.
+        deps (list): The names of the stages this stage depends on.
+        params (dict): Options passed to the stage function. They are
+          recorded in the build manifest, so changing them rebuilds the stage.
+        after (list): The names of stages that must be run before this stage,
+          without passing their results to it, e.g. because they generate
+          its input files. Like deps, their outputs are inputs of this stage.
+    """
+
+    name: str
+    func: callable
+    inputs: list
+    outputs: list
+    deps: list = field(default_factory=list)
+    params: dict = None
+    after: list = field(default_factory=list)
+
+    @property
+    def requires(self):
+        """The names of the stages that must be run before this stage."""
+        return self.deps + self.after
+
+
+def _load_result(stage: Stage):
+    if not stage.outputs[0].endswith(".json"):
+        return None
+    with open(stage.outputs[0], "r") as f:
+        return json.load(f)
+
+
+def sort_stages(stages: list):
+    """Sort the stages topologically, preserving the declared order where
+    possible.
+
+    Args:
+        stages (list): The list of stages.
+
+    Raises:
+        ValueError: If a dependency is unknown or the stages contain a cycle.
+
+    Returns:
+        list: The sorted list of stages.
+    """
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        for d in s.requires:
+            if d not in by_name:
+                raise ValueError(f"Stage '{s.name}' depends on unknown '{d}'.")
+
+    sorted_stages = []
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if all(d in done for d in s.requires)]
+        if not ready:
+            names = ", ".join(s.name for s in remaining)
+            raise ValueError(f"Stages contain a cycle: {names}.")
+        for s in ready:
+            sorted_stages.append(s)
+            done.add(s.name)
+            remaining.remove(s)
+    return sorted_stages
+
+
+def _run_stage(recorder, name: str, func, output_folder: str, kwargs: dict):
+    with recorder.stage(name):
+        return func(output_folder, **kwargs)
+
+
+def run_stages(
+    stages: list,
+    output_folder: str,
+    manifest,
+    jobs: int = 1,
+    force: bool = False,
+    use_processes: bool = False,
+    recorder=None,
+    results: dict = None,
+):
+    """Run the given stages, running independent stages concurrently.
+
+    The outputs of each dependency are treated as inputs of the dependent
+    stage, so that a rebuilt stage causes its dependents to be rebuilt too.
+
+    Args:
+        stages (list): The list of stages.
+        output_folder (str): The output folder, passed to each stage.
+        manifest (BuildManifest): The build manifest.
+        jobs (int): The maximum number of stages to run at once.
+        force (bool): Whether to rebuild stages that are up to date.
+        use_processes (bool): Whether to use a process pool rather than a
+          thread pool.
+        recorder (Recorder): If given, record the metrics of each stage (see
+          siralim_data.instrument). With a process pool only the wall time
+          of each stage is recorded.
+        results (dict): The results of stages that are known to be up to
+          date, e.g. from a previous run in the same process. These stages
+          are neither checked against the manifest nor run.
+
+    Returns:
+        dict, dict: The result of each stage, and the wall time (in seconds)
+        each stage that was not given a result took.
+    """
+    stages = sort_stages(stages)
+    by_name = {s.name: s for s in stages}
+    results = dict(results or {})
+    timings = {}
+
+    def inputs_of(stage):
+        inputs = list(stage.inputs)
+        for d in stage.requires:
+            inputs += by_name[d].outputs
+        return inputs
+
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool_cls(max_workers=max(1, jobs)) as pool:
+        pending = [s for s in stages if s.name not in results]
+        running = {}
+        started = {}
+        while pending or running:
+            for stage in [
+                s for s in pending if all(d in results for d in s.requires)
+            ]:
+                pending.remove(stage)
+                inputs = inputs_of(stage)
+                if not force and manifest.is_up_to_date(
+                    stage.name, inputs, stage.outputs, stage.params
+                ):
+                    logger.info(
+                        f"Stage '{stage.name}' is up to date, skipping."
+                    )
+                    results[stage.name] = _load_result(stage)
+                    timings[stage.name] = 0.0
+                    if recorder is not None:
+                        recorder.skipped(stage.name)
+                    continue
+                kwargs = {d: results[d] for d in stage.deps}
+                kwargs.update(stage.params or {})
+                if recorder is not None and not use_processes:
+                    future = pool.submit(
+                        _run_stage,
+                        recorder,
+                        stage.name,
+                        stage.func,
+                        output_folder,
+                        kwargs,
+                    )
+                else:
+                    future = pool.submit(stage.func, output_folder, **kwargs)
+                running[future] = stage
+                started[stage.name] = time.perf_counter()
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                results[stage.name] = future.result()
+                timings[stage.name] = time.perf_counter() - started[stage.name]
+                if recorder is not None and use_processes:
+                    recorder.record(stage.name, timings[stage.name])
+                manifest.forget_hashes(stage.outputs)
+                manifest.record(
+                    stage.name, inputs_of(stage), stage.outputs, stage.params
+                )
+                manifest.save()
+
+    for stage in stages:
+        if stage.name in timings:
+            logger.info(f"Stage '{stage.name}': {timings[stage.name]:.2f}s")
+
+    return results, timings
@@ -0,0 +1,59 @@
+""" Compact record types for the rows of the Siralim Ultimate Compendium."""
+
+from dataclasses import dataclass
+
+# Map each (normalised) column of the Traits csv to its TraitRecord field.
+TRAIT_COLUMNS = {
+    "class": "class_",
+    "family": "family",
+    "creature": "creature",
+    "trait_name": "trait_name",
+    "trait_description": "trait_description",
+    "material_name": "material_name",
+}
+
+
+@dataclass(slots=True)
+class TraitRecord:
+    """A single monster/trait from the compendium. The stats, sprite filename
+    and sources are only present for traits found in the SUAPI data.
+    """
+
+    class_: str
+    family: str
+    creature: str
+    trait_name: str
+    trait_description: str
+    material_name: str
+    search_text: str
+    uid: str
+    stats: dict = None
+    sprite_filename: str = None
+    sprite_atlas: dict = None
+    sources: list = None
+
+    def to_dict(self):
+        """Convert the record to the JSON object stored in data.json.
+
+        Returns:
+            dict: The JSON object.
+        """
+        obj = {
+            "class": self.class_,
+            "family": self.family,
+            "creature": self.creature,
+            "trait_name": self.trait_name,
+            "trait_description": self.trait_description,
+            "material_name": self.material_name,
+            "search_text": self.search_text,
+            "uid": self.uid,
+        }
+        if self.stats is not None:
+            obj["stats"] = self.stats
+        if self.sprite_filename is not None:
+            obj["sprite_filename"] = self.sprite_filename
+        if self.sprite_atlas is not None:
+            obj["sprite_atlas"] = self.sprite_atlas
+        if self.sources is not None:
+            obj["sources"] = self.sources
+        return obj
@@ -0,0 +1,375 @@
+""" Versioned releases of the outputs, with deltas between releases.
+
+Most of the outputs are unchanged from one compendium version to the next,
+so rather than downloading data.json, relics.json and spells.json again, a
+client holding an earlier release can download the deltas from it to the
+latest release, diffed by uid. Every SNAPSHOT_INTERVAL releases, a full
+snapshot of the outputs is saved as well, so that new clients (or clients
+far behind) do not have to apply every delta since the first release.
+
+A release is published whenever the content of an output changes, and
+numbered from 1. The releases are described by releases/releases.json:
+
+    {
+      "format": "siralim-planner-releases",
+      "version": 1,
+      "snapshot_interval": 10,
+      "latest": 3,
+      "releases": [
+        {"release": 1, "compendium_version": "...",
+         "hashes": {"data.json": <sha256 of the output>, ...},
+         "snapshot": {"data.json": "releases/1/data.json", ...},
+         "snapshot_bytes": <total size of the snapshot>},
+        {"release": 2, "compendium_version": "...", "hashes": {...},
+         "delta": "releases/2/delta.json", "delta_bytes": <size>},
+        ...
+      ]
+    }
+
+Filenames are relative to the output folder. The delta of release N holds
+the changes of each output from release N - 1 (outputs without changes are
+omitted):
+
+    {"from": N - 1, "to": N, "outputs": {"data.json": {
+      "added": [<records>],
+      "removed": [<uids>],
+      "changed": {"<uid>": {"<field>": <new value>, ...}},
+      "unset": {"<uid>": [<removed fields>]},
+      "replaced": [<records>],
+      "positions": [<indexes>],
+      "order": [<uids>]
+    }}}
+
+Empty keys are omitted. Records whose fields are reordered are replaced
+whole, as their serialization depends on the order of their fields. Added
+records are inserted at the given "positions" (their indexes in the new
+version) or else appended after the remaining records, unless the remaining
+records were reordered, in which case the "order" of every uid is given.
+Applying the deltas (see apply_delta) gives outputs whose serialization (see
+serialize.dumps) matches the hashes of the release.
+"""
+
+import os
+import json
+import hashlib
+
+from siralim_data import serialize
+
+RELEASES_FORMAT = "siralim-planner-releases"
+RELEASES_VERSION = 1
+RELEASES_FOLDER = "releases"
+RELEASE_MANIFEST_FILENAME = "releases.json"
+DELTA_FILENAME = "delta.json"
+SNAPSHOT_INTERVAL = 10
+# The outputs that are released, all of which are lists of records with a
+# uid.
+OUTPUTS = ["data.json", "relics.json", "spells.json"]
+
+
+def content_hash(records: list):
+    """Return the sha256 of the serialization of an output, as saved by the
+    build.
+
+    Args:
+        records (list): The records of the output.
+
+    Returns:
+        str: The hex digest.
+    """
+    return hashlib.sha256(serialize.dumps(records)).hexdigest()
+
+
+def diff_records(old: list, new: list):
+    """Diff two versions of an output by uid, in a single pass over the new
+    records.
+
+    Args:
+        old (list): The records of the previous version.
+        new (list): The records of the new version.
+
+    Returns:
+        dict: The delta (see the module docstring), or None if the versions
+        are the same.
+    """
+    old_by_uid = {r["uid"]: r for r in old}
+    (added, changed, unset, replaced) = ([], {}, {}, [])
+    seen = set()
+    for record in new:
+        uid = record["uid"]
+        seen.add(uid)
+        previous = old_by_uid.get(uid)
+        if previous is None:
+            added.append(record)
+            continue
+        if previous == record and list(previous) == list(record):
+            continue
+        missing = [k for k in previous if k not in record]
+        # The order of the fields after applying the changes.
+        order = [k for k in previous if k in record]
+        order += [k for k in record if k not in previous]
+        if order != list(record):
+            replaced.append(record)
+            continue
+        fields = {
+            k: v
+            for (k, v) in record.items()
+            if k not in previous or previous[k] != v
+        }
+        if fields:
+            changed[uid] = fields
+        if missing:
+            unset[uid] = missing
+    removed = [r["uid"] for r in old if r["uid"] not in seen]
+
+    delta = {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unset": unset,
+        "replaced": replaced,
+    }
+    # The order only has to be saved if it differs from the default.
+    removed_uids = set(removed)
+    kept = [r["uid"] for r in old if r["uid"] not in removed_uids]
+    added_uids = {r["uid"] for r in added}
+    order = [r["uid"] for r in new]
+    positions = [i for (i, uid) in enumerate(order) if uid in added_uids]
+    if [uid for uid in order if uid not in added_uids] != kept:
+        delta["order"] = order
+    elif positions != list(range(len(kept), len(order))):
+        delta["positions"] = positions
+    delta = {k: v for (k, v) in delta.items() if v}
+    return delta or None
+
+
+def apply_delta(records: list, delta: dict):
+    """Apply the delta of an output to its previous version.
+
+    Args:
+        records (list): The records of the previous version (not modified).
+        delta (dict): The delta (see diff_records).
+
+    Raises:
+        ValueError: If the delta does not apply to the records.
+
+    Returns:
+        list: The records of the new version.
+    """
+    removed = set(delta.get("removed", []))
+    by_uid = {}
+    for record in records:
+        if record["uid"] not in removed:
+            by_uid[record["uid"]] = record
+    for (uid, fields) in delta.get("changed", {}).items():
+        if uid not in by_uid:
+            raise ValueError(f"Cannot change missing uid '{uid}'.")
+        by_uid[uid] = {**by_uid[uid], **fields}
+    for (uid, fields) in delta.get("unset", {}).items():
+        if uid not in by_uid:
+            raise ValueError(f"Cannot change missing uid '{uid}'.")
+        by_uid[uid] = {
+            k: v for (k, v) in by_uid[uid].items() if k not in fields
+        }
+    for record in delta.get("replaced", []):
+        if record["uid"] not in by_uid:
+            raise ValueError(f"Cannot replace missing uid '{record['uid']}'.")
+        by_uid[record["uid"]] = record
+    order = delta.get("order")
+    if order is None:
+        new = list(by_uid.values())
+        positions = delta.get("positions")
+        if positions is None:
+            return new + delta.get("added", [])
+        if len(positions) != len(delta.get("added", [])):
+            raise ValueError("The positions of the delta do not match.")
+        for (i, record) in zip(positions, delta["added"]):
+            new.insert(i, record)
+        return new
+
+    for record in delta.get("added", []):
+        by_uid[record["uid"]] = record
+    if len(order) != len(by_uid):
+        raise ValueError("The order of the delta does not match the uids.")
+    try:
+        return [by_uid[uid] for uid in order]
+    except KeyError as e:
+        raise ValueError(f"Unknown uid {e} in the order of the delta.")
+
+
+def _read_json(filename: str):
+    with open(filename, "rb") as f:
+        return json.loads(f.read())
+
+
+def _write_json(obj, filename: str):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    data = serialize.dumps(obj)
+    with open(filename, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def load_manifest(output_folder: str):
+    """Load the release manifest of an output folder.
+
+    Args:
+        output_folder (str): The output folder.
+
+    Returns:
+        dict: The manifest, or None if nothing was released yet.
+    """
+    filename = os.path.join(
+        output_folder, RELEASES_FOLDER, RELEASE_MANIFEST_FILENAME
+    )
+    try:
+        return _read_json(filename)
+    except FileNotFoundError:
+        return None
+
+
+def load_release(output_folder: str, manifest: dict, release: int):
+    """Rebuild the outputs of a release from the latest snapshot at or
+    before it, and the deltas after that snapshot.
+
+    Args:
+        output_folder (str): The output folder.
+        manifest (dict): The release manifest.
+        release (int): The number of the release.
+
+    Raises:
+        ValueError: If the rebuilt outputs do not match the hashes of the
+          release.
+
+    Returns:
+        dict: Map of output filename -> records.
+    """
+    entries = manifest["releases"][:release]
+    start = max(i for (i, e) in enumerate(entries) if "snapshot" in e)
+    outputs = {
+        name: _read_json(os.path.join(output_folder, filename))
+        for (name, filename) in entries[start]["snapshot"].items()
+    }
+    for entry in entries[start + 1 :]:
+        delta = _read_json(os.path.join(output_folder, entry["delta"]))
+        for (name, output_delta) in delta["outputs"].items():
+            outputs[name] = apply_delta(outputs.get(name, []), output_delta)
+
+    for (name, digest) in entries[-1]["hashes"].items():
+        if content_hash(outputs.get(name, [])) != digest:
+            raise ValueError(
+                f"{name} of release {release} does not match its hash."
+            )
+    return outputs
+
+
+def publish_release(
+    output_folder: str,
+    outputs: dict,
+    compendium_version: str = None,
+    snapshot_interval: int = SNAPSHOT_INTERVAL,
+):
+    """Publish a release of the outputs, if any of them changed since the
+    latest release: save the delta from the latest release, a snapshot if
+    the release is due one, and update the manifest.
+
+    Args:
+        output_folder (str): The output folder.
+        outputs (dict): Map of output filename (see OUTPUTS) -> records.
+        compendium_version (str): The compendium version of the outputs.
+        snapshot_interval (int): The number of releases between snapshots.
+
+    Returns:
+        dict, bool: The manifest, and whether a release was published.
+    """
+    manifest = load_manifest(output_folder) or {
+        "format": RELEASES_FORMAT,
+        "version": RELEASES_VERSION,
+        "latest": 0,
+        "releases": [],
+    }
+    manifest["snapshot_interval"] = snapshot_interval
+    hashes = {
+        name: content_hash(records) for (name, records) in outputs.items()
+    }
+    if manifest["releases"] and manifest["releases"][-1]["hashes"] == hashes:
+        return manifest, False
+
+    release = manifest["latest"] + 1
+    folder = os.path.join(RELEASES_FOLDER, str(release))
+    entry = {
+        "release": release,
+        "compendium_version": compendium_version,
+        "hashes": hashes,
+    }
+
+    if release > 1:
+        previous = load_release(output_folder, manifest, release - 1)
+        delta = {"from": release - 1, "to": release, "outputs": {}}
+        for (name, records) in outputs.items():
+            output_delta = diff_records(previous.get(name, []), records)
+            if output_delta is not None:
+                delta["outputs"][name] = output_delta
+        entry["delta"] = "/".join(
+            [RELEASES_FOLDER, str(release), DELTA_FILENAME]
+        )
+        entry["delta_bytes"] = _write_json(
+            delta, os.path.join(output_folder, folder, DELTA_FILENAME)
+        )
+
+    if (release - 1) % snapshot_interval == 0:
+        entry["snapshot"] = {}
+        entry["snapshot_bytes"] = 0
+        for (name, records) in outputs.items():
+            entry["snapshot"][name] = "/".join(
+                [RELEASES_FOLDER, str(release), name]
+            )
+            entry["snapshot_bytes"] += _write_json(
+                records, os.path.join(output_folder, folder, name)
+            )
+
+    manifest["latest"] = release
+    manifest["releases"].append(entry)
+    # The manifest is written last, so that it never refers to missing
+    # files.
+    filename = os.path.join(
+        output_folder, RELEASES_FOLDER, RELEASE_MANIFEST_FILENAME
+    )
+    _write_json(manifest, filename)
+    return manifest, True
+
+
+def plan_update(manifest: dict, release: int = None):
+    """Return the files a client holding a release has to download to get to
+    the latest release, with the fewest bytes: either the deltas since its
+    release, or a snapshot and the deltas since that snapshot.
+
+    Args:
+        manifest (dict): The release manifest.
+        release (int): The release the client holds, if any.
+
+    Returns:
+        list: The filenames (relative to the output folder), in the order
+        they are to be applied.
+    """
+    entries = manifest["releases"]
+    plans = []
+    for (i, entry) in enumerate(entries):
+        if "snapshot" in entry:
+            rest = entries[i + 1 :]
+            plans.append(
+                (
+                    entry["snapshot_bytes"]
+                    + sum(e["delta_bytes"] for e in rest),
+                    list(entry["snapshot"].values())
+                    + [e["delta"] for e in rest],
+                )
+            )
+    if release is not None and 1 <= release <= manifest["latest"]:
+        rest = entries[release:]
+        plans.append(
+            (
+                sum(e["delta_bytes"] for e in rest),
+                [e["delta"] for e in rest],
+            )
+        )
+    return min(plans, key=lambda p: p[0])[1] if plans else []
@@ -0,0 +1,302 @@
+""" Prebuilt inverted search index for the traits, spells and perks.
+
+The front end currently filters by scanning the search text of every item on
+every keystroke. The index maps each token (lowercased word) to a posting
+list, i.e. the sorted list of the documents that contain it. Documents are
+referred to by their position in the "uids" list of their collection, which
+keeps the posting lists compact.
+
+Optionally the index also contains:
+  - prefix entries, mapping every prefix of every token (of at least
+    MIN_PREFIX_LENGTH characters) to a posting list, so that the last word of
+    a query can be matched as the user is typing it without scanning the
+    vocabulary.
+  - trigram entries, mapping every three-character substring of the search
+    text to a posting list, which supports substring queries (the semantics
+    of the current front end).
+
+SearchIndex.search implements the query semantics in Python so that the index
+can be tested and benchmarked offline.
+"""
+
+import re
+import json
+import bisect
+
+SEARCH_INDEX_VERSION = 1
+MIN_PREFIX_LENGTH = 2
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    """Split the given text into lowercase tokens.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list: The tokens.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(text: str):
+    """Return the set of three-character substrings of the given text.
+
+    Args:
+        text (str): The (lowercase) text.
+
+    Returns:
+        set: The trigrams.
+    """
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _intersect(postings: list):
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+    result = set(postings[0])
+    for p in postings[1:]:
+        result.intersection_update(p)
+        if not result:
+            break
+    return sorted(result)
+
+
+def _union(postings):
+    result = set()
+    for p in postings:
+        result.update(p)
+    return sorted(result)
+
+
+class SearchIndex:
+    """An inverted index over a single collection of documents.
+
+    Args:
+        uids (list): The uid of each document.
+        tokens (dict): Map of token -> posting list.
+        prefixes (dict): Map of prefix -> posting list, if built.
+        trigrams (dict): Map of trigram -> posting list, if built.
+    """
+
+    def __init__(
+        self, uids: list, tokens: dict, prefixes: dict = None, trigrams=None
+    ):
+        self.uids = uids
+        self.tokens = tokens
+        self.prefixes = prefixes
+        self.trigrams = trigrams
+        self._vocabulary = sorted(tokens)
+
+    @classmethod
+    def build(
+        cls,
+        documents,
+        with_prefixes: bool = False,
+        with_trigrams: bool = False,
+    ):
+        """Build the index of the given documents.
+
+        Args:
+            documents (iterable): (uid, text) tuples.
+            with_prefixes (bool): Whether to build the prefix entries.
+            with_trigrams (bool): Whether to build the trigram entries.
+
+        Returns:
+            SearchIndex: The index.
+        """
+        uids = []
+        token_postings = {}
+        trigram_postings = {} if with_trigrams else None
+        for (doc, (uid, text)) in enumerate(documents):
+            uids.append(uid)
+            for token in set(tokenize(text)):
+                token_postings.setdefault(token, []).append(doc)
+            if with_trigrams:
+                for t in trigrams(text.lower()):
+                    trigram_postings.setdefault(t, []).append(doc)
+
+        prefix_postings = None
+        if with_prefixes:
+            prefix_postings = {}
+            for (token, docs) in token_postings.items():
+                for n in range(MIN_PREFIX_LENGTH, len(token)):
+                    prefix_postings.setdefault(token[:n], set()).update(docs)
+            prefix_postings = {
+                p: sorted(docs) for (p, docs) in prefix_postings.items()
+            }
+
+        return cls(uids, token_postings, prefix_postings, trigram_postings)
+
+    def to_json(self):
+        """Convert the index to a JSON-serialisable dict.
+
+        Returns:
+            dict: The index.
+        """
+        obj = {"uids": self.uids, "tokens": self.tokens}
+        if self.prefixes is not None:
+            obj["prefixes"] = self.prefixes
+        if self.trigrams is not None:
+            obj["trigrams"] = self.trigrams
+        return obj
+
+    @classmethod
+    def from_json(cls, obj: dict):
+        """Load an index from the dict produced by to_json.
+
+        Args:
+            obj (dict): The index.
+
+        Returns:
+            SearchIndex: The index.
+        """
+        return cls(
+            obj["uids"],
+            obj["tokens"],
+            obj.get("prefixes"),
+            obj.get("trigrams"),
+        )
+
+    def _prefix_postings(self, prefix: str):
+        if self.prefixes is not None and len(prefix) >= MIN_PREFIX_LENGTH:
+            exact = self.tokens.get(prefix, [])
+            return _union([exact, self.prefixes.get(prefix, [])])
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        matches = []
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(
+            prefix
+        ):
+            matches.append(self.tokens[self._vocabulary[i]])
+            i += 1
+        return _union(matches)
+
+    def search(self, query: str):
+        """Find the documents matching every word of the query. The last word
+        is matched as a prefix (as it may still be being typed) unless the
+        query ends with whitespace; the other words must match exactly.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            list: The uids of the matching documents, in document order.
+        """
+        words = tokenize(query)
+        if not words:
+            return list(self.uids)
+        complete = words if query[-1:].isspace() else words[:-1]
+        postings = [self.tokens.get(w, []) for w in complete]
+        if len(complete) < len(words):
+            postings.append(self._prefix_postings(words[-1]))
+        return [self.uids[d] for d in _intersect(postings)]
+
+    def search_substring(self, query: str, texts: list = None):
+        """Find the documents whose text contains the query as a substring
+        (ignoring case), i.e. the semantics of the current front end.
+        Requires the trigram entries for queries of three or more characters.
+
+        Without the texts the result may contain false positives (documents
+        containing every trigram of the query, but not contiguously); with
+        them each candidate is verified.
+
+        Args:
+            query (str): The query.
+            texts (list): The text of each document, if available.
+
+        Returns:
+            list: The uids of the matching documents, in document order.
+        """
+        q = query.lower()
+        if len(q) < 3 or self.trigrams is None:
+            if texts is None:
+                raise ValueError(
+                    "The texts are required for queries the trigram entries "
+                    "cannot answer."
+                )
+            candidates = range(len(self.uids))
+        else:
+            candidates = _intersect(
+                [self.trigrams.get(t, []) for t in trigrams(q)]
+            )
+        if texts is not None:
+            candidates = [d for d in candidates if q in texts[d].lower()]
+        return [self.uids[d] for d in candidates]
+
+
+def trait_documents(traits: list):
+    """Return the (uid, text) documents of the traits."""
+    return [(t["uid"], t["search_text"]) for t in traits]
+
+
+def spell_documents(spells: list):
+    """Return the (uid, text) documents of the spells."""
+    return [(s["uid"], s["search_text"]) for s in spells]
+
+
+def perk_documents(specializations: list):
+    """Return the (uid, text) documents of the perks of every
+    specialization.
+    """
+    return [
+        (p["uid"], " ".join([p["spec"], p["name"], p["description"]]))
+        for spec in specializations
+        for p in spec["perks"]
+    ]
+
+
+def build_search_index(
+    traits: list,
+    spells: list,
+    specializations: list,
+    with_prefixes: bool = False,
+    with_trigrams: bool = False,
+):
+    """Build the search index of the traits, spells and perks.
+
+    Args:
+        traits (list): The traits data.
+        spells (list): The spells data.
+        specializations (list): The specializations data.
+        with_prefixes (bool): Whether to build the prefix entries.
+        with_trigrams (bool): Whether to build the trigram entries.
+
+    Returns:
+        dict: The JSON-serialisable index of each collection.
+    """
+    collections = {
+        "traits": trait_documents(traits),
+        "spells": spell_documents(spells),
+        "perks": perk_documents(specializations),
+    }
+    return {
+        "version": SEARCH_INDEX_VERSION,
+        "collections": {
+            name: SearchIndex.build(
+                docs, with_prefixes, with_trigrams
+            ).to_json()
+            for (name, docs) in collections.items()
+        },
+    }
+
+
+def load_search_index(filename: str):
+    """Load the search index saved by the build.
+
+    Args:
+        filename (str): The filename of search_index.json.
+
+    Returns:
+        dict: Map of collection name -> SearchIndex.
+    """
+    with open(filename, "r") as f:
+        obj = json.load(f)
+    if obj.get("version") != SEARCH_INDEX_VERSION:
+        raise ValueError(f"{filename} has an unsupported version.")
+    return {
+        name: SearchIndex.from_json(c)
+        for (name, c) in obj["collections"].items()
+    }
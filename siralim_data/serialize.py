@@ -0,0 +1,134 @@
+""" Serialization of the JSON outputs of the build.
+
+Each output is encoded once, to compact UTF-8 JSON, and the encoded buffer
+is shared by every emitter configured for the build: the output file itself,
+plus opt-in extras such as pretty-printed copies for manual inspection. The
+compact format is the one orjson produces, so orjson is used to encode it
+when it is installed, and the output is the same either way.
+"""
+
+import os
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover (optional dependency)
+    orjson = None
+
+PRETTY_SUFFIX = "_pretty"
+
+
+def dumps(obj):
+    """Encode an object to compact UTF-8 JSON.
+
+    Args:
+        obj: The (JSON-serialisable) object.
+
+    Returns:
+        bytes: The encoded object.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode(
+        "utf-8"
+    )
+
+
+def pretty_filename(filename: str):
+    """Return the filename of the pretty-printed copy of an output, e.g.
+    specializations.json -> specializations_pretty.json.
+
+    Args:
+        filename (str): The filename of the output.
+
+    Returns:
+        str: The filename of the copy.
+    """
+    (root, ext) = os.path.splitext(filename)
+    return f"{root}{PRETTY_SUFFIX}{ext}"
+
+
+class PrettyEmitter:
+    """Saves a pretty-printed copy of each output alongside it (see
+    pretty_filename), for manual inspection.
+    """
+
+    def filenames(self, filename: str):
+        """Return the filenames the emitter saves for an output.
+
+        Args:
+            filename (str): The filename of the output.
+
+        Returns:
+            list: The filenames.
+        """
+        return [pretty_filename(filename)]
+
+    def emit(self, obj, data: bytes, filename: str):
+        """Save the copy of an output.
+
+        Args:
+            obj: The output object.
+            data (bytes): The encoded output.
+            filename (str): The filename of the output.
+        """
+        # The compact buffer cannot be reformatted without parsing it, so
+        # the object is encoded again. Only debug builds pay for this.
+        with open(pretty_filename(filename), "wb") as f:
+            f.write(
+                json.dumps(obj, indent=1, ensure_ascii=False).encode("utf-8")
+            )
+
+
+# The opt-in emitters, by name.
+EMITTERS = {"pretty": PrettyEmitter}
+
+
+class Serializer:
+    """Saves the JSON outputs of the build, with the given emitters.
+
+    Args:
+        emitters (list): The names of the emitters to use (see EMITTERS).
+
+    Raises:
+        ValueError: If an emitter is unknown.
+    """
+
+    def __init__(self, emitters: list = None):
+        self.emitters = []
+        for name in emitters or []:
+            if name not in EMITTERS:
+                raise ValueError(f"Unknown emitter '{name}'.")
+            self.emitters.append(EMITTERS[name]())
+
+    def filenames(self, filename: str):
+        """Return every filename saved for an output.
+
+        Args:
+            filename (str): The filename of the output.
+
+        Returns:
+            list: The filename of the output, followed by the filenames
+            saved by the emitters.
+        """
+        filenames = [filename]
+        for emitter in self.emitters:
+            filenames += emitter.filenames(filename)
+        return filenames
+
+    def save(self, obj, filename: str):
+        """Encode an output once, and save it with every emitter.
+
+        Args:
+            obj: The (JSON-serialisable) output.
+            filename (str): The filename of the output.
+
+        Returns:
+            list: The filenames that were saved.
+        """
+        data = dumps(obj)
+        with open(filename, "wb") as f:
+            f.write(data)
+        for emitter in self.emitters:
+            emitter.emit(obj, data, filename)
+        return self.filenames(filename)
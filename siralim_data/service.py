@@ -0,0 +1,519 @@
+""" Local HTTP query service over the outputs of the build.
+
+The service loads the outputs of build_data.py once, and answers:
+
+- GET /<collection>/<uid>: a trait, spell, relic or perk by uid, where
+  collection is one of "traits", "spells", "relics" or "perks";
+- GET /traits?class=&family=&source=&offset=&limit=: the traits with the
+  given class, family and source (each may be given more than once, to
+  match any of the values), a page at a time;
+- GET /search?q=&collection=&offset=&limit=: the traits (or spells or perks)
+  matching every word of a query, the last word as a prefix (see
+  SearchIndex.search);
+- GET /metadata: the metadata of the build (metadata.json), with the hash of
+  the build.
+
+Responses are JSON. Every response carries the content hash of the loaded
+build as its ETag, so clients can cache responses and revalidate them with
+If-None-Match, which is answered with 304 Not Modified until a new build
+lands. The bodies of recent responses are kept in an LRU cache, keyed on the
+normalized request, so hot queries are encoded once.
+
+The service polls the outputs, and reloads them once they stop changing
+(the build writes them one at a time). The new build is loaded off the event
+loop and swapped in at once, so requests never see a mix of two builds. If
+the new outputs cannot be loaded, the service keeps serving the previous
+build. For example:
+
+    python -m siralim_data.service --data src/data --port 8000
+"""
+
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import logging as logger
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from siralim_data import serialize, watch
+from siralim_data.search_index import (
+    SearchIndex,
+    perk_documents,
+    spell_documents,
+    trait_documents,
+)
+
+DATA_FILENAMES = {
+    "traits": "data.json",
+    "specializations": "specializations.json",
+    "relics": "relics.json",
+    "spells": "spells.json",
+    "metadata": "metadata.json",
+}
+SEARCH_COLLECTIONS = ["traits", "spells", "perks"]
+TRAIT_FILTERS = {"class": "class", "family": "family", "source": "sources"}
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+CACHE_SIZE = 1024
+RELOAD_INTERVAL = 1.0
+# The time (in seconds) an idle keep-alive connection is kept open.
+IDLE_TIMEOUT = 30
+MAX_HEADER_SIZE = 16 * 1024
+HASH_LENGTH = 16
+# The headers of responses after which the connection is closed.
+CLOSE = {"Connection": "close"}
+
+STATUS_REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class QueryError(ValueError):
+    """Raised when a request cannot be answered.
+
+    Args:
+        message (str): The error message.
+        status (int): The HTTP status of the response.
+    """
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+    def __reduce__(self):
+        return (type(self), (str(self), self.status))
+
+
+class BuildData:
+    """The outputs of a build, indexed for queries.
+
+    Args:
+        outputs (dict): Map of name (see DATA_FILENAMES) -> loaded output.
+        digest (str): The content hash of the outputs.
+    """
+
+    def __init__(self, outputs: dict, digest: str):
+        self.traits = outputs["traits"]
+        self.specializations = outputs["specializations"]
+        self.relics = outputs["relics"]
+        self.spells = outputs["spells"]
+        self.metadata = outputs["metadata"]
+        self.digest = digest
+
+        perks = [p for s in self.specializations for p in s["perks"]]
+        self.by_uid = {
+            "traits": {t["uid"]: t for t in self.traits},
+            "spells": {s["uid"]: s for s in self.spells},
+            "relics": {r["uid"]: r for r in self.relics},
+            "perks": {p["uid"]: p for p in perks},
+        }
+
+        # Map of filter -> value -> the positions of the matching traits.
+        self.filters = {name: {} for name in TRAIT_FILTERS}
+        for (i, trait) in enumerate(self.traits):
+            for (name, field) in TRAIT_FILTERS.items():
+                values = trait.get(field) or []
+                if isinstance(values, str):
+                    values = [values]
+                for value in values:
+                    self.filters[name].setdefault(value.lower(), []).append(i)
+
+        self.search_indexes = {
+            "traits": SearchIndex.build(trait_documents(self.traits), True),
+            "spells": SearchIndex.build(spell_documents(self.spells), True),
+            "perks": SearchIndex.build(
+                perk_documents(self.specializations), True
+            ),
+        }
+
+    @classmethod
+    def load(cls, folder: str):
+        """Load the outputs of a build.
+
+        Args:
+            folder (str): The output folder of the build.
+
+        Raises:
+            OSError: If an output cannot be read.
+            ValueError: If an output cannot be parsed.
+
+        Returns:
+            BuildData: The build.
+        """
+        sha = hashlib.sha256()
+        outputs = {}
+        for (name, filename) in DATA_FILENAMES.items():
+            with open(os.path.join(folder, filename), "rb") as f:
+                data = f.read()
+            sha.update(filename.encode("utf-8") + b"\0")
+            sha.update(data)
+            outputs[name] = json.loads(data)
+        return cls(outputs, sha.hexdigest()[:HASH_LENGTH])
+
+
+def _page(params: dict):
+    try:
+        offset = int(params.get("offset", ["0"])[-1])
+        limit = int(params.get("limit", [str(DEFAULT_LIMIT)])[-1])
+    except ValueError:
+        raise QueryError("offset and limit must be integers.") from None
+    if offset < 0:
+        raise QueryError("offset must be >= 0.")
+    if not 0 < limit <= MAX_LIMIT:
+        raise QueryError(f"limit must be between 1 and {MAX_LIMIT}.")
+    return offset, limit
+
+
+def _paginate(items: list, params: dict):
+    (offset, limit) = _page(params)
+    return {
+        "total": len(items),
+        "offset": offset,
+        "items": items[offset : offset + limit],
+    }
+
+
+class QueryService:
+    """Answers the queries of the service (see the module docstring) over
+    the loaded build, with an LRU cache of the response bodies.
+
+    Args:
+        build (BuildData): The loaded build.
+        cache_size (int): The maximum number of cached responses.
+    """
+
+    def __init__(self, build: BuildData, cache_size: int = CACHE_SIZE):
+        self.build = build
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def swap(self, build: BuildData):
+        """Serve a new build, dropping the cached responses."""
+        self.build = build
+        self.cache.clear()
+
+    @property
+    def etag(self):
+        return f'"{self.build.digest}"'
+
+    def _query(self, parts: list, params: dict):
+        build = self.build
+        if len(parts) == 2 and parts[0] in build.by_uid:
+            record = build.by_uid[parts[0]].get(parts[1])
+            if record is None:
+                raise QueryError(f"No {parts[0]} with uid '{parts[1]}'.", 404)
+            return record
+
+        if parts == ["traits"]:
+            positions = None
+            for (name, index) in build.filters.items():
+                if name not in params:
+                    continue
+                matches = set()
+                for value in params[name]:
+                    matches.update(index.get(value.lower(), []))
+                positions = (
+                    matches if positions is None else positions & matches
+                )
+            if positions is None:
+                return _paginate(build.traits, params)
+            return _paginate(
+                [build.traits[i] for i in sorted(positions)], params
+            )
+
+        if parts == ["search"]:
+            collection = params.get("collection", ["traits"])[-1]
+            if collection not in SEARCH_COLLECTIONS:
+                raise QueryError(f"Unknown collection '{collection}'.")
+            query = params.get("q", [""])[-1]
+            uids = build.search_indexes[collection].search(query)
+            by_uid = build.by_uid[collection]
+            return _paginate([by_uid[uid] for uid in uids], params)
+
+        if parts == ["metadata"]:
+            return {**build.metadata, "build": build.digest}
+
+        raise QueryError("Not found.", 404)
+
+    def handle(self, method: str, target: str, headers: dict = None):
+        """Answer a request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target (path and query string).
+            headers (dict): The request headers, with lowercase names.
+
+        Returns:
+            (int, dict, bytes): The status, headers and body of the
+            response.
+        """
+        headers = headers or {}
+        response_headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if method not in ("GET", "HEAD"):
+            body = serialize.dumps({"error": "Only GET is supported."})
+            return 405, {"Allow": "GET, HEAD"}, body
+
+        etags = headers.get("if-none-match", "")
+        if self.etag in [e.strip() for e in etags.split(",")] or etags == "*":
+            return 304, response_headers, b""
+
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        params = parse_qs(url.query)
+        # The key ignores the order of the parameters.
+        key = (
+            tuple(parts),
+            tuple(sorted((k, tuple(v)) for (k, v) in params.items())),
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            (status, body) = cached
+        else:
+            self.misses += 1
+            try:
+                (status, body) = (200, self._query(parts, params))
+            except QueryError as e:
+                (status, body) = (e.status, {"error": str(e)})
+            body = serialize.dumps(body)
+            self.cache[key] = (status, body)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        response_headers["X-Cache"] = "hit" if cached else "miss"
+        return status, response_headers, body
+
+
+class Server:
+    """The asyncio HTTP server of the service.
+
+    Args:
+        folder (str): The output folder of the build.
+        cache_size (int): The maximum number of cached responses.
+        reload_interval (float): The time (in seconds) between checks for a
+          new build, or None to never reload.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        cache_size: int = CACHE_SIZE,
+        reload_interval: float = RELOAD_INTERVAL,
+    ):
+        self.folder = folder
+        self.paths = [
+            os.path.join(folder, f) for f in DATA_FILENAMES.values()
+        ]
+        self.reload_interval = reload_interval
+        self._snapshot = watch.snapshot(self.paths)
+        self.service = QueryService(BuildData.load(folder), cache_size)
+        self._server = None
+        self._reloader = None
+        # The writer of each open connection, and the task serving it.
+        self._connections = {}
+
+    async def reload(self, snapshot: dict = None):
+        """Load the outputs again, and serve them if they load.
+
+        Args:
+            snapshot (dict): The snapshot of the outputs being loaded.
+
+        Returns:
+            bool: Whether the new build is served.
+        """
+        try:
+            build = await asyncio.to_thread(BuildData.load, self.folder)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load the new build: {e}")
+            return False
+        if snapshot is not None:
+            self._snapshot = snapshot
+        if build.digest != self.service.build.digest:
+            self.service.swap(build)
+            logger.info(f"Serving build {build.digest}.")
+        return True
+
+    async def _watch(self):
+        pending = None
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            current = watch.snapshot(self.paths)
+            if current == self._snapshot:
+                pending = None
+            elif current == pending:
+                # Unchanged since the last poll, so the build is done.
+                if not await self.reload(current):
+                    # Wait for the outputs to change again.
+                    self._snapshot = current
+                pending = None
+            else:
+                pending = current
+
+    async def _respond(self, writer, method, status, headers, body):
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS[status]}"]
+        headers = dict(headers)
+        if status != 304:
+            headers["Content-Type"] = "application/json; charset=utf-8"
+            headers["Content-Length"] = str(len(body))
+        lines += [f"{k}: {v}" for (k, v) in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if method != "HEAD" and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        """Serve the requests of a connection, until it is closed or idle.
+        """
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT
+                    )
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, "GET", 431, CLOSE, b"")
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    (method, target, version) = lines[0].split(" ")
+                except ValueError:
+                    await self._respond(writer, "GET", 400, CLOSE, b"")
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    (name, sep, value) = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    # The end of the request is unknown, so the connection
+                    # cannot be reused.
+                    await self._respond(writer, method, 400, CLOSE, b"")
+                    break
+                if length:
+                    await reader.readexactly(length)
+
+                try:
+                    (status, response_headers, body) = self.service.handle(
+                        method, target, headers
+                    )
+                except Exception:
+                    logger.exception(f"Failed to answer {method} {target}")
+                    (status, response_headers, body) = (500, {}, b"")
+                connection = headers.get("connection", "").lower()
+                keep_alive = (
+                    connection != "close"
+                    if version == "HTTP/1.1"
+                    else connection == "keep-alive"
+                )
+                if not keep_alive:
+                    response_headers["Connection"] = "close"
+                await self._respond(
+                    writer, method, status, response_headers, body
+                )
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        """Start listening, and watching the outputs for a new build.
+
+        Args:
+            host (str): The host to listen on.
+            port (int): The port to listen on (0 for any free port).
+
+        Returns:
+            int: The port listened on.
+        """
+        self._server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_SIZE
+        )
+        if self.reload_interval is not None:
+            self._reloader = asyncio.create_task(self._watch())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening and watching, and close the open connections."""
+        if self._reloader is not None:
+            self._reloader.cancel()
+        self._server.close()
+        # Closing a connection ends its task at its next read.
+        tasks = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def serve_forever(self, host: str, port: int):  # pragma: no cover
+        port = await self.start(host, port)
+        logger.info(
+            f"Serving build {self.service.build.digest} of {self.folder} on "
+            f"http://{host}:{port}/"
+        )
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+
+def main(args=None):  # pragma: no cover
+    """Run the service from the command line, until interrupted."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--data",
+        default=os.path.join("src", "data"),
+        help="The output folder of build_data.py.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_SIZE,
+        help="The maximum number of cached responses.",
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=RELOAD_INTERVAL,
+        help="The time (in seconds) between checks for a new build.",
+    )
+    args = parser.parse_args(args)
+
+    server = Server(args.data, args.cache_size, args.reload_interval)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    logger.basicConfig(format="%(levelname)s: %(message)s", level=logger.INFO)
+    sys.exit(main())
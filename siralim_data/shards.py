@@ -0,0 +1,250 @@
+""" Sharded layout for the traits data.
+
+Rather than one file holding every trait, the traits are split into shards
+by class (and optionally by family), so that a client only has to load the
+shards it displays. A small index maps the uid of each trait to its shard,
+so that a build string can be resolved by loading only the shards of the
+traits in it.
+
+The index file describes the shards:
+
+    {
+      "format": "siralim-planner-shards",
+      "version": 1,
+      "by_family": false,
+      "shards": [
+        {"class": "Chaos", "filename": "shards/chaos.json",
+         "length": <number of traits>, "bytes": <size of the file>,
+         "hash": <first 16 hex digits of the sha256 of the file>},
+        ...
+      ],
+      "uids": {"<uid>": <index of the shard in shards>, ...}
+    }
+
+Each shard is a JSON list of trait records, in the same order and with the
+same fields as in data.json. With by_family, each entry of "shards" also
+has a "family", and the shards are saved as shards/<class>/<family>.json.
+"""
+
+import os
+import re
+import json
+import hashlib
+
+SHARDS_FORMAT = "siralim-planner-shards"
+SHARDS_VERSION = 1
+SHARDS_FOLDER = "shards"
+SHARD_INDEX_FILENAME = "shards.json"
+# The hash of each shard is only used to tell versions apart (e.g. for cache
+# busting), so it is truncated to keep the index small.
+HASH_LENGTH = 16
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def slugify(name: str):
+    """Convert a class or family name to a filename-safe slug, e.g.
+    "Rodian Master" -> "rodian-master".
+
+    Args:
+        name (str): The name.
+
+    Returns:
+        str: The slug.
+    """
+    return re.sub(r"[^a-z0-9]+", "-", name.casefold()).strip("-")
+
+
+def shard_traits(traits: list, by_family: bool = False):
+    """Group the traits into shards.
+
+    Args:
+        traits (list): The traits data.
+        by_family (bool): Whether to shard by family within each class.
+
+    Raises:
+        ValueError: If two shards would have the same filename.
+
+    Returns:
+        dict: Map of shard key ((class,) or (class, family)) -> traits, in
+        the order the shards first appear in the data.
+    """
+    shards = {}
+    slugs = {}
+    for t in traits:
+        key = (t["class"], t["family"]) if by_family else (t["class"],)
+        if key not in shards:
+            slug = "/".join(map(slugify, key))
+            if slug in slugs:
+                raise ValueError(
+                    f"Shards {slugs[slug]} and {key} have the same filename."
+                )
+            slugs[slug] = key
+            shards[key] = []
+        shards[key].append(t)
+    return shards
+
+
+def save_shards(traits: list, folder: str, by_family: bool = False):
+    """Save the traits to the given folder in the sharded layout. The index
+    is saved to shards.json, and the shards under the shards folder. Shards
+    left over from a previous build are removed.
+
+    Args:
+        traits (list): The traits data.
+        folder (str): The folder to save to.
+        by_family (bool): Whether to shard by family within each class.
+
+    Returns:
+        dict: The index.
+    """
+    index = {
+        "format": SHARDS_FORMAT,
+        "version": SHARDS_VERSION,
+        "by_family": by_family,
+        "shards": [],
+        "uids": {},
+    }
+    filenames = set()
+    for (key, shard) in shard_traits(traits, by_family).items():
+        filename = "/".join([SHARDS_FOLDER] + list(map(slugify, key)))
+        filename += ".json"
+        path = os.path.join(folder, *filename.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        contents = _dumps(shard).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(contents)
+        filenames.add(os.path.normpath(path))
+
+        entry = {"class": key[0]}
+        if by_family:
+            entry["family"] = key[1]
+        entry.update(
+            {
+                "filename": filename,
+                "length": len(shard),
+                "bytes": len(contents),
+                "hash": hashlib.sha256(contents).hexdigest()[:HASH_LENGTH],
+            }
+        )
+        for t in shard:
+            index["uids"][t["uid"]] = len(index["shards"])
+        index["shards"].append(entry)
+
+    shards_folder = os.path.join(folder, SHARDS_FOLDER)
+    for root, dirs, files in os.walk(shards_folder, topdown=False):
+        for name in files:
+            path = os.path.normpath(os.path.join(root, name))
+            if name.endswith(".json") and path not in filenames:
+                os.remove(path)
+        if root != shards_folder and not os.listdir(root):
+            os.rmdir(root)
+
+    with open(os.path.join(folder, SHARD_INDEX_FILENAME), "w") as f:
+        f.write(_dumps(index))
+    return index
+
+
+def summarize(index: dict):
+    """Summarise the sizes of the shards of each class.
+
+    Args:
+        index (dict): The index of the shards.
+
+    Returns:
+        list: A (class, number of shards, number of traits, bytes, bytes of
+        the largest shard) tuple for each class, largest first.
+    """
+    classes = {}
+    for shard in index["shards"]:
+        (n, length, size, largest) = classes.get(shard["class"], (0, 0, 0, 0))
+        classes[shard["class"]] = (
+            n + 1,
+            length + shard["length"],
+            size + shard["bytes"],
+            max(largest, shard["bytes"]),
+        )
+    return sorted(
+        ((c,) + totals for (c, totals) in classes.items()),
+        key=lambda row: -row[3],
+    )
+
+
+class ShardedData:
+    """Reader for data saved in the sharded layout. Shards are only loaded
+    from disk when a trait in them is first accessed.
+
+    Args:
+        filename (str): The filename of the index.
+
+    Raises:
+        ValueError: If the file is not in a supported sharded format.
+    """
+
+    def __init__(self, filename: str):
+        with open(filename, "r") as f:
+            self.index = json.load(f)
+        if (
+            self.index.get("format") != SHARDS_FORMAT
+            or self.index.get("version") != SHARDS_VERSION
+        ):
+            raise ValueError(f"{filename} is not a supported shards index.")
+        self.folder = os.path.dirname(filename)
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.index["uids"])
+
+    def __contains__(self, uid: str):
+        return uid in self.index["uids"]
+
+    def shard(self, n: int):
+        """Return the traits of a shard, loading it if necessary.
+
+        Args:
+            n (int): The index of the shard.
+
+        Returns:
+            dict: Map of uid -> trait, for the traits in the shard.
+        """
+        if n not in self._shards:
+            filename = self.index["shards"][n]["filename"]
+            path = os.path.join(self.folder, *filename.split("/"))
+            with open(path, "r") as f:
+                self._shards[n] = {t["uid"]: t for t in json.load(f)}
+        return self._shards[n]
+
+    def get(self, uid: str, default=None):
+        """Return the trait with the given uid, loading only its shard.
+
+        Args:
+            uid (str): The uid of the trait.
+            default: The value to return if there is no such trait.
+
+        Returns:
+            dict: The trait.
+        """
+        n = self.index["uids"].get(uid)
+        if n is None:
+            return default
+        return self.shard(n)[uid]
+
+    def shards_of(self, uids):
+        """Return the indexes of the shards holding the given traits, i.e.
+        the shards that must be loaded to resolve them.
+
+        Args:
+            uids (iterable): The uids of the traits.
+
+        Returns:
+            list: The sorted indexes of the shards. Unknown uids are ignored.
+        """
+        return sorted(
+            {
+                self.index["uids"][uid]
+                for uid in uids
+                if uid in self.index["uids"]
+            }
+        )
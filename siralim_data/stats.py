@@ -0,0 +1,203 @@
+""" Columnar table of creature stats, used to compute the aggregates in
+metadata.json.
+
+The stats of every trait are held in one typed array per stat (i.e. a
+traits x stats table stored column by column), filled in a single pass. The
+aggregates are then computed with whole-column reductions (min, max, sum,
+sort) rather than per-key checks for every trait. The table uses the standard
+library's array module so that the build does not depend on NumPy.
+"""
+
+import math
+import bisect
+from array import array
+
+STAT_NAMES = ["health", "attack", "intelligence", "defense", "speed", "total"]
+PERCENTILES = [10, 25, 50, 75, 90]
+HISTOGRAM_BINS = 10
+
+
+def percentile(sorted_values, q: float):
+    """Return the q-th percentile of the given sorted values, interpolating
+    linearly between the closest ranks (as numpy.percentile does).
+
+    Args:
+        sorted_values (sequence): The sorted values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile.
+    """
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (
+        k - lo
+    )
+
+
+def histogram(sorted_values, bins: int = HISTOGRAM_BINS):
+    """Count the values falling into each of the equal-width bins spanning
+    their range.
+
+    Args:
+        sorted_values (sequence): The sorted values.
+        bins (int): The number of bins.
+
+    Returns:
+        dict: The bin edges (bins + 1 values) and the count of each bin.
+    """
+    if not sorted_values:
+        return {"edges": [], "counts": []}
+    lo, hi = sorted_values[0], sorted_values[-1]
+    width = (hi - lo) / bins or 1
+    edges = [lo + width * i for i in range(bins + 1)]
+    # The number of values below each inner edge; the last bin is closed.
+    cuts = [bisect.bisect_left(sorted_values, e) for e in edges[1:-1]]
+    cuts = [0] + cuts + [len(sorted_values)]
+    counts = [cuts[i + 1] - cuts[i] for i in range(bins)]
+    return {"edges": [round(e, 2) for e in edges], "counts": counts}
+
+
+class StatTable:
+    """The stats of a set of traits, stored column by column.
+
+    Args:
+        columns (dict): Map of stat name -> array of values.
+        labels (dict): Map of label name (e.g. "class") -> list of the label
+          of each row.
+    """
+
+    def __init__(self, columns: dict, labels: dict):
+        self.columns = columns
+        self.labels = labels
+        self._sorted = {}
+
+    @classmethod
+    def from_traits(cls, traits, label_names=("class", "family")):
+        """Build the table from the traits that have stats.
+
+        Args:
+            traits (iterable): The JSON rows of the traits.
+            label_names (tuple): The fields to group by.
+
+        Returns:
+            StatTable: The table.
+        """
+        columns = {k: array("i") for k in STAT_NAMES}
+        labels = {k: [] for k in label_names}
+        appends = [(columns[k].append, k) for k in STAT_NAMES]
+        for obj in traits:
+            stats = obj.get("stats")
+            if stats is None:
+                continue
+            for (append, k) in appends:
+                append(stats[k])
+            for k in label_names:
+                labels[k].append(obj[k])
+        return cls(columns, labels)
+
+    def __len__(self):
+        return len(self.columns[STAT_NAMES[0]])
+
+    def sorted_column(self, name: str):
+        """Return the sorted values of a stat (memoised).
+
+        Args:
+            name (str): The stat.
+
+        Returns:
+            array: The sorted values.
+        """
+        if name not in self._sorted:
+            self._sorted[name] = array("i", sorted(self.columns[name]))
+        return self._sorted[name]
+
+    def take(self, indexes: list):
+        """Return a table holding only the given rows.
+
+        Args:
+            indexes (list): The indexes of the rows.
+
+        Returns:
+            StatTable: The table.
+        """
+        return StatTable(
+            {
+                k: array("i", map(col.__getitem__, indexes))
+                for (k, col) in self.columns.items()
+            },
+            {
+                k: list(map(col.__getitem__, indexes))
+                for (k, col) in self.labels.items()
+            },
+        )
+
+    def group_by(self, label: str):
+        """Split the table by the value of a label.
+
+        Args:
+            label (str): The label, e.g. "class".
+
+        Returns:
+            dict: Map of label value -> StatTable, in sorted order.
+        """
+        groups = {}
+        for (i, value) in enumerate(self.labels[label]):
+            groups.setdefault(value, []).append(i)
+        return {k: self.take(groups[k]) for k in sorted(groups)}
+
+    # The reductions of an empty table are empty, as no stat has a value.
+
+    def minimum(self):
+        if not len(self):
+            return {}
+        return {k: min(col) for (k, col) in self.columns.items()}
+
+    def maximum(self):
+        if not len(self):
+            return {}
+        return {k: max(col) for (k, col) in self.columns.items()}
+
+    def mean(self):
+        n = len(self)
+        if not n:
+            return {}
+        return {k: sum(col) / n for (k, col) in self.columns.items()}
+
+    def percentiles(self, qs=PERCENTILES):
+        if not len(self):
+            return {}
+        return {
+            k: {
+                f"p{q}": round(percentile(self.sorted_column(k), q), 2)
+                for q in qs
+            }
+            for k in self.columns
+        }
+
+    def histograms(self, bins: int = HISTOGRAM_BINS):
+        return {
+            k: histogram(self.sorted_column(k), bins) for k in self.columns
+        }
+
+    def summary(self, with_percentiles: bool = True):
+        """Return the count, min, max, (rounded) mean and optionally the
+        percentiles of each stat.
+
+        Args:
+            with_percentiles (bool): Whether to include the percentiles.
+
+        Returns:
+            dict: The summary.
+        """
+        summary = {
+            "count": len(self),
+            "min_stats": self.minimum(),
+            "max_stats": self.maximum(),
+            "average_stats": {k: round(v) for (k, v) in self.mean().items()},
+        }
+        if with_percentiles:
+            summary["percentiles"] = self.percentiles()
+        return summary
@@ -0,0 +1,259 @@
+""" Parser of the text dump of the Steam guide to the specializations, which
+produces data/steam-guide/perks.csv and data/steam-guide/specializations.csv.
+
+The guide is read one line at a time by a state machine. Each line is
+classified (a specialization name, a section heading, a perk field, a blank
+line or text) with dict lookups, and the (state, kind of line) pair is looked
+up in a transition table to find the action to take and the next state:
+
+    OUTSIDE      -- before the first specialization, and after the perks of
+                    a specialization
+    DESCRIPTION  -- the description of a specialization
+    BODY         -- the starter creature etc. of a specialization (ignored)
+    PERKS        -- the perks of a specialization, separated by blank lines
+
+Perks and specializations are yielded as soon as they are complete, so that
+the csv files can be written as the guide is read.
+"""
+
+import csv
+import logging as logger
+
+PERK_FIELDS = [
+    "specialization",
+    "name",
+    "ranks",
+    "cost_per_rank",
+    "anointment",
+    "description",
+]
+SPECIALIZATION_FIELDS = ["name", "abbreviation", "description"]
+
+# Labels of the perk fields ("<label>: <value>"), mapped to the field name.
+PERK_FIELD_LABELS = {
+    "Ranks": "ranks",
+    "Cost Per Rank": "cost_per_rank",
+    "Anointment": "anointment",
+}
+
+OUTSIDE = "outside"
+DESCRIPTION = "description"
+BODY = "body"
+PERKS = "perks"
+
+# Kinds of lines
+SPEC = "spec"
+STARTER = "starter"
+PERKS_HEADING = "perks_heading"
+END = "end"
+BLANK = "blank"
+TEXT = "text"
+
+HEADINGS = {
+    "Starter Creature": STARTER,
+    "Perks": PERKS_HEADING,
+    "Supplemental Info": END,
+    "Notes": END,
+    "Spells": END,
+    "Status Effects": END,
+}
+
+
+def read_specializations(filename: str):
+    """Read the names and abbreviations of the specializations.
+
+    Args:
+        filename (str): The filename of specializations.txt, where each line
+          is <name>,<abbreviation>.
+
+    Raises:
+        ValueError: If an abbreviation is used more than once.
+
+    Yields:
+        (str, str): The name and abbreviation of each specialization.
+    """
+    abbrevs = set()
+    with open(filename, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            (name, abbrev) = line.strip().split(",")
+            if abbrev in abbrevs:
+                raise ValueError(f'Abbreviation "{abbrev}" already in use.')
+            abbrevs.add(abbrev)
+            yield name, abbrev
+
+
+class _Parser:
+    """The state of the parser while reading the guide."""
+
+    def __init__(self, specializations: dict):
+        self.specializations = specializations
+        self.state = OUTSIDE
+        self.spec = None
+        self.spec_lines = []
+        self.perk = None
+        self.perk_lines = []
+
+    # Actions, which return the records that are complete (if any).
+
+    def ignore(self, line):
+        return None
+
+    def start_spec(self, line):
+        done = self.finish(line)
+        self.spec = line
+        self.spec_lines = []
+        return done
+
+    def add_spec_line(self, line):
+        self.spec_lines.append(line)
+
+    def end_description(self, line):
+        spec = {
+            "name": self.spec,
+            "abbreviation": self.specializations[self.spec],
+            "description": "\n".join(self.spec_lines),
+        }
+        self.spec_lines = []
+        return ((SPEC, spec),)
+
+    def add_perk_line(self, line):
+        if self.perk is None:
+            self.perk = {"specialization": self.spec, "name": line}
+            self.perk_lines = []
+            return
+        (label, sep, value) = line.partition(": ")
+        if sep and label in PERK_FIELD_LABELS:
+            self.perk[PERK_FIELD_LABELS[label]] = value
+        else:
+            self.perk_lines.append(line)
+
+    def end_perk(self, line):
+        if self.perk is None:
+            return ()
+        perk = self.perk
+        if self.perk_lines:
+            perk["description"] = " ".join(self.perk_lines)
+        self.perk = None
+        self.perk_lines = []
+        return ((PERKS, perk),)
+
+    def finish(self, line):
+        """Return the records that are pending at the end of a
+        specialization (or of the guide).
+        """
+        if self.state == DESCRIPTION:
+            return self.end_description(line)
+        return self.end_perk(line)
+
+
+# (state, kind of line) -> (action, next state). Pairs that are not in the
+# table are ignored without changing state.
+TRANSITIONS = {
+    (OUTSIDE, SPEC): ("start_spec", DESCRIPTION),
+    (DESCRIPTION, SPEC): ("start_spec", DESCRIPTION),
+    (DESCRIPTION, TEXT): ("add_spec_line", DESCRIPTION),
+    (DESCRIPTION, STARTER): ("end_description", BODY),
+    (DESCRIPTION, PERKS_HEADING): ("end_description", PERKS),
+    (BODY, SPEC): ("start_spec", DESCRIPTION),
+    (BODY, PERKS_HEADING): ("ignore", PERKS),
+    (PERKS, SPEC): ("start_spec", DESCRIPTION),
+    (PERKS, TEXT): ("add_perk_line", PERKS),
+    (PERKS, BLANK): ("end_perk", PERKS),
+    (PERKS, END): ("end_perk", OUTSIDE),
+}
+
+
+def parse_steam_guide(lines, specializations: dict):
+    """Parse the text dump of the Steam guide.
+
+    Args:
+        lines (iterable): The lines of the guide.
+        specializations (dict): Map of specialization name -> abbreviation.
+
+    Yields:
+        (str, dict): ("spec", specialization) or ("perks", perk) for each
+        specialization and perk, as soon as it is complete. Specializations
+        have the keys of SPECIALIZATION_FIELDS and perks those of
+        PERK_FIELDS.
+    """
+    parser = _Parser(specializations)
+    # Bind the actions once, rather than looking them up for every line.
+    table = {}
+    for ((state, kind), (action, next_state)) in TRANSITIONS.items():
+        table.setdefault(state, {})[kind] = (
+            getattr(parser, action),
+            next_state,
+        )
+    for line in lines:
+        line = line.strip()
+        if not line:
+            kind = BLANK
+        elif line in specializations:
+            kind = SPEC
+        else:
+            kind = HEADINGS.get(line, TEXT)
+        transition = table[parser.state].get(kind)
+        if transition is None:
+            continue
+        done = transition[0](line)
+        parser.state = transition[1]
+        if done:
+            yield from done
+    yield from parser.finish(None)
+
+
+def convert_steam_guide(
+    guide_filename: str,
+    specs_filename: str,
+    perks_csv_filename: str,
+    specs_csv_filename: str,
+):
+    """Convert the text dump of the Steam guide to perks.csv and
+    specializations.csv, writing each row as soon as it is parsed.
+
+    Args:
+        guide_filename (str): The filename of steam_guide.txt.
+        specs_filename (str): The filename of specializations.txt.
+        perks_csv_filename (str): The filename to write the perks to.
+        specs_csv_filename (str): The filename to write the specializations
+          to.
+
+    Returns:
+        dict: The number of perks and specializations written.
+    """
+    specializations = dict(read_specializations(specs_filename))
+    written = set()
+    counts = {"perks": 0, "specializations": 0}
+
+    with open(guide_filename, "r") as guide, open(
+        perks_csv_filename, "w", newline=""
+    ) as perks_f, open(specs_csv_filename, "w", newline="") as specs_f:
+        perks_writer = csv.DictWriter(
+            perks_f, fieldnames=PERK_FIELDS, lineterminator="\n"
+        )
+        perks_writer.writeheader()
+        specs_writer = csv.DictWriter(
+            specs_f, fieldnames=SPECIALIZATION_FIELDS, lineterminator="\n"
+        )
+        specs_writer.writeheader()
+
+        for (kind, record) in parse_steam_guide(guide, specializations):
+            if kind == PERKS:
+                perks_writer.writerow(record)
+                counts["perks"] += 1
+            else:
+                specs_writer.writerow(record)
+                written.add(record["name"])
+                counts["specializations"] += 1
+
+        for (name, abbrev) in specializations.items():
+            if name not in written:
+                logger.warning(f"Specialization {name} is not in the guide.")
+                specs_writer.writerow(
+                    {"name": name, "abbreviation": abbrev, "description": ""}
+                )
+                counts["specializations"] += 1
+
+    return counts
@@ -0,0 +1,359 @@
+""" Memory-mapped binary store of the traits data, for Python services.
+
+Loading data.json means parsing it and building a dict per trait in every
+worker process. The binary store (traits.bin) has a fixed layout instead,
+so a reader maps it into memory and resolves a uid, its stats or its
+description with a few struct reads, without parsing anything up front.
+Since the mapping is read-only, its pages are shared between the processes
+of a pre-fork pool.
+
+The layout is little-endian, with every section aligned to 8 bytes:
+
+- header: magic (b"SPTS"), format version (u16), number of string fields
+  (u16), number of traits (u32), number of slots of the uid table (u32), and
+  the offsets of the uid table, records, stat columns and string heap (u64
+  each);
+- uid table: an open addressing hash table (crc32 of the uid, linear
+  probing) of u32 slots, each holding the index of a trait + 1, or 0 if
+  empty;
+- records: for each trait, the (offset, length) of each field in
+  STRING_FIELDS in the string heap (u32 each), with an offset of MISSING for
+  missing fields;
+- stat columns: for each stat in STAT_NAMES, the value of every trait (i16),
+  or -1 if the trait has no stats;
+- string heap: the UTF-8 strings, each saved once. The sources of a trait
+  are joined with SOURCES_SEPARATOR.
+"""
+
+import os
+import mmap
+import zlib
+import struct
+
+STORE_FILENAME = "traits.bin"
+MAGIC = b"SPTS"
+STORE_VERSION = 1
+STRING_FIELDS = [
+    "uid",
+    "class",
+    "family",
+    "creature",
+    "trait_name",
+    "trait_description",
+    "material_name",
+    "sprite_filename",
+    "sources",
+]
+STAT_NAMES = ["health", "attack", "intelligence", "defense", "speed", "total"]
+SOURCES_SEPARATOR = "\x1f"
+MISSING = 0xFFFFFFFF
+NO_STAT = -1
+
+HEADER = struct.Struct("<4sHHII4Q")
+FIELD = struct.Struct("<II")
+SLOT = struct.Struct("<I")
+STAT = struct.Struct("<h")
+RECORD_SIZE = FIELD.size * len(STRING_FIELDS)
+
+
+def _align(n: int):
+    return (n + 7) & ~7
+
+
+def _table_size(count: int):
+    # At most half full, so that probe sequences stay short.
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    return size
+
+
+def _field_value(trait: dict, field: str):
+    value = trait.get(field)
+    if field == "sources" and value is not None:
+        value = SOURCES_SEPARATOR.join(value)
+    return value
+
+
+def encode_store(traits: list):
+    """Encode the traits data in the binary layout.
+
+    Args:
+        traits (list): The traits data.
+
+    Raises:
+        ValueError: If uids are duplicated, or a stat does not fit in the
+          layout.
+
+    Returns:
+        bytes: The encoded store.
+    """
+    count = len(traits)
+    table_size = _table_size(count)
+
+    heap = bytearray()
+    strings = {}
+    records = bytearray()
+    for trait in traits:
+        for field in STRING_FIELDS:
+            value = _field_value(trait, field)
+            if value is None:
+                records += FIELD.pack(MISSING, 0)
+                continue
+            data = value.encode("utf-8")
+            if data not in strings:
+                strings[data] = len(heap)
+                heap += data
+            records += FIELD.pack(strings[data], len(data))
+
+    table = [0] * table_size
+    mask = table_size - 1
+    for (i, trait) in enumerate(traits):
+        key = trait["uid"].encode("utf-8")
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            if traits[table[slot] - 1]["uid"] == trait["uid"]:
+                raise ValueError(f"Duplicate uid '{trait['uid']}'.")
+            slot = (slot + 1) & mask
+        table[slot] = i + 1
+
+    columns = bytearray()
+    for stat in STAT_NAMES:
+        values = []
+        for trait in traits:
+            value = (trait.get("stats") or {}).get(stat)
+            values.append(NO_STAT if value is None else value)
+        try:
+            columns += struct.pack(f"<{count}h", *values)
+        except struct.error:
+            raise ValueError(f"A value of {stat} does not fit.") from None
+
+    table_offset = _align(HEADER.size)
+    records_offset = _align(table_offset + SLOT.size * table_size)
+    columns_offset = _align(records_offset + len(records))
+    heap_offset = _align(columns_offset + len(columns))
+
+    data = bytearray(heap_offset + len(heap))
+    HEADER.pack_into(
+        data,
+        0,
+        MAGIC,
+        STORE_VERSION,
+        len(STRING_FIELDS),
+        count,
+        table_size,
+        table_offset,
+        records_offset,
+        columns_offset,
+        heap_offset,
+    )
+    struct.pack_into(f"<{table_size}I", data, table_offset, *table)
+    data[records_offset : records_offset + len(records)] = records
+    data[columns_offset : columns_offset + len(columns)] = columns
+    data[heap_offset:] = heap
+    return bytes(data)
+
+
+def save_store(traits: list, filename: str):
+    """Save the traits data to a binary store. The store is written to a
+    temporary file, then moved into place, so that processes that mapped the
+    previous store keep reading a complete file.
+
+    Args:
+        traits (list): The traits data.
+        filename (str): The filename of the store.
+
+    Returns:
+        int: The size of the store in bytes.
+    """
+    data = encode_store(traits)
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+    os.replace(tmp_filename, filename)
+    return len(data)
+
+
+class TraitStore:
+    """Reader of a binary store (see the module docstring), mapped into
+    memory. Only the fields that are read are decoded.
+
+    Args:
+        filename (str): The filename of the store.
+
+    Raises:
+        ValueError: If the file is not a binary store of this version.
+    """
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        try:
+            (
+                magic,
+                version,
+                fields,
+                self._count,
+                self._table_size,
+                self._table,
+                self._records,
+                self._columns,
+                self._heap,
+            ) = HEADER.unpack_from(self._view, 0)
+        except struct.error:
+            self.close()
+            raise ValueError(f"{filename} is not a trait store.") from None
+        if magic != MAGIC or version != STORE_VERSION:
+            self.close()
+            raise ValueError(
+                f"{filename} is not a version {STORE_VERSION} trait store."
+            )
+        if fields != len(STRING_FIELDS):
+            self.close()
+            raise ValueError(f"{filename} has unexpected fields.")
+        self._mask = self._table_size - 1
+        self._field_indexes = {f: i for (i, f) in enumerate(STRING_FIELDS)}
+
+    def close(self):
+        """Unmap the store. Views returned by field_bytes must be released
+        first.
+        """
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, uid: str):
+        return self.index(uid) is not None
+
+    def _field(self, i: int, field: int):
+        offset = self._records + i * RECORD_SIZE + field * FIELD.size
+        (start, length) = FIELD.unpack_from(self._view, offset)
+        if start == MISSING:
+            return None
+        start += self._heap
+        return self._view[start : start + length]
+
+    def index(self, uid: str):
+        """Return the index of a trait (its position in data.json).
+
+        Args:
+            uid (str): The uid of the trait.
+
+        Returns:
+            int: The index, or None if there is no trait with this uid.
+        """
+        key = uid.encode("utf-8")
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            (entry,) = SLOT.unpack_from(
+                self._view, self._table + slot * SLOT.size
+            )
+            if not entry:
+                return None
+            if self._field(entry - 1, 0) == key:
+                return entry - 1
+            slot = (slot + 1) & self._mask
+
+    def field_bytes(self, i: int, field: str):
+        """Return a field of a trait as a view of the UTF-8 string in the
+        store, without copying it.
+
+        Args:
+            i (int): The index of the trait.
+            field (str): The field, one of STRING_FIELDS.
+
+        Returns:
+            memoryview: The view, or None if the trait has no such field.
+        """
+        return self._field(i, self._field_indexes[field])
+
+    def field(self, i: int, field: str):
+        """Return a field of a trait.
+
+        Args:
+            i (int): The index of the trait.
+            field (str): The field, one of STRING_FIELDS.
+
+        Returns:
+            The value of the field (a list for sources), or None if the trait
+            has no such field.
+        """
+        view = self.field_bytes(i, field)
+        if view is None:
+            return None
+        value = str(view, "utf-8")
+        if field == "sources":
+            return value.split(SOURCES_SEPARATOR) if value else []
+        return value
+
+    def stats(self, i: int):
+        """Return the stats of a trait.
+
+        Args:
+            i (int): The index of the trait.
+
+        Returns:
+            dict: Map of stat -> value, or None if the trait has no stats.
+        """
+        stats = {}
+        for (s, stat) in enumerate(STAT_NAMES):
+            offset = self._columns + (s * self._count + i) * STAT.size
+            (value,) = STAT.unpack_from(self._view, offset)
+            if value == NO_STAT:
+                return None
+            stats[stat] = value
+        return stats
+
+    def get(self, uid: str):
+        """Return a trait, with the same fields as in data.json (except the
+        search text).
+
+        Args:
+            uid (str): The uid of the trait.
+
+        Returns:
+            dict: The trait, or None if there is no trait with this uid.
+        """
+        i = self.index(uid)
+        if i is None:
+            return None
+        trait = {}
+        for field in STRING_FIELDS:
+            value = self.field(i, field)
+            if value is not None:
+                trait[field] = value
+        stats = self.stats(i)
+        if stats is not None:
+            trait["stats"] = stats
+        return trait
+
+    def description(self, uid: str):
+        """Return the description of a trait.
+
+        Args:
+            uid (str): The uid of the trait.
+
+        Returns:
+            str: The description, or None if there is no trait with this
+            uid.
+        """
+        i = self.index(uid)
+        return None if i is None else self.field(i, "trait_description")
+
+    def uids(self):
+        """Yield the uids of the traits, in order.
+
+        Yields:
+            str: The uid of each trait.
+        """
+        for i in range(self._count):
+            yield self.field(i, "uid")
@@ -0,0 +1,190 @@
+""" Registry of the uids of the traits, perks, relics and spells.
+
+Build strings and URLs refer to traits, perks, relics and spells by uid, so
+the uids must be unique within each namespace, and a published uid must keep
+referring to the same thing. The registry indexes every uid in one pass and
+reports every collision at once, and compares the uids against the index
+published by the previous build (uids.json):
+
+- removed: a published uid no longer exists, so builds using it will show a
+  missing trait/perk etc.
+- reassigned: a published uid now refers to something else, so builds using
+  it silently change (e.g. when a perk is inserted before others of the same
+  specialization).
+"""
+
+import json
+import logging as logger
+
+NAMESPACES = ["traits", "perks", "relics", "spells"]
+UID_INDEX_FILENAME = "uids.json"
+UID_REPORT_FILENAME = "uid_report.json"
+
+
+class UidError(ValueError):
+    """Raised when uids collide, or published uids are reassigned.
+
+    Args:
+        message (str): The error message.
+        report (dict): The uid report (see UidRegistry.report).
+    """
+
+    def __init__(self, message: str, report: dict = None):
+        super().__init__(message)
+        self.report = report
+
+    def __reduce__(self):
+        return (type(self), (str(self), self.report))
+
+
+class UidRegistry:
+    """The uids of each namespace, and the keys (names) registered with
+    each uid, once per registration.
+    """
+
+    def __init__(self):
+        self.index = {namespace: {} for namespace in NAMESPACES}
+
+    def register(self, namespace: str, uid: str, key: str):
+        """Register a uid. Registering a uid again is a collision, even
+        with the same key (e.g. a duplicated row of the source data).
+
+        Args:
+            namespace (str): The namespace, one of NAMESPACES.
+            uid (str): The uid.
+            key (str): The name of the thing the uid refers to.
+        """
+        self.index[namespace].setdefault(uid, []).append(key)
+
+    @classmethod
+    def from_data(cls, traits, specializations, relics, spells):
+        """Build the registry of the built data.
+
+        Args:
+            traits (list): The traits data.
+            specializations (list): The specializations data.
+            relics (list): The relics data.
+            spells (list): The spells data.
+
+        Returns:
+            UidRegistry: The registry.
+        """
+        registry = cls()
+        for t in traits:
+            key = f"{t['family']} / {t['creature']} / {t['trait_name']}"
+            registry.register("traits", t["uid"], key)
+        for spec in specializations:
+            for perk in spec["perks"]:
+                key = f"{spec['name']}: {perk['name']}"
+                registry.register("perks", perk["uid"], key)
+        for relic in relics:
+            registry.register("relics", relic["uid"], relic["name"])
+        for spell in spells:
+            key = f"{spell['name']} ({spell['class']})"
+            registry.register("spells", spell["uid"], key)
+        return registry
+
+    def collisions(self):
+        """Return every uid registered more than once.
+
+        Returns:
+            dict: Map of namespace -> uid -> keys, for the namespaces with
+            collisions.
+        """
+        collisions = {}
+        for (namespace, uids) in self.index.items():
+            colliding = {u: k for (u, k) in uids.items() if len(k) > 1}
+            if colliding:
+                collisions[namespace] = dict(sorted(colliding.items()))
+        return collisions
+
+    def to_json(self):
+        """Return the index of the registry, i.e. a map of namespace -> uid
+        -> key, as saved to uids.json.
+        """
+        return {
+            namespace: {u: keys[0] for (u, keys) in sorted(uids.items())}
+            for (namespace, uids) in self.index.items()
+        }
+
+    def compare(self, previous: dict):
+        """Compare the registry with a previously published index.
+
+        Args:
+            previous (dict): The previous index (see to_json).
+
+        Returns:
+            dict, dict: The removed uids (namespace -> uid -> previous key)
+            and the reassigned uids (namespace -> uid -> {"previous",
+            "current"}), for the namespaces with changes.
+        """
+        removed = {}
+        reassigned = {}
+        for (namespace, uids) in previous.items():
+            current = self.index.get(namespace, {})
+            for (uid, key) in uids.items():
+                if uid not in current:
+                    removed.setdefault(namespace, {})[uid] = key
+                elif key not in current[uid]:
+                    reassigned.setdefault(namespace, {})[uid] = {
+                        "previous": key,
+                        "current": current[uid][0],
+                    }
+        return removed, reassigned
+
+    def report(self, previous: dict = None):
+        """Return a report of the collisions, and of the changes since the
+        previously published index.
+
+        Args:
+            previous (dict, optional): The previous index (see to_json).
+
+        Returns:
+            dict: The number of uids of each namespace ("counts"), and the
+            "collisions", "removed" and "reassigned" uids.
+        """
+        (removed, reassigned) = ({}, {})
+        if previous is not None:
+            (removed, reassigned) = self.compare(previous)
+        return {
+            "counts": {ns: len(uids) for (ns, uids) in self.index.items()},
+            "collisions": self.collisions(),
+            "removed": removed,
+            "reassigned": reassigned,
+        }
+
+
+def log_report(report: dict):
+    """Log every problem in the given uid report.
+
+    Args:
+        report (dict): The uid report (see UidRegistry.report).
+    """
+    for (namespace, uids) in report["collisions"].items():
+        for (uid, keys) in uids.items():
+            logger.error(f"[{namespace}] uid '{uid}' collides: {keys}")
+    for (namespace, uids) in report["reassigned"].items():
+        for (uid, change) in uids.items():
+            logger.error(
+                f"[{namespace}] uid '{uid}' was '{change['previous']}' and "
+                f"is now '{change['current']}'."
+            )
+    for (namespace, uids) in report["removed"].items():
+        for (uid, key) in uids.items():
+            logger.warning(f"[{namespace}] uid '{uid}' ({key}) was removed.")
+
+
+def load_uid_index(filename: str):
+    """Load a published uid index.
+
+    Args:
+        filename (str): The filename of uids.json.
+
+    Returns:
+        dict: The index, or None if it does not exist.
+    """
+    try:
+        with open(filename, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
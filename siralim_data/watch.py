@@ -0,0 +1,204 @@
+""" Polling file watcher for rebuilding the data as its inputs change.
+
+The inputs of the stages (the data files and the asset folders) are polled
+for changes in their modification time and size. A burst of changes, e.g.
+an editor saving several files, is coalesced into a single rebuild once no
+more changes have been seen for a short debounce interval. Each changed file
+is mapped to the stages that have it (or a folder containing it) as an
+input, and those stages are rebuilt along with the stages that depend on
+them; every other stage keeps its result from the previous build.
+"""
+
+import os
+import time
+import logging as logger
+
+POLL_INTERVAL = 0.2
+DEBOUNCE_INTERVAL = 0.1
+
+
+def _input_path(path):
+    # (folder, False) inputs only hash the names of the files, but any
+    # change to the folder is still reported.
+    return path[0] if isinstance(path, tuple) else path
+
+
+def snapshot(paths: list):
+    """Return the modification time and size of every file under the given
+    paths. Hidden files and __pycache__ folders are ignored, as when hashing
+    the inputs (see siralim_data.manifest.hash_folder).
+
+    Args:
+        paths (list): The files and folders to snapshot.
+
+    Returns:
+        dict: Map of filename -> (mtime_ns, size).
+    """
+    files = {}
+
+    def scan(folder):
+        try:
+            with os.scandir(folder) as it:
+                for e in it:
+                    if e.name.startswith(".") or e.name == "__pycache__":
+                        continue
+                    if e.is_dir():
+                        scan(e.path)
+                    else:
+                        st = e.stat()
+                        files[e.path] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            pass
+
+    for path in paths:
+        if os.path.isdir(path):
+            scan(path)
+        else:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files[path] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def changed_files(before: dict, after: dict):
+    """Return the files that were added, removed or modified between two
+    snapshots.
+
+    Args:
+        before (dict): The earlier snapshot.
+        after (dict): The later snapshot.
+
+    Returns:
+        set: The changed filenames.
+    """
+    changed = {f for (f, stamp) in after.items() if before.get(f) != stamp}
+    changed.update(f for f in before if f not in after)
+    return changed
+
+
+def affected_stages(stages: list, changed: set):
+    """Map changed files to the stages that must be rebuilt.
+
+    Args:
+        stages (list): The list of stages.
+        changed (set): The changed filenames.
+
+    Returns:
+        set: The names of the stages with a changed input, and of every
+        stage that (transitively) depends on them.
+    """
+    affected = set()
+    for stage in stages:
+        for path in map(_input_path, stage.inputs):
+            prefix = os.path.join(path, "")
+            if any(f == path or f.startswith(prefix) for f in changed):
+                affected.add(stage.name)
+                break
+
+    # Add the dependents, until there are no more.
+    added = True
+    while added:
+        added = False
+        for stage in stages:
+            if stage.name not in affected and any(
+                d in affected for d in stage.requires
+            ):
+                affected.add(stage.name)
+                added = True
+    return affected
+
+
+class Watcher:
+    """Polls the inputs of the stages, and calls a rebuild function with
+    the stages affected by each (coalesced) batch of changes.
+
+    Python files are not watched, as the code that is already loaded
+    cannot be reloaded in-process: restart the watcher after changing them.
+
+    Args:
+        stages (list): The list of stages.
+        rebuild (callable): Called as rebuild(affected, changed) with the
+          names of the affected stages and the changed filenames.
+        interval (float): The time (in seconds) between polls.
+        debounce (float): The time (in seconds) without further changes to
+          wait for before rebuilding.
+    """
+
+    def __init__(
+        self,
+        stages: list,
+        rebuild,
+        interval: float = POLL_INTERVAL,
+        debounce: float = DEBOUNCE_INTERVAL,
+    ):
+        self.stages = stages
+        self.rebuild = rebuild
+        self.interval = interval
+        self.debounce = debounce
+        self.paths = sorted(
+            {
+                _input_path(path)
+                for stage in stages
+                for path in stage.inputs
+                if not _input_path(path).endswith(".py")
+            }
+        )
+        self.outputs = {
+            os.path.normpath(f) for stage in stages for f in stage.outputs
+        }
+        self.pending = set()
+        self.last_change = None
+        self._snapshot = snapshot(self.paths)
+
+    def poll(self, now: float = None):
+        """Check the inputs for changes once, and rebuild if changes have
+        settled for the debounce interval.
+
+        Args:
+            now (float): The current time (defaults to time.monotonic()).
+
+        Returns:
+            set: The names of the stages that were rebuilt (if any).
+        """
+        now = time.monotonic() if now is None else now
+        current = snapshot(self.paths)
+        changed = changed_files(self._snapshot, current)
+        self._snapshot = current
+        if changed:
+            self.pending |= changed
+            self.last_change = now
+        if not self.pending or now - self.last_change < self.debounce:
+            return set()
+
+        (changed, self.pending) = (self.pending, set())
+        affected = affected_stages(self.stages, changed)
+        if affected:
+            self.rebuild(affected, changed)
+            # Ignore the changes made by the rebuild itself to the outputs
+            # of the stages, e.g. files generated by one stage for another.
+            # Inputs edited during the rebuild are still compared against
+            # the snapshot taken before it, so they trigger another rebuild.
+            after = snapshot(self.paths)
+            for f in set(after) | set(current):
+                if os.path.normpath(f) not in self.outputs:
+                    continue
+                if f in after:
+                    self._snapshot[f] = after[f]
+                else:
+                    self._snapshot.pop(f, None)
+        return affected
+
+    def run(self):  # pragma: no cover
+        """Poll the inputs until interrupted (Ctrl+C)."""
+        logger.info(
+            f"Watching {len(self.paths)} inputs for changes, press Ctrl+C "
+            "to stop."
+        )
+        try:
+            while True:
+                time.sleep(self.interval)
+                self.poll()
+        except KeyboardInterrupt:
+            logger.info("Stopped watching.")
@@ -0,0 +1,39 @@
+import os
+
+from siralim_data import assets
+
+
+def test_asset_index_find(tmp_path):
+    """Ensure lookups fall back to case-insensitive and apostrophe-sanitised
+    matches.
+    """
+    for name in ["spr_a.png", "Spr_B.png", "king's_crown.png"]:
+        (tmp_path / name).write_bytes(b"")
+    index = assets.AssetIndex.scan(str(tmp_path))
+    assert index.find("spr_a.png") == "spr_a.png"
+    assert index.find("spr_b.PNG") == "Spr_B.png"
+    assert index.find("Kings_Crown.png") == "king's_crown.png"
+    assert index.find("missing.png") is None
+    assert index.path("spr_a.png") == os.path.join(str(tmp_path), "spr_a.png")
+
+
+def test_get_asset_index_cache(tmp_path):
+    """Ensure the index is cached on disk and rebuilt when files are added."""
+    folder = tmp_path / "sprites"
+    cache_folder = str(tmp_path / "cache")
+    folder.mkdir()
+    (folder / "a.png").write_bytes(b"")
+
+    index = assets.get_asset_index(str(folder), cache_folder)
+    assert "a.png" in index
+    assert assets.get_asset_index(str(folder), cache_folder) is index
+
+    # A fresh process would load the index from the cache.
+    assets._indexes.clear()
+    cached = assets.get_asset_index(str(folder), cache_folder)
+    assert cached is not index and cached.names == index.names
+
+    (folder / "b.png").write_bytes(b"")
+    st = os.stat(folder)
+    os.utime(folder, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert "b.png" in assets.get_asset_index(str(folder), cache_folder)
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from PIL import Image
+
+from siralim_data.atlas import (
+    TileCache,
+    build_atlas,
+    composite_sheet,
+    decode_tiles,
+    pack,
+)
+
+
+def _overlaps(a, b):
+    ((ax, ay, aw, ah), (bx, by, bw, bh)) = (a, b)
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def test_pack():
+    """Ensure packed rectangles fit in their sheet and do not overlap."""
+    sizes = [(64, 64), (32, 48), (64, 32), (16, 16)] * 5
+    placements, sheet_sizes = pack(sizes, 128)
+
+    assert len(sheet_sizes) > 1
+    rects = {}
+    for ((w, h), (sheet, x, y)) in zip(sizes, placements):
+        (sheet_w, sheet_h) = sheet_sizes[sheet]
+        assert x + w <= sheet_w <= 128
+        assert y + h <= sheet_h <= 128
+        rects.setdefault(sheet, []).append((x, y, w, h))
+
+    for sheet_rects in rects.values():
+        for (i, a) in enumerate(sheet_rects):
+            for b in sheet_rects[i + 1 :]:
+                assert not _overlaps(a, b)
+
+
+def test_pack_too_large():
+    """Ensure images bigger than a sheet are rejected."""
+    with pytest.raises(ValueError):
+        pack([(16, 16), (200, 16)], 128)
+
+
+def test_build_atlas(tmp_path):
+    """Ensure each image can be read back from its sheet."""
+    colours = {"a": (255, 0, 0, 255), "b": (0, 255, 0, 255)}
+    images = {}
+    for (name, colour) in colours.items():
+        images[name] = os.path.join(tmp_path, f"{name}.png")
+        Image.new("RGBA", (8, 4), colour).save(images[name])
+
+    coords, filenames = build_atlas(images, tmp_path, "sprites", 64)
+
+    assert filenames == [os.path.join(tmp_path, "sprites_0.png")]
+    with Image.open(filenames[0]) as sheet:
+        for (name, colour) in colours.items():
+            c = coords[name]
+            assert (c["w"], c["h"]) == (8, 4)
+            assert sheet.getpixel((c["x"], c["y"])) == colour
+            assert sheet.getpixel((c["x"] + 7, c["y"] + 3)) == colour
+
+
+def _save_tiles(folder, colours):
+    filenames = []
+    for (i, colour) in enumerate(colours):
+        filenames.append(os.path.join(folder, f"{i}.png"))
+        Image.new("RGBA", (4, 4), colour).save(filenames[-1])
+    return filenames
+
+
+def test_decode_tiles(tmp_path):
+    """Ensure tiles decoded on a process pool match those decoded serially,
+    and that unchanged images are reused from the cache.
+    """
+    filenames = _save_tiles(tmp_path, [(i, 0, 0, 255) for i in range(4)])
+    cache = TileCache(os.path.join(tmp_path, "cache"))
+
+    (serial, _) = decode_tiles(filenames)
+    (parallel, _) = decode_tiles(filenames, cache, jobs=2)
+    assert cache.misses == 4
+    assert {f: t.data for (f, t) in serial.items()} == {
+        f: t.data for (f, t) in parallel.items()
+    }
+
+    (cached, _) = decode_tiles(filenames, cache)
+    assert cache.hits == 4
+    assert {f: t.data for (f, t) in cached.items()} == {
+        f: t.data for (f, t) in serial.items()
+    }
+
+
+def test_tile_cache_eviction(tmp_path):
+    """Ensure the tile cache is kept within its size limit."""
+    filenames = _save_tiles(tmp_path, [(i, 0, 0, 255) for i in range(4)])
+    # Each 4x4 tile takes 8 bytes of header and 64 bytes of pixels.
+    cache = TileCache(os.path.join(tmp_path, "cache"), max_bytes=2 * 72)
+
+    decode_tiles(filenames, cache)
+    assert len(os.listdir(os.path.join(tmp_path, "cache", "tiles"))) == 2
+    (tiles, _) = decode_tiles(filenames, cache)
+    assert cache.hits == 2 and len(tiles) == 4
+
+
+def test_composite_sheet_incremental(tmp_path):
+    """Ensure a sheet is only recomposited when its tiles change."""
+    filenames = _save_tiles(tmp_path, [(255, 0, 0, 255), (0, 0, 255, 255)])
+    cache = TileCache(os.path.join(tmp_path, "cache"))
+    sheet = os.path.join(tmp_path, "sheet.png")
+    tiles = [(filenames[0], (0, 0)), (filenames[1], (4, 0))]
+
+    assert composite_sheet((8, 4), tiles, sheet, cache)
+    assert not composite_sheet((8, 4), tiles, sheet, cache)
+
+    Image.new("RGBA", (4, 4), (0, 255, 0, 255)).save(filenames[1])
+    assert composite_sheet((8, 4), tiles, sheet, cache)
+    with Image.open(sheet) as im:
+        assert im.getpixel((4, 0)) == (0, 255, 0, 255)
+
+    # Moving a tile also changes the layout
+    tiles = [(filenames[1], (0, 0)), (filenames[0], (4, 0))]
+    assert composite_sheet((8, 4), tiles, sheet, cache)
@@ -0,0 +1,25 @@
+from benchmarks.bench_build import compare_results, run_benchmarks
+
+
+def test_run_benchmarks(tmp_path):
+    """Ensure the benchmarks run on a tiny synthetic dataset and record the
+    time and peak memory of every stage.
+    """
+    results = run_benchmarks([0.02], repeat=1, data_folder=str(tmp_path))
+    scale = results["scales"]["0.02x"]
+    assert scale["rows"]["traits"] > 0
+    assert len(scale["stages"]) == 7
+    for stage in scale["stages"].values():
+        assert stage["seconds"] >= 0 and stage["peak_bytes"] > 0
+
+
+def test_compare_results():
+    """Ensure only slowdowns above the threshold count as regressions."""
+
+    def results(seconds):
+        stages = {k: {"seconds": v} for (k, v) in seconds.items()}
+        return {"scales": {"1x": {"stages": stages}}}
+
+    baseline = results({"a": 1.0, "b": 1.0})
+    new = results({"a": 1.1, "b": 1.5, "c": 9.0})
+    assert compare_results(baseline, new, 0.2) == [("1x", "b", 1.0, 1.5)]
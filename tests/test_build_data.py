@@ -1,5 +1,6 @@
 import sys
 import os
+import json
 import pytest
 
 import build_data as bd
@@ -80,3 +81,43 @@ def test_build_data_ok():
 
     # Ensure there are at least 20 relics
     assert len(relics_data) >= 20
+
+
+def test_build_data_incremental():
+    """Ensure a second build with unchanged inputs skips every stage and
+    returns the same data as the first.
+    """
+    output_folder = os.path.join("tests", "output_data")
+    first = bd.build_data(output_folder, force=True)
+    manifest = bd.BuildManifest(output_folder)
+    stages = bd.get_stages(output_folder)
+    outputs = {stage.name: stage.outputs for stage in stages}
+    for stage in stages:
+        # The outputs of the dependencies of a stage are also its inputs.
+        inputs = stage.inputs + sum([outputs[d] for d in stage.requires], [])
+        assert manifest.is_up_to_date(stage.name, inputs, stage.outputs)
+
+    # Outputs are reloaded from JSON, so compare the JSON round trip.
+    second = bd.build_data(output_folder, jobs=4)
+    assert list(second) == json.loads(json.dumps(first))
+
+
+def test_iter_csv_file(tmp_path):
+    """Ensure the streaming loader derives the uid and search text of each
+    row, and rejects a compendium with missing columns.
+    """
+    filename = tmp_path / "traits.csv"
+    filename.write_text(
+        "Siralim Ultimate,,Version 9.9.9,,\n"
+        "Class,Family,Creature,Trait Name,Trait Description,Material Name\n"
+        "Death,faMily_1,CreaturE_1,traiT_1, Desc ,Mat\n"
+    )
+    (record,) = list(bd.iter_csv_file(str(filename)))
+    assert record.uid == "1a097f"
+    assert record.trait_description == "Desc"
+    assert record.search_text == "Death CreaturE_1 faMily_1 traiT_1  Desc  Mat"
+    assert bd.read_compendium_version(str(filename)) == "9.9.9"
+
+    filename.write_text("Version 9.9.9,\nClass,Family,Creature\n")
+    with pytest.raises(ValueError):
+        next(bd.iter_csv_file(str(filename)))
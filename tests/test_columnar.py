@@ -0,0 +1,79 @@
+import os
+
+from siralim_data.columnar import (
+    ColumnarData,
+    chunk_filenames,
+    save_columnar,
+)
+
+
+ROWS = [
+    {
+        "class": "Death",
+        "family": "Abomination",
+        "trait_description": "desc 1",
+        "uid": "aaaaaa",
+        "stats": {"health": 1, "total": 2},
+        "sources": ["Everywhere", "Nowhere"],
+    },
+    {
+        "class": "Backer",
+        "family": "Abomination",
+        "trait_description": "desc 2",
+        "uid": "bbbbbb",
+    },
+    {
+        "class": "Death",
+        "family": "Bird",
+        "trait_description": "desc 3",
+        "uid": "cccccc",
+        "stats": {"health": 3, "total": 4},
+        "sources": ["Nowhere"],
+    },
+]
+
+
+def test_columnar_round_trip(tmp_path):
+    """Ensure the columnar layout decodes back to the original rows, and that
+    low-cardinality fields are dictionary-encoded.
+    """
+    header = save_columnar(ROWS, str(tmp_path), chunk_size=2)
+    assert header["columns"]["class"] == [0, 1, 0]
+    assert header["columns"]["sources"] == [[0, 1], None, [1]]
+    assert "trait_description" not in header["columns"]
+
+    data = ColumnarData(os.path.join(str(tmp_path), "data.columnar.json"))
+    assert len(data) == 3
+    assert data.rows() == ROWS
+
+
+def test_columnar_lazy_chunks(tmp_path):
+    """Ensure chunks are only loaded when needed."""
+    save_columnar(ROWS, str(tmp_path), chunk_size=2)
+    os.remove(os.path.join(str(tmp_path), "data.trait_description.0.json"))
+
+    data = ColumnarData(os.path.join(str(tmp_path), "data.columnar.json"))
+    assert data.value("trait_description", 2) == "desc 3"
+    assert data.rows(["uid", "family"])[1] == {
+        "uid": "bbbbbb",
+        "family": "Abomination",
+    }
+
+
+def test_columnar_chunk_filenames(tmp_path):
+    """Ensure the default chunks have fixed filenames, and that chunks left
+    over from a previous layout are removed.
+    """
+    save_columnar(ROWS, str(tmp_path), chunk_size=1)
+    assert os.path.exists(tmp_path / "data.trait_description.2.json")
+
+    save_columnar(ROWS, str(tmp_path), chunk_count=2)
+    chunks = sorted(
+        f for f in os.listdir(str(tmp_path)) if f != "data.columnar.json"
+    )
+    assert chunks == chunk_filenames(
+        chunked_fields=["trait_description"], chunk_count=2
+    )
+
+    data = ColumnarData(os.path.join(str(tmp_path), "data.columnar.json"))
+    assert data.rows() == ROWS
@@ -0,0 +1,87 @@
+import gzip
+
+import pytest
+
+import build_data as bd
+from siralim_data import compress
+from siralim_data.compress import (
+    SizeBudgetError,
+    check_budgets,
+    parse_budget,
+    parse_size,
+    precompress,
+    select_encodings,
+)
+
+
+def test_precompress(tmp_path):
+    """Ensure siblings are written, and only rewritten when the contents of
+    their artifact change.
+    """
+    a = str(tmp_path / "a.json")
+    b = str(tmp_path / "b.json")
+    record_filename = str(tmp_path / "precompressed.json")
+    for filename in (a, b):
+        with open(filename, "w") as f:
+            f.write("[" + ",".join(["1"] * 1000) + "]")
+
+    record, compressed = precompress([a, b], ["gzip"], record_filename, 2)
+    assert compressed == [a, b]
+    with gzip.open(a + ".gz", "rt") as f:
+        assert f.read().startswith("[1,1,")
+    assert record[a]["bytes"] == 2001
+    assert record[a]["sizes"]["gzip"] < 100
+
+    with open(b, "w") as f:
+        f.write("[2]")
+    record, compressed = precompress([a, b], ["gzip"], record_filename)
+    assert compressed == [b] and record[b]["bytes"] == 3
+
+    # A missing sibling is written again.
+    (tmp_path / "a.json.gz").unlink()
+    _, compressed = precompress([a, b], ["gzip"], record_filename)
+    assert compressed == [a]
+
+
+def test_budgets():
+    """Ensure budgets are parsed, and checked against the artifacts and
+    their siblings.
+    """
+    assert parse_size("120") == 120
+    assert parse_size("1.5K") == 1536 and parse_size("2MB") == 2 * 1024**2
+    assert parse_budget("data.json.gz=1k") == ("data.json.gz", 1024)
+    with pytest.raises(ValueError):
+        parse_budget("data.json.gz")
+    with pytest.raises(ValueError):
+        parse_size("big")
+
+    record = {"out/data.json": {"bytes": 5000, "sizes": {"gzip": 900}}}
+    assert check_budgets(record, {"data.json.gz": 1000}) == {}
+    assert check_budgets(
+        record, {"data.json": 4000, "data.json.gz": 800, "x.br": 1}
+    ) == {"data.json": (5000, 4000), "data.json.gz": (900, 800)}
+
+
+def test_build_precompressed(tmp_path):
+    """Ensure the build fails when an artifact is over its budget."""
+    filename = str(tmp_path / "data.json")
+    with open(filename, "w") as f:
+        f.write("[]")
+    record = bd.build_precompressed(str(tmp_path), [filename], ["gzip"])
+    assert record[filename]["bytes"] == 2
+    with pytest.raises(SizeBudgetError) as e:
+        bd.build_precompressed(
+            str(tmp_path), [filename], ["gzip"], {"data.json": 1}
+        )
+    assert e.value.over == {"data.json": (2, 1)}
+
+
+def test_select_encodings_without_brotli(monkeypatch, caplog):
+    """Ensure a missing brotli package is reported rather than silently
+    producing no .br siblings.
+    """
+    monkeypatch.setattr(compress, "brotli", None)
+    assert select_encodings({"data.json.gz": 1}) == ["gzip"]
+    assert "brotli" in caplog.text
+    with pytest.raises(ValueError):
+        select_encodings({"data.json.br": 1})
@@ -0,0 +1,121 @@
+import os
+import sys
+import importlib
+
+from siralim_data.csv_cache import CsvCache
+
+
+def test_cached_loader(tmp_path):
+    """Ensure results are cached until the contents of the file change."""
+    cache = CsvCache(str(tmp_path / "cache"))
+    calls = []
+
+    @cache.cached()
+    def load(filename, upper=False):
+        calls.append(filename)
+        with open(filename) as f:
+            text = f.read()
+        return text.upper() if upper else text
+
+    filename = str(tmp_path / "data.csv")
+    with open(filename, "w") as f:
+        f.write("a,b")
+
+    assert load(filename) == "a,b"
+    assert load(filename) == "a,b"
+    assert load(filename, upper=True) == "A,B"
+    assert len(calls) == 2 and cache.hits == 1
+
+    with open(filename, "w") as f:
+        f.write("c,d")
+    assert load(filename) == "c,d"
+    assert len(calls) == 3
+
+
+def test_cached_module_source(tmp_path, monkeypatch):
+    """Ensure cached results are invalidated when a helper in the module of
+    the loader changes, even if the loader itself does not.
+    """
+    cache = CsvCache(str(tmp_path / "cache"))
+    module_filename = tmp_path / "cached_loader.py"
+    source = (
+        "SUFFIX = {!r}\n"
+        "\n"
+        "def load(cache):\n"
+        "    @cache.cached()\n"
+        "    def load():\n"
+        "        return 'a' + SUFFIX\n"
+        "    return load\n"
+    )
+    module_filename.write_text(source.format("b"))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("cached_loader")
+    try:
+        assert module.load(cache)() == "ab"
+        assert module.load(cache)() == "ab" and cache.hits == 1
+
+        # A different size, so that the cached bytecode is not reused.
+        module_filename.write_text(source.format("cd"))
+        module = importlib.reload(module)
+        assert module.load(cache)() == "acd" and cache.misses == 2
+    finally:
+        sys.modules.pop("cached_loader", None)
+
+
+def test_cached_generator(tmp_path):
+    """Ensure generator items are cached as they were yielded, even if the
+    consumer modifies them afterwards.
+    """
+    cache = CsvCache(str(tmp_path / "cache"))
+
+    @cache.cached()
+    def rows(n):
+        for i in range(n):
+            yield {"i": i}
+
+    first = list(rows(3))
+    for row in first:
+        row["modified"] = True
+    assert list(rows(3)) == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert cache.hits == 1
+
+
+def test_eviction(tmp_path):
+    """Ensure the least recently used entries are evicted first."""
+    cache = CsvCache(str(tmp_path))
+    for key in ["a", "b", "c"]:
+        cache.put(key, b"x" * 1000)
+        path = os.path.join(str(tmp_path), f"{key}.pickle")
+        os.utime(path, (0, {"a": 1, "b": 2, "c": 3}[key]))
+    assert cache.get("a")[0]  # "a" is now the most recently used.
+
+    cache.max_bytes = 2500
+
+    cache.put("d", b"x" * 1000)
+    remaining = sorted(os.listdir(str(tmp_path)))
+    assert remaining == ["a.pickle", "d.pickle"]
+
+
+def test_in_memory(tmp_path):
+    """Ensure entries kept in memory are loaded without reading the cache
+    folder, and are copies that the consumer can modify.
+    """
+    cache = CsvCache(str(tmp_path / "cache"))
+    cache.in_memory = True
+
+    @cache.cached()
+    def load(filename):
+        with open(filename) as f:
+            return {"text": f.read()}
+
+    filename = str(tmp_path / "data.csv")
+    with open(filename, "w") as f:
+        f.write("a,b")
+    load(filename)["text"] = "modified"
+    for name in os.listdir(tmp_path / "cache"):
+        os.remove(tmp_path / "cache" / name)
+    assert load(filename) == {"text": "a,b"} and cache.hits == 1
+
+    with open(filename, "w") as f:
+        f.write("c,d,e")
+    assert load(filename) == {"text": "c,d,e"} and cache.misses == 2
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+
+import pytest
+
+from siralim_data.database import export_database, fts_query, search_traits
+
+TRAITS = [
+    {
+        "class": "Death",
+        "family": "Abomination",
+        "creature": "Abomination Brute",
+        "trait_name": "Flesh Rot",
+        "trait_description": "Afflicts enemies with Weak or Vulnerable.",
+        "material_name": "Brute Stitches",
+        "uid": "2788f5",
+        "stats": {"health": 42, "attack": 22, "total": 64},
+        "sources": ["Torture Chamber", "Titan's Wound"],
+    },
+    {
+        "class": "Chaos",
+        "family": "Efreet",
+        "creature": "Wildfire Efreet",
+        "trait_name": "Ashes to Ashes",
+        "trait_description": "Burning enemies take more damage.",
+        "material_name": "Cinders",
+        "uid": "42d8f1",
+        "sources": ["Titan's Wound"],
+    },
+]
+SPECIALIZATIONS = [
+    {
+        "name": "Hell Knight",
+        "abbreviation": "HK",
+        "description": "Attacks.",
+        "perks": [
+            {
+                "name": "Blazing Soul",
+                "ranks": "1",
+                "cost_per_rank": "100",
+                "anointment": "Yes",
+                "description": "Burning.",
+                "uid": "HKA",
+            }
+        ],
+    }
+]
+RELICS = [
+    {
+        "name": "Relic",
+        "abbreviation": "R",
+        "stat_bonus": "Defense",
+        "uid": "el",
+        "perks": [{"rank": "10", "description": "Rank 10."}],
+    }
+]
+SPELLS = [
+    {
+        "name": "Fireball",
+        "class": "Chaos",
+        "charges": "15",
+        "description": "Burns.",
+        "uid": "f",
+    }
+]
+
+
+def test_export_database(tmp_path):
+    """Ensure the data is normalized into the tables, numbers are stored
+    as integers, and the traits can be searched.
+    """
+    filename = str(tmp_path / "siralim.sqlite")
+    counts = export_database(
+        filename, TRAITS, SPECIALIZATIONS, RELICS, SPELLS, {"version": "1"}
+    )
+    assert counts["traits"] == 2 and counts["trait_stats"] == 1
+    assert counts["sources"] == 2 and counts["trait_sources"] == 3
+
+    # Exporting again replaces the database.
+    export_database(filename, TRAITS, SPECIALIZATIONS, RELICS, SPELLS)
+
+    conn = sqlite3.connect(filename)
+    assert conn.execute(
+        "SELECT t.creature FROM traits t "
+        "JOIN trait_sources ts ON ts.trait_id = t.id "
+        "JOIN sources s ON s.id = ts.source_id "
+        "WHERE s.name = ? ORDER BY t.id",
+        ("Titan's Wound",),
+    ).fetchall() == [("Abomination Brute",), ("Wildfire Efreet",)]
+    assert conn.execute(
+        "SELECT p.ranks, p.cost_per_rank, p.anointment, s.abbreviation "
+        "FROM perks p JOIN specializations s ON s.id = p.specialization_id"
+    ).fetchall() == [(1, 100, 1, "HK")]
+    assert conn.execute("SELECT rank FROM relic_perks").fetchall() == [(10,)]
+    assert conn.execute("SELECT charges FROM spells").fetchall() == [(15,)]
+
+    assert search_traits(conn, "burning") == [
+        ("42d8f1", "Wildfire Efreet", "Ashes to Ashes")
+    ]
+    assert [r[0] for r in search_traits(conn, "brute stitch")] == ["2788f5"]
+    assert search_traits(conn, '"unbalanced') == []
+    assert search_traits(conn, " ") == []
+
+
+def test_export_database_failure(tmp_path):
+    """Ensure a failed export leaves neither the database nor its
+    temporary file behind.
+    """
+    filename = str(tmp_path / "siralim.sqlite")
+    traits = [{k: v for (k, v) in TRAITS[0].items() if k != "uid"}]
+    with pytest.raises(KeyError):
+        export_database(filename, traits, SPECIALIZATIONS, RELICS, SPELLS)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_fts_query():
+    """Ensure free text is quoted, with the last word as a prefix."""
+    assert fts_query('fire "ball') == '"fire" """ball"*'
+    assert fts_query("") is None
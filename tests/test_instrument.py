@@ -0,0 +1,59 @@
+import json
+import time
+
+from siralim_data import instrument
+
+
+def _slow(items, seconds):
+    for item in items:
+        time.sleep(seconds)
+        yield item
+
+
+def test_metered_exclusive_time():
+    """Ensure chained metered generators record their own time, excluding
+    the time spent in the generators they pull from.
+    """
+    recorder = instrument.Recorder()
+    instrument.enable(recorder)
+    try:
+        items = instrument.metered(_slow(range(5), 0.02), "load")
+        items = instrument.metered(_slow(items, 0.0), "enrich")
+        assert list(items) == list(range(5))
+    finally:
+        instrument.disable()
+
+    spans = {s.name: s for s in recorder.spans}
+    assert spans["load"].rows == spans["enrich"].rows == 5
+    assert spans["load"].wall_seconds >= 0.1
+    assert spans["enrich"].wall_seconds < 0.05
+
+
+def test_disabled_is_noop():
+    """Ensure nothing is recorded (or wrapped) without an active recorder."""
+    items = iter([1, 2])
+    assert instrument.metered(items, "load") is items
+    with instrument.span("serialize") as span:
+        span.add_rows(2)
+
+
+def test_recorder_report(tmp_path):
+    """Ensure stages are profiled and reported."""
+    recorder = instrument.Recorder(
+        profile_folder=str(tmp_path), trace_memory=True
+    )
+    with recorder.stage("stage") as span:
+        filename = tmp_path / "out.json"
+        filename.write_text("[1, 2, 3]")
+        span.add_output(str(filename))
+        span.add_rows(3)
+    recorder.skipped("other")
+
+    recorder.save(str(tmp_path / "report.json"))
+    with open(tmp_path / "report.json") as f:
+        report = json.load(f)
+    (other, stage) = report["spans"]
+    assert other["skipped"]
+    assert stage["rows"] == 3 and stage["bytes_written"] == 9
+    assert stage["traced_peak_bytes"] >= 0
+    assert (tmp_path / "stage.prof").is_file()
@@ -0,0 +1,55 @@
+from siralim_data.join import JoinIndex, normalize_key
+
+
+def test_normalize_key():
+    """Ensure case, accents, apostrophes, punctuation and the (ASCENSION)
+    suffix are ignored.
+    """
+    assert normalize_key("Hellion (ASCENSION)") == "hellion"
+    assert normalize_key("Kin’s  Blessing") == normalize_key("kins blessing")
+    assert normalize_key("Déjà-Vu!") == "deja vu"
+
+
+def test_join_index():
+    """Ensure each pass of the join is used in order, and recorded."""
+    index = JoinIndex(
+        [("Master of Minds", 1), ("Blazing Soul", 2), ("Bolster", 3)],
+        name="test",
+    )
+
+    assert index.match("master of minds").method == "exact"
+    assert index.match("Sorcery") is None
+
+    match = index.match("Blazing-soul")
+    assert (match.value, match.method, match.confidence) == (
+        2,
+        "normalized",
+        1.0,
+    )
+
+    match = index.match("Master of Mindz")
+    assert (match.matched_key, match.method) == ("Master of Minds", "fuzzy")
+    assert 0.7 <= match.confidence < 1
+
+    assert index.get("Something else entirely") is None
+    assert index.get("Bolsterr", fuzzy=False, report=False) is None
+
+    report = index.report.to_json()
+    assert report["counts"] == {
+        "exact": 1,
+        "unmatched": 2,
+        "normalized": 1,
+        "fuzzy": 1,
+    }
+    assert report["unmatched"] == ["Sorcery", "Something else entirely"]
+    assert [m["method"] for m in report["inexact"]] == ["fuzzy", "normalized"]
+
+
+def test_join_index_blocks():
+    """Ensure the leading elements of tuple keys must match exactly."""
+    index = JoinIndex(
+        [(("Reaver", "Hellion"), "a"), (("Hell Knight", "Hellion"), "b")]
+    )
+    assert index.get(("Hell Knight", "Hellion (ASCENSION)")) == "b"
+    assert index.get(("Reaver", "Helion")) == "a"
+    assert index.get(("Pyromancer", "Hellion")) is None
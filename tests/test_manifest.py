@@ -0,0 +1,40 @@
+from siralim_data.manifest import BuildManifest, hash_folder
+
+
+def test_hash_folder_names_only(tmp_path):
+    """Ensure a names-only folder hash ignores the contents of the files."""
+    (tmp_path / "a.png").write_bytes(b"1")
+    h = hash_folder(str(tmp_path), contents=False)
+    (tmp_path / "a.png").write_bytes(b"2")
+    assert hash_folder(str(tmp_path), contents=False) == h
+    assert hash_folder(str(tmp_path)) != h
+
+
+def test_manifest_up_to_date(tmp_path):
+    """Ensure a stage is only up to date while its inputs and outputs are
+    unchanged, and that the manifest persists between builds.
+    """
+    inp = tmp_path / "input.csv"
+    out = tmp_path / "output.json"
+    inp.write_text("a,b\n")
+    out.write_text("[]")
+    inputs, outputs = [str(inp)], [str(out)]
+
+    manifest = BuildManifest(str(tmp_path))
+    assert not manifest.is_up_to_date("stage", inputs, outputs)
+    manifest.record("stage", inputs, outputs)
+    manifest.save()
+
+    manifest = BuildManifest(str(tmp_path))
+    assert manifest.is_up_to_date("stage", inputs, outputs)
+
+    out.write_text("[1]")
+    assert not BuildManifest(str(tmp_path)).is_up_to_date(
+        "stage", inputs, outputs
+    )
+
+    out.write_text("[]")
+    inp.write_text("a,b,c\n")
+    assert not BuildManifest(str(tmp_path)).is_up_to_date(
+        "stage", inputs, outputs
+    )
@@ -0,0 +1,153 @@
+import json
+import os
+
+import pytest
+
+from siralim_data.party import (
+    PartyStringError,
+    PartyValidator,
+    get_trait_errors,
+    parse_party_string,
+    validate_file,
+)
+
+TRAITS = [
+    {
+        "class": "Nature",
+        "trait_name": "Bolster",
+        "material_name": "Bolster Stone",
+        "uid": "aaa",
+    },
+    {
+        "class": "Backer",
+        "trait_name": "Backer Trait",
+        "material_name": "N/A",
+        "uid": "bbb",
+    },
+]
+SPECIALIZATIONS = [
+    {
+        "name": "Hell Knight",
+        "abbreviation": "HK",
+        "perks": [
+            {"name": "Blazing Soul", "anointment": "Yes", "uid": "HKA"},
+            {"name": "Hellion", "anointment": "No", "uid": "HKB"},
+        ],
+    }
+]
+RELICS = [{"name": "Relic of Things", "uid": "rt"}]
+SPELLS = [{"name": "Fireball", "uid": "f1"}]
+
+BUILD = """Hero, the Hell Knight (Ascended)
+Anointments: Blazing Soul, Hellion
+========== CREATURES ==========
+Innate Trait: Bolster
+Fused Trait: Backer Trait
+Trait Slot: Bolster: 10%
+Relic: Relic of Things (Rank 10)
+Spell Gems:
+Fireball
+Frostbolt
+
+------------------------------
+Innate Trait: Unknown Trait
+------------------------------
+"""
+
+
+def test_parse_party_string():
+    """Ensure build strings are parsed like parsePartyString.js."""
+    party = parse_party_string(BUILD)
+    assert party["spec"] == "Hell Knight"
+    assert party["anointment_names"] == ["Blazing Soul", "Hellion"]
+    assert party["traits"][:6] == [
+        "Bolster",
+        "Backer Trait",
+        "Bolster",
+        "Unknown Trait",
+        None,
+        None,
+    ]
+    assert party["traits"][6:] == [None] * 12
+    assert party["relics"] == ["Relic of Things"] + [None] * 5
+    assert party["raw_spells"][:2] == [["Fireball", "Frostbolt"], []]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Not a build",
+        "Anointments: A, A\n========== CREATURES ==========\n",
+        "========== CREATURES ==========\n" + "-" * 30 * 7,
+        "========== CREATURES ==========\nInnate Trait: A\nInnate Trait: B",
+        "========== CREATURES ==========\nRelic: A\n",
+    ],
+)
+def test_parse_party_string_errors(text):
+    with pytest.raises(PartyStringError):
+        parse_party_string(text)
+
+
+def test_get_trait_errors():
+    """Ensure trait slot rules match getTraitErrors.js."""
+    assert get_trait_errors(None, 0) is None
+    assert get_trait_errors(TRAITS[0], 0) is None
+    assert get_trait_errors(TRAITS[1], 2) is not None  # No material
+    assert get_trait_errors(TRAITS[1], 1) is not None  # Not on a creature
+    trait = {"class": "Nature", "material_name": "N/A"}
+    assert get_trait_errors(trait, 1) is None
+
+
+def test_validate():
+    validator = PartyValidator(TRAITS, SPECIALIZATIONS, RELICS, SPELLS)
+    result = validator.validate(BUILD)
+
+    assert not result["valid"]
+    assert result["traits"][:4] == ["aaa", "bbb", "aaa", "<not found>"]
+    assert result["specialization"] == "HK"
+    assert result["anointments"] == ["HKA"]
+    assert result["relics"][0] == "rt"
+    assert result["spells"][0] == ["f1", None]
+    assert len(result["errors"]) == 2  # Backer Trait, Frostbolt
+    assert len(result["warnings"]) == 2  # Unknown Trait, Hellion
+
+    result = validator.validate("Not a build")
+    assert result == {
+        "valid": False,
+        "errors": [
+            "The string does not appear to be a valid Siralim Ultimate build "
+            "string."
+        ],
+        "warnings": [],
+    }
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_validate_file(tmp_path, jobs):
+    """Ensure batch validation keeps the order and ids of the builds."""
+    for (filename, data) in [
+        ("data.json", TRAITS),
+        ("specializations.json", SPECIALIZATIONS),
+        ("relics.json", RELICS),
+        ("spells.json", SPELLS),
+    ]:
+        with open(os.path.join(tmp_path, filename), "w") as f:
+            json.dump(data, f)
+
+    valid = BUILD.replace("Fused Trait: Backer Trait\n", "").replace(
+        "Frostbolt\n", ""
+    )
+    builds = os.path.join(tmp_path, "builds.jsonl")
+    with open(builds, "w") as f:
+        for i in range(10):
+            f.write(json.dumps({"id": f"b{i}", "build": BUILD}) + "\n")
+            f.write(json.dumps(valid) + "\n")
+
+    output = os.path.join(tmp_path, "diagnostics.jsonl")
+    counts = validate_file(builds, output, tmp_path, jobs, chunk_size=3)
+
+    assert counts == {"builds": 20, "valid": 10}
+    with open(output) as f:
+        results = [json.loads(line) for line in f]
+    assert [r["id"] for r in results[:4]] == ["b0", 2, "b1", 4]
+    assert [r["valid"] for r in results] == [False, True] * 10
@@ -0,0 +1,158 @@
+import itertools
+import random
+
+import pytest
+
+from siralim_data.party_search import (
+    CHECK_INTERVAL,
+    PartySearch,
+    search_parties,
+)
+
+CLASSES = ["Chaos", "Death", "Life", "Nature", "Sorcery"]
+STATS = ["health", "attack", "intelligence", "defense", "speed"]
+
+
+def make_traits(n=30, seed=0):
+    rng = random.Random(seed)
+    traits = []
+    for i in range(n):
+        stats = {s: rng.randint(5, 30) for s in STATS}
+        stats["total"] = sum(stats.values())
+        traits.append(
+            {
+                "uid": f"t{i:02d}",
+                "class": CLASSES[i % len(CLASSES)],
+                "family": f"Family {i % 4}",
+                "creature": f"Creature {i}",
+                "trait_name": f"Trait {i}",
+                "material_name": f"Material {i}" if i % 3 else "N/A",
+                "stats": stats,
+            }
+        )
+    traits.append(
+        {
+            "uid": "backer",
+            "class": "Backer",
+            "family": "Backer",
+            "creature": "Backer",
+            "trait_name": "Backer Trait",
+            "material_name": "Backer Stone",
+        }
+    )
+    return traits
+
+
+def brute_force(traits, k, class_counts={}, min_stats={}, weights=None):
+    weights = weights or {"total": 1}
+    creatures = [t for t in traits if t.get("stats")]
+    parties = []
+    class_counts = {
+        c: (v, v) if isinstance(v, int) else v
+        for (c, v) in class_counts.items()
+    }
+    for party in itertools.combinations(creatures, 6):
+        counts = {}
+        for t in party:
+            counts[t["class"]] = counts.get(t["class"], 0) + 1
+        if any(
+            not low <= counts.get(c, 0) <= high
+            for (c, (low, high)) in class_counts.items()
+        ):
+            continue
+        if any(
+            sum(t["stats"][s] for t in party) < low
+            for (s, low) in min_stats.items()
+        ):
+            continue
+        parties.append(
+            sum(w * t["stats"][s] for t in party for (s, w) in weights.items())
+        )
+    return sorted(parties, reverse=True)[:k]
+
+
+@pytest.mark.parametrize(
+    "constraints",
+    [
+        {},
+        {"class_counts": {"Chaos": 3, "Life": (0, 1)}},
+        {"min_stats": {"speed": 130, "defense": 120}},
+        {"min_stats": {"speed": 125, "defense": 125, "attack": 120}},
+        {
+            "class_counts": {"Nature": (2, 6)},
+            "min_stats": {"attack": 110},
+            "weights": {"intelligence": 1, "health": 0.5},
+        },
+    ],
+)
+def test_search_matches_brute_force(constraints):
+    traits = make_traits(18)
+    result = PartySearch(traits, 15, **constraints).search()
+    assert result["complete"]
+    scores = [p["score"] for p in result["parties"]]
+    assert scores == brute_force(traits, 15, **constraints)
+
+
+def test_search_parties_jobs():
+    traits = make_traits(40, seed=1)
+    constraints = {"min_stats": {"speed": 120}, "class_counts": {"Death": 2}}
+    serial = search_parties(traits, 8, **constraints)
+    parallel = search_parties(traits, 8, jobs=3, **constraints)
+    assert parallel["parties"] == serial["parties"]
+    assert parallel["complete"]
+
+
+def test_class_counts_of_innate():
+    """Ensure the required creatures count towards the class maximums."""
+    traits = make_traits()
+    # t00 and t05 are both Chaos creatures.
+    innate = ["t00", "t05"]
+    with pytest.raises(ValueError, match="class 'Chaos'"):
+        search_parties(traits, 1, innate=innate, class_counts={"Chaos": 1})
+    result = search_parties(
+        traits, 1, innate=innate, class_counts={"Chaos": (0, 2)}
+    )
+    classes = {t["uid"]: t["class"] for t in traits}
+    party = [c["innate"] for c in result["parties"][0]["creatures"]]
+    assert [classes[uid] for uid in party].count("Chaos") == 2
+
+
+def test_required_traits():
+    traits = make_traits()
+    # Trait 0 has no material, so it must be fused; the backer trait is not
+    # a creature's, so it must be the artifact.
+    result = search_parties(
+        traits, 3, required=["Trait 0", "backer"], innate=["t05"]
+    )
+    for party in result["parties"]:
+        creatures = party["creatures"]
+        assert creatures[0]["innate"] == "t05"
+        slots = [(c["fused"], c["artifact"]) for c in creatures]
+        if "t00" not in [c["innate"] for c in creatures]:
+            assert ("t00", "backer") in slots
+        assert sum(c["artifact"] == "backer" for c in creatures) == 1
+
+
+def test_invalid_constraints():
+    traits = make_traits()
+    traits[-1]["material_name"] = "N/A"
+    with pytest.raises(ValueError, match="any slot"):
+        PartySearch(traits, required=["backer"])
+    with pytest.raises(ValueError, match="Unknown trait"):
+        PartySearch(traits, required=["Missing"])
+    with pytest.raises(ValueError, match="Unknown stat"):
+        PartySearch(traits, min_stats={"luck": 1})
+    with pytest.raises(ValueError, match="fit"):
+        PartySearch(traits, required=[f"t{i:02d}" for i in range(0, 21, 3)])
+
+
+def test_time_budget():
+    search = PartySearch(
+        make_traits(60),
+        50,
+        min_stats={"speed": 140, "defense": 140, "attack": 130},
+    )
+    result = search.search(time_budget=0)
+    # The budget is checked every CHECK_INTERVAL nodes.
+    assert not result["complete"]
+    assert result["nodes"] == CHECK_INTERVAL
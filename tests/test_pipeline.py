@@ -0,0 +1,122 @@
+import json
+import threading
+
+import pytest
+
+from siralim_data.manifest import BuildManifest
+from siralim_data.pipeline import Stage, run_stages, sort_stages
+
+
+def _write(output_folder, name, value):
+    with open(f"{output_folder}/{name}.json", "w") as f:
+        json.dump(value, f)
+    return value
+
+
+def test_sort_stages_cycle():
+    """Ensure cycles and unknown dependencies are reported."""
+    a = Stage("a", None, [], [], ["b"])
+    b = Stage("b", None, [], [], ["a"])
+    with pytest.raises(ValueError):
+        sort_stages([a, b])
+    with pytest.raises(ValueError):
+        sort_stages([Stage("a", None, [], [], ["missing"])])
+
+
+def test_run_stages(tmp_path):
+    """Ensure independent stages run concurrently, dependents receive the
+    results of their dependencies, and dependents are rebuilt when a
+    dependency is rebuilt.
+    """
+    folder = str(tmp_path)
+    barrier = threading.Barrier(2, timeout=5)
+    check_concurrency = True
+    calls = []
+
+    def independent(name):
+        def func(output_folder):
+            calls.append(name)
+            if check_concurrency:
+                barrier.wait()  # Times out unless both stages run at once.
+            return _write(output_folder, name, [name])
+
+        return func
+
+    def joined(output_folder, a, b):
+        calls.append("c")
+        return _write(output_folder, "c", a + b)
+
+    stages = [
+        Stage("c", joined, [], [f"{folder}/c.json"], ["a", "b"]),
+        Stage("a", independent("a"), [], [f"{folder}/a.json"]),
+        Stage("b", independent("b"), [], [f"{folder}/b.json"]),
+    ]
+    results, timings = run_stages(stages, folder, BuildManifest(folder), 2)
+    assert results["c"] == ["a", "b"]
+    assert set(timings) == {"a", "b", "c"}
+
+    # Nothing changed, so nothing is rebuilt.
+    calls.clear()
+    results, _ = run_stages(stages, folder, BuildManifest(folder), 2)
+    assert calls == [] and results["c"] == ["a", "b"]
+
+    # Changing the input of a rebuilds both it and its dependents.
+    check_concurrency = False
+    _write(folder, "input", "a")
+    stages[1].inputs = [f"{folder}/input.json"]
+    stages[1].func = lambda output_folder: _write(output_folder, "a", ["x"])
+    results, _ = run_stages(stages, folder, BuildManifest(folder), 2)
+    assert calls == ["c"] and results["c"] == ["x", "b"]
+
+
+def test_run_stages_after(tmp_path):
+    """Ensure a stage runs after the stages it is declared to come after,
+    without receiving their results, and is rebuilt when they are.
+    """
+    folder = str(tmp_path)
+    calls = []
+
+    def generate(output_folder):
+        calls.append("gen")
+        with open(f"{output_folder}/gen.txt", "w") as f:
+            f.write("generated")
+
+    def consume(output_folder):
+        calls.append("use")
+        with open(f"{output_folder}/gen.txt", "r") as f:
+            return _write(output_folder, "use", f.read())
+
+    stages = [
+        Stage("use", consume, [], [f"{folder}/use.json"], after=["gen"]),
+        Stage("gen", generate, [], [f"{folder}/gen.txt"]),
+    ]
+    results, _ = run_stages(stages, folder, BuildManifest(folder))
+    assert calls == ["gen", "use"]
+    assert results == {"gen": None, "use": "generated"}
+
+    # The skipped generator has no result, and nothing is rebuilt.
+    calls.clear()
+    results, _ = run_stages(stages, folder, BuildManifest(folder))
+    assert calls == [] and results == {"gen": None, "use": "generated"}
+
+
+def test_run_stages_results(tmp_path):
+    """Ensure stages with a known result are not run, and their results
+    are passed to their dependents.
+    """
+    folder = str(tmp_path)
+    calls = []
+
+    def use(output_folder, a):
+        calls.append("b")
+        return _write(output_folder, "b", a + ["b"])
+
+    stages = [
+        Stage("a", None, [], [f"{folder}/a.json"]),
+        Stage("b", use, [], [f"{folder}/b.json"], ["a"]),
+    ]
+    results, timings = run_stages(
+        stages, folder, BuildManifest(folder), results={"a": ["a"]}
+    )
+    assert calls == ["b"] and results == {"a": ["a"], "b": ["a", "b"]}
+    assert list(timings) == ["b"]
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from siralim_data.releases import (
+    apply_delta,
+    diff_records,
+    load_release,
+    plan_update,
+    publish_release,
+)
+
+SPELLS = [
+    {"uid": "a", "name": "Fireball", "charges": 3},
+    {"uid": "b", "name": "Frostbolt", "charges": 2, "class": "Nature"},
+    {"uid": "c", "name": "Heal", "charges": 5},
+]
+
+
+@pytest.mark.parametrize(
+    "new",
+    [
+        SPELLS,
+        # Changed and removed fields.
+        [SPELLS[0], {"uid": "b", "name": "Frostbolt"}, SPELLS[2]],
+        # Added and removed records.
+        [SPELLS[0], SPELLS[2], {"uid": "d", "name": "Smite", "charges": 1}],
+        # Inserted records.
+        [{"uid": "d", "name": "Smite"}, SPELLS[0], SPELLS[1], SPELLS[2]],
+        # Reordered records and fields.
+        [SPELLS[2], {"charges": 3, "uid": "a", "name": "Fireball"}, SPELLS[1]],
+    ],
+)
+def test_diff_records(new):
+    """Ensure applying the delta of two versions gives the new version."""
+    delta = diff_records(SPELLS, new)
+    if new == SPELLS:
+        assert delta is None
+    else:
+        assert apply_delta(SPELLS, delta) == new
+        assert [list(r) for r in apply_delta(SPELLS, delta)] == [
+            list(r) for r in new
+        ]
+
+
+def test_diff_records_compact():
+    """Ensure a delta only holds what changed."""
+    new = [SPELLS[0], dict(SPELLS[1], charges=4), SPELLS[2]]
+    assert diff_records(SPELLS, new) == {"changed": {"b": {"charges": 4}}}
+    new = [SPELLS[0], {"uid": "d"}, SPELLS[1], SPELLS[2]]
+    assert diff_records(SPELLS, new) == {
+        "added": [{"uid": "d"}],
+        "positions": [1],
+    }
+
+
+def test_apply_delta_errors():
+    with pytest.raises(ValueError):
+        apply_delta(SPELLS, {"changed": {"z": {"charges": 1}}})
+    with pytest.raises(ValueError):
+        apply_delta(SPELLS, {"order": ["a", "b"]})
+
+
+def test_publish_release(tmp_path):
+    """Ensure releases are only published when the outputs change, with
+    snapshots every snapshot_interval releases, and that every release can
+    be rebuilt from the snapshots and deltas.
+    """
+    folder = str(tmp_path)
+    versions = [SPELLS]
+    for i in range(4):
+        versions.append(
+            versions[-1][1:] + [{"uid": f"new{i}", "name": f"Spell {i}"}]
+        )
+
+    for spells in versions:
+        (manifest, published) = publish_release(
+            folder, {"spells.json": spells}, "1.0", snapshot_interval=2
+        )
+        assert published
+    (manifest, published) = publish_release(
+        folder, {"spells.json": versions[-1]}, "1.0", snapshot_interval=2
+    )
+    assert not published
+
+    assert manifest["latest"] == 5
+    assert [("snapshot" in e) for e in manifest["releases"]] == [
+        True,
+        False,
+        True,
+        False,
+        True,
+    ]
+    for (release, spells) in enumerate(versions, 1):
+        outputs = load_release(folder, manifest, release)
+        assert outputs == {"spells.json": spells}
+    for entry in manifest["releases"]:
+        for filename in [entry.get("delta")] + list(
+            entry.get("snapshot", {}).values()
+        ):
+            assert filename is None or os.path.isfile(
+                os.path.join(folder, filename)
+            )
+
+
+def test_plan_update():
+    manifest = {
+        "latest": 4,
+        "releases": [
+            {"snapshot": {"d": "1/d"}, "snapshot_bytes": 1000},
+            {"delta": "2/delta", "delta_bytes": 10},
+            {"delta": "3/delta", "delta_bytes": 500},
+            {
+                "delta": "4/delta",
+                "delta_bytes": 10,
+                "snapshot": {"d": "4/d"},
+                "snapshot_bytes": 1000,
+            },
+        ],
+    }
+    assert plan_update(manifest, 4) == []
+    assert plan_update(manifest, 2) == ["3/delta", "4/delta"]
+    assert plan_update(manifest, None) == ["4/d"]
+    manifest["releases"][2]["delta_bytes"] = 5000
+    assert plan_update(manifest, 1) == ["4/d"]
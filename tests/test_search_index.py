@@ -0,0 +1,38 @@
+import pytest
+
+from siralim_data.search_index import SearchIndex
+
+
+DOCUMENTS = [
+    ("a", "Death Abomination Flesh Rot Afflicts enemies with Weak."),
+    ("b", "Life Bird Song of Healing Heals allies at the end of turn."),
+    ("c", "Chaos Imp Bombs away Detonates bombs at the end of battle."),
+]
+TEXTS = [text for (_, text) in DOCUMENTS]
+
+
+@pytest.mark.parametrize("with_prefixes", [False, True])
+def test_search(with_prefixes):
+    """Ensure every word must match, and the last word matches as a prefix
+    unless the query ends with whitespace.
+    """
+    index = SearchIndex.build(DOCUMENTS, with_prefixes=with_prefixes)
+    index = SearchIndex.from_json(index.to_json())
+    assert index.search("end of") == ["b", "c"]
+    assert index.search("BOMB") == ["c"]
+    assert index.search("bomb ") == []
+    assert index.search("heal bird") == []
+    assert index.search("bird heal") == ["b"]
+    assert index.search("") == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize(
+    "query", ["at the end", "ombs a", "death", "wea", "zz", "a", "xyz"]
+)
+def test_search_substring(query):
+    """Ensure substring queries match a linear scan of the texts."""
+    index = SearchIndex.build(DOCUMENTS, with_trigrams=True)
+    expected = [uid for (uid, t) in DOCUMENTS if query.lower() in t.lower()]
+    assert index.search_substring(query, TEXTS) == expected
+    if len(query) >= 3:
+        assert set(expected) <= set(index.search_substring(query))
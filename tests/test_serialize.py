@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from siralim_data import serialize
+from siralim_data.serialize import Serializer, pretty_filename
+
+DATA = [{"name": "Blazing Soul’s", "ranks": 5, "stats": None}]
+
+
+def test_dumps():
+    """Ensure outputs are encoded to compact UTF-8 JSON, with or without
+    orjson.
+    """
+    expected = '[{"name":"Blazing Soul’s","ranks":5,"stats":null}]'
+    assert serialize.dumps(DATA) == expected.encode("utf-8")
+
+
+def test_serializer(tmp_path):
+    """Ensure the pretty copy is only saved when its emitter is enabled."""
+    filename = str(tmp_path / "spells.json")
+    assert Serializer().save(DATA, filename) == [filename]
+    assert not (tmp_path / "spells_pretty.json").exists()
+
+    saved = Serializer(["pretty"]).save(DATA, filename)
+    assert saved == [filename, str(tmp_path / "spells_pretty.json")]
+    with open(pretty_filename(filename), encoding="utf-8") as f:
+        text = f.read()
+    assert json.loads(text) == DATA and text.startswith('[\n {\n  "name"')
+
+    with pytest.raises(ValueError):
+        Serializer(["ugly"])
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from siralim_data.service import BuildData, QueryService, Server
+
+TRAITS = [
+    {
+        "class": "Death",
+        "family": "Abomination",
+        "trait_name": "Flesh Rot",
+        "search_text": "Death Abomination Flesh Rot",
+        "uid": "aaaaaa",
+        "sources": ["Torture Chamber"],
+    },
+    {
+        "class": "Life",
+        "family": "Bird",
+        "trait_name": "Feathered Fury",
+        "search_text": "Life Bird Feathered Fury",
+        "uid": "bbbbbb",
+        "sources": ["Torture Chamber", "Gonfurian Garden"],
+    },
+    {
+        "class": "Death",
+        "family": "Bird",
+        "trait_name": "Raven Wing",
+        "search_text": "Death Bird Raven Wing",
+        "uid": "cccccc",
+    },
+]
+OUTPUTS = {
+    "data.json": TRAITS,
+    "specializations.json": [
+        {
+            "name": "Hell Knight",
+            "perks": [
+                {
+                    "uid": "HKA",
+                    "spec": "Hell Knight",
+                    "name": "Blazing Soul",
+                    "description": "Burn things.",
+                }
+            ],
+        }
+    ],
+    "relics.json": [{"uid": "rt", "name": "Relic of Things"}],
+    "spells.json": [
+        {"uid": "f1", "name": "Fireball", "search_text": "Fireball burn"}
+    ],
+    "metadata.json": {"compendium_version": "1.0"},
+}
+
+
+def save_outputs(folder, outputs):
+    for (filename, obj) in outputs.items():
+        with open(os.path.join(folder, filename), "w") as f:
+            json.dump(obj, f)
+
+
+@pytest.fixture
+def service(tmp_path):
+    save_outputs(str(tmp_path), OUTPUTS)
+    return QueryService(BuildData.load(str(tmp_path)), cache_size=2)
+
+
+def get(service, target, headers=None):
+    (status, response_headers, body) = service.handle(
+        "GET", target, headers
+    )
+    return status, response_headers, json.loads(body) if body else None
+
+
+def test_lookup(service):
+    assert get(service, "/traits/bbbbbb")[2]["trait_name"] == "Feathered Fury"
+    assert get(service, "/perks/HKA")[2]["name"] == "Blazing Soul"
+    assert get(service, "/relics/rt")[0] == 200
+    assert get(service, "/traits/zzzzzz")[0] == 404
+    assert get(service, "/unknown")[0] == 404
+
+
+def test_filters(service):
+    def uids(target):
+        return [t["uid"] for t in get(service, target)[2]["items"]]
+
+    assert uids("/traits") == ["aaaaaa", "bbbbbb", "cccccc"]
+    assert uids("/traits?class=death") == ["aaaaaa", "cccccc"]
+    assert uids("/traits?class=Death&family=Bird") == ["cccccc"]
+    assert uids("/traits?class=Life&class=Death&limit=1&offset=1") == [
+        "bbbbbb"
+    ]
+    assert uids("/traits?source=Torture%20Chamber") == ["aaaaaa", "bbbbbb"]
+    assert get(service, "/traits?limit=x")[0] == 400
+    (status, _, body) = get(service, "/traits?offset=-1")
+    assert status == 400 and "offset" in body["error"]
+    (status, _, body) = get(service, "/traits?limit=0")
+    assert status == 400 and "limit" in body["error"]
+
+
+def test_search(service):
+    result = get(service, "/search?q=bird%20fe")[2]
+    assert [t["uid"] for t in result["items"]] == ["bbbbbb"]
+    result = get(service, "/search?q=fire&collection=spells")[2]
+    assert result["total"] == 1
+    assert get(service, "/search?q=x&collection=relics")[0] == 400
+
+
+def test_cache_and_etag(service, tmp_path):
+    """Ensure responses are cached (regardless of the order of the query
+    parameters) until a new build is served, and that they are revalidated
+    against the hash of the build.
+    """
+    (_, headers, _) = get(service, "/traits?class=Death&family=Bird")
+    assert headers["X-Cache"] == "miss"
+    (_, headers, _) = get(service, "/traits?family=Bird&class=Death")
+    assert headers["X-Cache"] == "hit"
+    etag = headers["ETag"]
+    status = get(service, "/traits", {"if-none-match": etag})[0]
+    assert status == 304
+
+    # Least recently used responses are evicted.
+    get(service, "/traits/aaaaaa")
+    get(service, "/traits/bbbbbb")
+    assert len(service.cache) == 2
+    (_, headers, _) = get(service, "/traits?class=Death&family=Bird")
+    assert headers["X-Cache"] == "miss"
+
+    save_outputs(str(tmp_path), {"metadata.json": {"compendium_version": 2}})
+    service.swap(BuildData.load(str(tmp_path)))
+    assert not service.cache
+    (status, headers, body) = get(
+        service, "/metadata", {"if-none-match": etag}
+    )
+    assert status == 200 and headers["ETag"] != etag
+    assert body["compendium_version"] == 2
+
+
+def test_server(tmp_path):
+    """Ensure the server answers requests on a keep-alive connection, and
+    reloads a new build.
+    """
+    folder = str(tmp_path)
+    save_outputs(folder, OUTPUTS)
+
+    async def request(reader, writer, target):
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        lines = head.split("\r\n")
+        headers = dict(
+            line.split(": ", 1) for line in lines[1:] if ": " in line
+        )
+        body = await reader.readexactly(int(headers["Content-Length"]))
+        return lines[0], json.loads(body)
+
+    async def main():
+        server = Server(folder, reload_interval=None)
+        port = await server.start("127.0.0.1", 0)
+        (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            (status, body) = await request(reader, writer, "/traits/aaaaaa")
+            assert status == "HTTP/1.1 200 OK"
+            assert body["trait_name"] == "Flesh Rot"
+
+            save_outputs(folder, {"data.json": TRAITS[1:]})
+            assert await server.reload()
+            (status, body) = await request(reader, writer, "/traits/aaaaaa")
+            assert status == "HTTP/1.1 404 Not Found"
+
+            # A broken build is not served.
+            with open(os.path.join(folder, "data.json"), "w") as f:
+                f.write("[")
+            assert not await server.reload()
+            (status, body) = await request(reader, writer, "/traits")
+            assert body["total"] == 2
+        finally:
+            await server.close()
+            writer.close()
+
+    asyncio.run(main())
+
+
+def test_server_bad_requests(tmp_path):
+    """Ensure malformed requests are answered with an error status, and the
+    connection closed.
+    """
+    folder = str(tmp_path)
+    save_outputs(folder, OUTPUTS)
+
+    async def status_of(port, request):
+        (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            assert b"Connection: close" in head
+            assert await reader.read() == b""
+            return head.split(b"\r\n")[0].decode("latin-1")
+        finally:
+            writer.close()
+
+    async def main():
+        server = Server(folder, reload_interval=None)
+        port = await server.start("127.0.0.1", 0)
+        try:
+            request = b"GET /traits HTTP/1.1\r\nContent-Length: abc\r\n\r\n"
+            assert await status_of(port, request) == "HTTP/1.1 400 Bad Request"
+            request = b"GET /traits HTTP/1.1\r\nX: " + b"x" * (1 << 15)
+            assert (
+                await status_of(port, request)
+                == "HTTP/1.1 431 Request Header Fields Too Large"
+            )
+        finally:
+            await server.close()
+
+    asyncio.run(main())
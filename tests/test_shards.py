@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from siralim_data.shards import (
+    ShardedData,
+    save_shards,
+    shard_traits,
+    summarize,
+)
+
+TRAITS = [
+    {"class": "Death", "family": "Abomination", "uid": "aaaaaa"},
+    {"class": "Rodian Master", "family": "Rodian", "uid": "bbbbbb"},
+    {"class": "Death", "family": "Bird", "uid": "cccccc"},
+    {"class": "Death", "family": "Abomination", "uid": "dddddd"},
+]
+
+
+def test_save_shards(tmp_path):
+    """Ensure the traits are saved by class, and that a trait is resolved by
+    loading only its shard.
+    """
+    index = save_shards(TRAITS, str(tmp_path))
+    assert [s["filename"] for s in index["shards"]] == [
+        "shards/death.json",
+        "shards/rodian-master.json",
+    ]
+    assert index["uids"] == {
+        "aaaaaa": 0,
+        "bbbbbb": 1,
+        "cccccc": 0,
+        "dddddd": 0,
+    }
+    assert index["shards"][0]["length"] == 3
+    size = index["shards"][0]["bytes"]
+    assert summarize(index)[0] == ("Death", 1, 3, size, size)
+
+    data = ShardedData(str(tmp_path / "shards.json"))
+    assert data.shards_of(["bbbbbb", "unknown"]) == [1]
+    assert data.get("bbbbbb") == TRAITS[1]
+    assert list(data._shards) == [1]
+    assert data.get("unknown") is None and len(data) == 4
+
+
+def test_save_shards_by_family(tmp_path):
+    """Ensure the traits are saved by family, and that the shards of a
+    previous build are removed.
+    """
+    save_shards(TRAITS, str(tmp_path))
+    index = save_shards(TRAITS, str(tmp_path), by_family=True)
+    assert [(s["class"], s["family"]) for s in index["shards"]] == [
+        ("Death", "Abomination"),
+        ("Rodian Master", "Rodian"),
+        ("Death", "Bird"),
+    ]
+    assert sorted(os.listdir(tmp_path / "shards")) == [
+        "death",
+        "rodian-master",
+    ]
+    data = ShardedData(str(tmp_path / "shards.json"))
+    assert [t["uid"] for t in data.shard(0).values()] == ["aaaaaa", "dddddd"]
+
+    index = save_shards(TRAITS, str(tmp_path))
+    assert sorted(os.listdir(tmp_path / "shards")) == [
+        "death.json",
+        "rodian-master.json",
+    ]
+
+
+def test_shard_filename_collision():
+    """Ensure shards whose names have the same slug are an error."""
+    traits = TRAITS + [{"class": "Rodian-Master", "family": "", "uid": "e"}]
+    with pytest.raises(ValueError):
+        shard_traits(traits)
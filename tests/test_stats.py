@@ -0,0 +1,82 @@
+import build_data as bd
+from siralim_data.stats import StatTable, histogram, percentile
+
+
+def _trait(klass, family, health):
+    stats = {
+        "health": health,
+        "attack": 1,
+        "intelligence": 2,
+        "defense": 3,
+        "speed": 4,
+        "total": health + 10,
+    }
+    return {"class": klass, "family": family, "stats": stats}
+
+
+TRAITS = [
+    _trait("Death", "Abomination", 10),
+    _trait("Death", "Bird", 20),
+    {"class": "Backer", "family": "Backer"},  # No stats
+    _trait("Life", "Bird", 40),
+    _trait("Life", "Bird", 30),
+]
+
+
+def test_percentile():
+    """Ensure percentiles interpolate linearly, like numpy.percentile."""
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([1, 2, 3, 4], 10) == 1.3
+    assert percentile([5], 90) == 5
+    assert percentile([], 50) is None
+
+
+def test_histogram():
+    """Ensure every value falls into exactly one bin."""
+    h = histogram([0, 1, 5, 9, 10], bins=2)
+    assert h == {"edges": [0, 5, 10], "counts": [2, 3]}
+    assert histogram([3, 3], bins=3)["counts"] == [2, 0, 0]
+
+
+def test_stat_table():
+    """Ensure the aggregates skip traits without stats and can be grouped."""
+    table = StatTable.from_traits(TRAITS)
+    assert len(table) == 4
+    summary = table.summary()
+    assert summary["min_stats"]["health"] == 10
+    assert summary["max_stats"]["total"] == 50
+    assert summary["average_stats"]["health"] == 25
+    assert summary["percentiles"]["health"]["p50"] == 25
+
+    by_class = table.group_by("class")
+    assert list(by_class) == ["Death", "Life"]
+    assert by_class["Life"].summary(False) == {
+        "count": 2,
+        "min_stats": dict(TRAITS[4]["stats"]),
+        "max_stats": dict(TRAITS[3]["stats"]),
+        "average_stats": {
+            "health": 35,
+            "attack": 1,
+            "intelligence": 2,
+            "defense": 3,
+            "speed": 4,
+            "total": 45,
+        },
+    }
+
+
+def test_empty_stat_table():
+    """Ensure a table without any stats summarizes to empty aggregates, as
+    when no trait is joined to the SUAPI stats.
+    """
+    table = StatTable.from_traits(TRAITS[2:3])
+    assert len(table) == 0
+    assert table.summary() == {
+        "count": 0,
+        "min_stats": {},
+        "max_stats": {},
+        "average_stats": {},
+        "percentiles": {},
+    }
+    metadata = bd.generate_metadata("1", [])
+    assert metadata["min_stats"] == {} and metadata["class_stats"] == {}
@@ -0,0 +1,119 @@
+import pytest
+
+from siralim_data.steam_guide import (
+    convert_steam_guide,
+    parse_steam_guide,
+    read_specializations,
+)
+
+SPECIALIZATIONS = {"Hell Knight": "HK", "Necromancer": "NE"}
+
+GUIDE = """Contents
+Hell Knight
+Hell Knights burn things.
+And then some.
+Starter Creature
+Imp
+Perks
+Blazing Soul
+Ranks: 5
+Cost Per Rank: 10
+Your creatures burn.
+More fire.
+
+Bolster
+Ranks: 1
+Anointment: Yes
+Supplemental Info
+Perks
+Not a perk
+Necromancer
+Raises the dead.
+Perks
+Grave Dance
+Ranks: 1
+"""
+
+
+def test_parse_steam_guide():
+    """Ensure specializations and perks are parsed across every state, and
+    that text after the perks of a specialization is ignored.
+    """
+    records = list(
+        parse_steam_guide(GUIDE.splitlines(True), SPECIALIZATIONS)
+    )
+    assert records == [
+        (
+            "spec",
+            {
+                "name": "Hell Knight",
+                "abbreviation": "HK",
+                "description": "Hell Knights burn things.\nAnd then some.",
+            },
+        ),
+        (
+            "perks",
+            {
+                "specialization": "Hell Knight",
+                "name": "Blazing Soul",
+                "ranks": "5",
+                "cost_per_rank": "10",
+                "description": "Your creatures burn. More fire.",
+            },
+        ),
+        (
+            "perks",
+            {
+                "specialization": "Hell Knight",
+                "name": "Bolster",
+                "ranks": "1",
+                "anointment": "Yes",
+            },
+        ),
+        (
+            "spec",
+            {
+                "name": "Necromancer",
+                "abbreviation": "NE",
+                "description": "Raises the dead.",
+            },
+        ),
+        (
+            "perks",
+            {
+                "specialization": "Necromancer",
+                "name": "Grave Dance",
+                "ranks": "1",
+            },
+        ),
+    ]
+
+
+def test_convert_steam_guide(tmp_path):
+    """Ensure the csv files are written, including the specializations
+    missing from the guide.
+    """
+    (tmp_path / "guide.txt").write_text(GUIDE)
+    specs_txt = "Hell Knight,HK\nNecromancer,NE\nX,X\n"
+    (tmp_path / "specs.txt").write_text(specs_txt)
+    counts = convert_steam_guide(
+        str(tmp_path / "guide.txt"),
+        str(tmp_path / "specs.txt"),
+        str(tmp_path / "perks.csv"),
+        str(tmp_path / "specs.csv"),
+    )
+    assert counts == {"perks": 3, "specializations": 3}
+    perks = (tmp_path / "perks.csv").read_text().splitlines()
+    assert perks[0] == (
+        "specialization,name,ranks,cost_per_rank,anointment,description"
+    )
+    assert perks[2] == "Hell Knight,Bolster,1,,Yes,"
+    specs = (tmp_path / "specs.csv").read_text()
+    assert specs.endswith("X,X,\n")
+
+
+def test_duplicate_abbreviation(tmp_path):
+    """Ensure an abbreviation used twice is an error."""
+    (tmp_path / "specs.txt").write_text("Hell Knight,HK\nHealer,HK\n")
+    with pytest.raises(ValueError):
+        list(read_specializations(str(tmp_path / "specs.txt")))
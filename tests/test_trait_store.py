@@ -0,0 +1,88 @@
+import pytest
+
+from siralim_data.trait_store import TraitStore, encode_store, save_store
+
+TRAITS = [
+    {
+        "class": "Death",
+        "family": "Abomination",
+        "creature": "Abomination Brute",
+        "trait_name": "Flesh Rot",
+        "trait_description": "Afflicts Weak or Vulnerable – whichever.",
+        "material_name": "Brute Stitches",
+        "search_text": "Death Abomination ...",
+        "uid": "2788f5",
+        "stats": {
+            "health": 42,
+            "attack": 22,
+            "intelligence": 12,
+            "defense": 17,
+            "speed": 17,
+            "total": 110,
+        },
+        "sprite_filename": "spr_crits_battle_2065.png",
+        "sources": ["Path of the Damned", "Titan's Wound"],
+    },
+    {
+        "class": "Backer",
+        "family": "Backer",
+        "creature": "Backer",
+        "trait_name": "Backer Trait",
+        "trait_description": "",
+        "material_name": "N/A",
+        "uid": "bbbbbb",
+        "sources": [],
+    },
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    filename = str(tmp_path / "traits.bin")
+    save_store(TRAITS, filename)
+    with TraitStore(filename) as store:
+        yield store
+
+
+def test_get(store):
+    """Ensure every trait is read back as saved (without its search text),
+    including missing fields and stats.
+    """
+    assert len(store) == 2
+    for trait in TRAITS:
+        expected = {k: v for (k, v) in trait.items() if k != "search_text"}
+        assert store.get(trait["uid"]) == expected
+    assert store.get("cccccc") is None
+    assert "2788f5" in store and "cccccc" not in store
+    assert list(store.uids()) == ["2788f5", "bbbbbb"]
+
+
+def test_fields(store):
+    i = store.index("2788f5")
+    assert store.stats(i)["total"] == 110
+    assert store.stats(store.index("bbbbbb")) is None
+    assert store.description("2788f5") == TRAITS[0]["trait_description"]
+    view = store.field_bytes(i, "trait_name")
+    assert bytes(view) == b"Flesh Rot"
+    view.release()
+
+
+def test_many_uids(tmp_path):
+    """Ensure lookups probe past colliding slots."""
+    traits = [{"uid": f"{i:06x}"} for i in range(1000)]
+    filename = str(tmp_path / "traits.bin")
+    save_store(traits, filename)
+    with TraitStore(filename) as store:
+        assert [store.index(t["uid"]) for t in traits] == list(range(1000))
+        assert store.index("zzzzzz") is None
+
+
+def test_errors(tmp_path):
+    with pytest.raises(ValueError, match="Duplicate"):
+        encode_store([{"uid": "a"}, {"uid": "a"}])
+    with pytest.raises(ValueError, match="fit"):
+        encode_store([{"uid": "a", "stats": {"health": 10**6}}])
+    filename = tmp_path / "data.json"
+    filename.write_bytes(b"[]" * 40)
+    with pytest.raises(ValueError, match="not a version"):
+        TraitStore(str(filename))
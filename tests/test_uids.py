@@ -0,0 +1,107 @@
+import pickle
+
+import pytest
+
+import build_data as bd
+from siralim_data.uids import UidError, UidRegistry, load_uid_index
+
+TRAITS = [
+    {"family": "Bird", "creature": "Roc", "trait_name": "Wind", "uid": "a"},
+    {"family": "Bird", "creature": "Tengu", "trait_name": "Gust", "uid": "a"},
+    {"family": "Bird", "creature": "Kite", "trait_name": "Soar", "uid": "b"},
+]
+SPECIALIZATIONS = [
+    {
+        "name": "Hell Knight",
+        "perks": [
+            {"name": "Blazing Soul", "uid": "HKA"},
+            {"name": "Bolster", "uid": "HKB"},
+        ],
+    }
+]
+RELICS = [{"name": "Relic", "uid": "el"}]
+SPELLS = [
+    {"name": "Fireball", "class": "Chaos", "uid": "f"},
+    {"name": "Fireball", "class": "Chaos", "uid": "f"},
+    {"name": "Firebolt", "class": "Chaos", "uid": "f"},
+]
+
+
+def test_collisions():
+    """Ensure every collision is reported, including the same name
+    registered twice.
+    """
+    registry = UidRegistry.from_data(TRAITS, SPECIALIZATIONS, RELICS, SPELLS)
+    assert registry.collisions() == {
+        "traits": {"a": ["Bird / Roc / Wind", "Bird / Tengu / Gust"]},
+        "spells": {
+            "f": ["Fireball (Chaos)", "Fireball (Chaos)", "Firebolt (Chaos)"]
+        },
+    }
+
+    # A duplicated row of the compendium hashes to the same uid.
+    trait = dict(TRAITS[2], trait_description="Soar high.")
+    duplicated = [trait, dict(trait, trait_description="Other.")]
+    registry = UidRegistry.from_data(duplicated, [], [], [])
+    assert registry.collisions() == {
+        "traits": {"b": ["Bird / Kite / Soar", "Bird / Kite / Soar"]}
+    }
+
+
+def test_compare():
+    """Ensure removed and reassigned uids are detected."""
+    previous = UidRegistry.from_data(
+        TRAITS[2:], SPECIALIZATIONS, RELICS, []
+    ).to_json()
+    perks = [{"name": "Bolster", "uid": "HKA"}]
+    current = UidRegistry.from_data(
+        TRAITS[2:], [{"name": "Hell Knight", "perks": perks}], RELICS, []
+    )
+
+    report = current.report(previous)
+    assert report["collisions"] == {}
+    assert report["removed"] == {"perks": {"HKB": "Hell Knight: Bolster"}}
+    assert report["reassigned"] == {
+        "perks": {
+            "HKA": {
+                "previous": "Hell Knight: Blazing Soul",
+                "current": "Hell Knight: Bolster",
+            }
+        }
+    }
+
+
+def test_uid_error_pickle():
+    """Ensure the report survives a process pool."""
+    e = pickle.loads(pickle.dumps(UidError("message", {"collisions": {}})))
+    assert str(e) == "message"
+    assert e.report == {"collisions": {}}
+
+
+def test_build_uids(tmp_path):
+    """Ensure the uid index is only published when it is safe to."""
+    traits = TRAITS[2:]
+    spells = SPELLS[:1]
+    bd.build_uids(tmp_path, traits, SPECIALIZATIONS, RELICS, spells)
+    published = load_uid_index(tmp_path / "uids.json")
+    assert published["spells"] == {"f": "Fireball (Chaos)"}
+
+    with pytest.raises(UidError) as e:
+        bd.build_uids(tmp_path, TRAITS, SPECIALIZATIONS, RELICS, spells)
+    assert "traits" in e.value.report["collisions"]
+
+    spells = SPELLS[2:]
+    with pytest.raises(UidError):
+        bd.build_uids(tmp_path, traits, SPECIALIZATIONS, RELICS, spells)
+    assert load_uid_index(tmp_path / "uids.json") == published
+
+    bd.build_uids(
+        tmp_path,
+        traits,
+        SPECIALIZATIONS,
+        RELICS,
+        spells,
+        accept_uid_changes=True,
+    )
+    published = load_uid_index(tmp_path / "uids.json")
+    assert published["spells"] == {"f": "Firebolt (Chaos)"}
@@ -0,0 +1,115 @@
+import os
+
+from siralim_data.pipeline import Stage
+from siralim_data.watch import (
+    Watcher,
+    affected_stages,
+    changed_files,
+    snapshot,
+)
+
+
+def _stages(folder):
+    return [
+        Stage("a", None, [f"{folder}/a.csv", "script.py"], []),
+        Stage("b", None, [(f"{folder}/sprites", False)], []),
+        Stage("c", None, [], [], ["a"]),
+        Stage("d", None, [], [], after=["c"]),
+    ]
+
+
+def _write(filename, text):
+    with open(filename, "w") as f:
+        f.write(text)
+
+
+def test_affected_stages(tmp_path):
+    """Ensure changed files are mapped to the stages with them (or their
+    folder) as an input, and to the dependents of those stages.
+    """
+    folder = str(tmp_path)
+    stages = _stages(folder)
+    assert affected_stages(stages, {f"{folder}/a.csv"}) == {"a", "c", "d"}
+    assert affected_stages(stages, {f"{folder}/sprites/x.png"}) == {"b"}
+    assert affected_stages(stages, {f"{folder}/sprites2/x.png"}) == set()
+
+
+def test_snapshot(tmp_path):
+    """Ensure added, modified and removed files are detected, and hidden
+    files are ignored.
+    """
+    os.mkdir(tmp_path / "sprites")
+    _write(tmp_path / "a.csv", "a")
+    before = snapshot([str(tmp_path / "a.csv"), str(tmp_path / "sprites")])
+    _write(tmp_path / "a.csv", "ab")
+    _write(tmp_path / "sprites" / "x.png", "x")
+    _write(tmp_path / "sprites" / ".hidden", "x")
+    after = snapshot([str(tmp_path / "a.csv"), str(tmp_path / "sprites")])
+    assert changed_files(before, after) == {
+        str(tmp_path / "a.csv"),
+        str(tmp_path / "sprites" / "x.png"),
+    }
+    os.remove(tmp_path / "a.csv")
+    assert changed_files(after, snapshot([str(tmp_path / "a.csv")])) == {
+        str(tmp_path / "a.csv"),
+        str(tmp_path / "sprites" / "x.png"),
+    }
+
+
+def test_watcher_debounce(tmp_path):
+    """Ensure a burst of changes is coalesced into one rebuild once the
+    changes have settled.
+    """
+    folder = str(tmp_path)
+    os.mkdir(tmp_path / "sprites")
+    _write(tmp_path / "a.csv", "a")
+    calls = []
+    watcher = Watcher(
+        _stages(folder),
+        lambda affected, changed: calls.append((affected, changed)),
+        debounce=1.0,
+    )
+    assert watcher.paths == [f"{folder}/a.csv", f"{folder}/sprites"]
+
+    assert watcher.poll(now=0.0) == set()
+    _write(tmp_path / "a.csv", "ab")
+    assert watcher.poll(now=1.0) == set()
+    _write(tmp_path / "sprites" / "x.png", "x")
+    assert watcher.poll(now=1.5) == set()
+    assert calls == []
+    assert watcher.poll(now=2.5) == {"a", "b", "c", "d"}
+    assert calls == [
+        (
+            {"a", "b", "c", "d"},
+            {f"{folder}/a.csv", f"{folder}/sprites/x.png"},
+        )
+    ]
+    assert watcher.poll(now=5.0) == set() and len(calls) == 1
+
+
+def test_watcher_changes_during_rebuild(tmp_path):
+    """Ensure inputs edited during a rebuild trigger another rebuild, while
+    the outputs the rebuild generates for other stages do not.
+    """
+    folder = str(tmp_path)
+    _write(tmp_path / "a.csv", "a")
+    _write(tmp_path / "b.csv", "b")
+    stages = [
+        Stage("a", None, [f"{folder}/a.csv"], [f"{folder}/b.csv"]),
+        Stage("b", None, [f"{folder}/b.csv"], [], ["a"]),
+        Stage("c", None, [f"{folder}/c.csv"], []),
+    ]
+    calls = []
+
+    def rebuild(affected, changed):
+        calls.append(affected)
+        if len(calls) == 1:
+            _write(tmp_path / "b.csv", "generated")
+            _write(tmp_path / "c.csv", "edited")
+
+    watcher = Watcher(stages, rebuild, debounce=0.0)
+    _write(tmp_path / "a.csv", "ab")
+    assert watcher.poll(now=0.0) == {"a", "b"}
+    assert watcher.poll(now=1.0) == {"c"}
+    assert watcher.poll(now=2.0) == set()
+    assert calls == [{"a", "b"}, {"c"}]